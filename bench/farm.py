@@ -0,0 +1,204 @@
+"""Stand-in HTTP target farm for benchmarks.
+
+Every target gets its own path. How it answers (status code, latency and
+whether it stalls) is derived from a hash of the path, so the same targets
+behave the same in every run.
+"""
+
+from typing import Dict, List, Optional, Tuple, Any
+
+import argparse
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FarmServer(ThreadingHTTPServer):
+    """Threaded HTTP server with a backlog large enough for thousands of connections."""
+
+    daemon_threads = True
+    request_queue_size = 4096
+
+
+class TargetFarm:
+    """Serves stand-in targets on one or more local ports (each port is one host).
+
+    Args:
+        hosts (int): Number of ports to listen on.
+        latency (float): Base latency of a response in seconds.
+        jitter (float): Additional latency of up to this many seconds per target.
+        body_size (int): Size of every response body in bytes.
+        status_mix (dict): Weight of each status code, e.g. {200: 95, 404: 3, 500: 2}.
+        stall_ratio (float): Fraction of targets (0 - 1) which stall instead of answering.
+        stall_time (float): How long stalling targets wait before answering in seconds.
+    """
+
+    def __init__(
+        self,
+        hosts: int = 1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        body_size: int = 1024,
+        status_mix: Optional[Dict[int, int]] = None,
+        stall_ratio: float = 0.0,
+        stall_time: float = 30.0,
+    ) -> None:
+        self.__hosts = hosts
+        self.__latency = latency
+        self.__jitter = jitter
+        self.__stall_ratio = stall_ratio
+        self.__stall_time = stall_time
+        self.__status_mix = sorted((status_mix or {200: 1}).items())
+        self.__weights = sum(weight for _, weight in self.__status_mix)
+        head = b"<html><body><h1>redbox bench</h1>"
+        self.__body = (head + b"x" * body_size)[:body_size]
+        self.__servers: List[FarmServer] = []
+        self.__threads: List[threading.Thread] = []
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """Settings of the farm (for the report)."""
+        return {
+            "hosts": self.__hosts,
+            "latency": self.__latency,
+            "jitter": self.__jitter,
+            "body_size": len(self.__body),
+            "status_mix": {str(status): weight for status, weight in self.__status_mix},
+            "stall_ratio": self.__stall_ratio,
+            "stall_time": self.__stall_time,
+        }
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def start(self) -> None:
+        """Listen on free local ports."""
+        handler = self.__get_handler()
+        for _ in range(self.__hosts):
+            server = FarmServer(("127.0.0.1", 0), handler)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self.__servers.append(server)
+            self.__threads.append(thread)
+
+    def stop(self) -> None:
+        """Stop listening."""
+        for server in self.__servers:
+            server.shutdown()
+            server.server_close()
+        for thread in self.__threads:
+            thread.join()
+        self.__servers = []
+        self.__threads = []
+
+    def get_urls(self, count: int) -> List[str]:
+        """Get the urls of count targets, spread round robin over all hosts."""
+        ports = [server.server_address[1] for server in self.__servers]
+        return [
+            f"http://127.0.0.1:{ports[index % len(ports)]}/target/{index}" for index in range(count)
+        ]
+
+    def get_behaviour(self, path: str) -> Tuple[int, float]:
+        """Get status code and delay of a target path."""
+        digest = hashlib.blake2b(path.encode(), digest_size=12).digest()
+        stall = int.from_bytes(digest[0:4], "big") / 0xFFFFFFFF
+        delay = int.from_bytes(digest[4:8], "big") / 0xFFFFFFFF
+        pick = int.from_bytes(digest[8:12], "big") % self.__weights
+        status = self.__status_mix[-1][0]
+        for code, weight in self.__status_mix:
+            if pick < weight:
+                status = code
+                break
+            pick -= weight
+        if stall < self.__stall_ratio:
+            return status, self.__stall_time
+        return status, self.__latency + self.__jitter * delay
+
+    # --------------------------------------------------------------------------
+    # Private Functions
+    # --------------------------------------------------------------------------
+    def __get_handler(self) -> Any:
+        """Create the request handler class answering for this farm."""
+        farm = self
+        body = self.__body
+
+        class FarmHandler(BaseHTTPRequestHandler):
+            """Answers every request according to the behaviour of its path."""
+
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                """Answer a GET request."""
+                status, delay = farm.get_behaviour(self.path)
+                if delay > 0:
+                    time.sleep(delay)
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_HEAD(self) -> None:  # pylint: disable=invalid-name
+                """Answer a HEAD request."""
+                status, delay = farm.get_behaviour(self.path)
+                if delay > 0:
+                    time.sleep(delay)
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+            def log_message(self, *_: Any) -> None:  # pylint: disable=arguments-differ
+                """Do not log requests."""
+
+        return FarmHandler
+
+
+def get_status_mix(value: str) -> Dict[int, int]:
+    """Parse a status mix like '200:95,404:3,500:2' into weights by status code."""
+    mix = {}
+    for item in value.split(","):
+        status, _, weight = item.partition(":")
+        mix[int(status)] = int(weight or 1)
+    return mix
+
+
+def get_farm(args: argparse.Namespace) -> TargetFarm:
+    """Create a farm from the parsed --hosts, --latency, ... command line arguments."""
+    return TargetFarm(
+        args.hosts,
+        args.latency,
+        args.jitter,
+        args.body_size,
+        get_status_mix(args.status_mix),
+        args.stall_ratio,
+        args.stall_time,
+    )
+
+
+def main() -> None:
+    """Run the farm standalone (e.g. for manual tests) until interrupted."""
+    parser = argparse.ArgumentParser(description="Stand-in HTTP target farm for benchmarks.")
+    parser.add_argument("--hosts", type=int, default=1, help="Number of ports to listen on")
+    parser.add_argument("--targets", type=int, default=10, help="Number of target urls to print")
+    parser.add_argument("--latency", type=float, default=0.0, help="Base latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra latency (seconds)")
+    parser.add_argument("--body-size", type=int, default=1024, help="Body size (bytes)")
+    parser.add_argument("--status-mix", type=str, default="200:1", help="E.g. 200:95,500:5")
+    parser.add_argument("--stall-ratio", type=float, default=0.0, help="Stalling targets (0-1)")
+    parser.add_argument("--stall-time", type=float, default=30.0, help="Stall time (seconds)")
+    args = parser.parse_args()
+
+    farm = get_farm(args)
+    farm.start()
+    for url in farm.get_urls(args.targets):
+        print(url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        farm.stop()
+
+
+if __name__ == "__main__":
+    main()
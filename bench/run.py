@@ -0,0 +1,370 @@
+"""Benchmark the exporter against a local stand-in target farm.
+
+For every mode and target count, a configuration is generated, the exporter
+is started from bin/redbox and scraped a few times. Scrape wall time, probe
+rate, exporter CPU time, peak resident memory and render time are written
+to a JSON report, which can be compared against the report of a previous run.
+"""
+
+from typing import Dict, List, Optional, Tuple, Any
+
+import argparse
+import json
+import os
+import platform
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import yaml
+
+from farm import TargetFarm, get_farm
+
+
+# Root of the repository and the exporter entrypoint
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+BIN = os.path.join(ROOT, "bin", "redbox")
+
+# Version of the report format
+REPORT_VERSION = 1
+
+# Report values compared between runs and whether lower (True) or higher (False) is better
+COMPARED = {
+    "scrape_seconds_median": True,
+    "probes_per_second": False,
+    "cpu_seconds": True,
+    "peak_rss_bytes": True,
+    "render_seconds": True,
+}
+
+# A sample line of the text exposition format
+SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*(?:\{.*\})?) (\S+)$")
+
+
+def get_args() -> argparse.Namespace:
+    """Retrieve command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--targets", type=str, default="10,100,1000,10000", help="Target counts to benchmark"
+    )
+    parser.add_argument(
+        "--modes", type=str, default="ondemand,scheduler", help="ondemand and/or scheduler"
+    )
+    parser.add_argument("--scrapes", type=int, default=5, help="Measured scrapes per case")
+    parser.add_argument("--interval", type=float, default=5, help="Scheduler interval (seconds)")
+    parser.add_argument("--timeout", type=float, default=2, help="Target timeout (seconds)")
+    parser.add_argument("--scrape-timeout", type=int, default=30, help="scrape_timeout (seconds)")
+    parser.add_argument("--hosts", type=int, default=4, help="Number of stand-in hosts (ports)")
+    parser.add_argument("--latency", type=float, default=0.01, help="Base latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.04, help="Extra latency (seconds)")
+    parser.add_argument("--body-size", type=int, default=4096, help="Body size (bytes)")
+    parser.add_argument(
+        "--status-mix", type=str, default="200:95,404:3,500:2", help="Status code weights"
+    )
+    parser.add_argument("--stall-ratio", type=float, default=0.0, help="Stalling targets (0-1)")
+    parser.add_argument("--stall-time", type=float, default=30, help="Stall time (seconds)")
+    parser.add_argument(
+        "--extra", type=str, default=None, help="Yaml file merged into every generated config"
+    )
+    parser.add_argument(
+        "--output", type=str, default="redbox-bench.json", help="Path of the JSON report"
+    )
+    parser.add_argument("--compare", type=str, default=None, help="Report of a previous run")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Relative change reported as regression"
+    )
+    return parser.parse_args()
+
+
+# -------------------------------------------------------------------------------------------------
+# Exporter process
+# -------------------------------------------------------------------------------------------------
+def get_free_port() -> int:
+    """Get a free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+def merge(config: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Recursively merge extra settings into a configuration."""
+    for key, value in extra.items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            merge(config[key], value)
+        else:
+            config[key] = value
+    return config
+
+
+def write_config(
+    path: str, urls: List[str], mode: str, args: argparse.Namespace, extra: Dict[str, Any]
+) -> None:
+    """Write the exporter configuration of a benchmark case."""
+    config = {
+        "scrape_timeout": args.scrape_timeout,
+        "scheduler": {"enabled": mode == "scheduler", "interval": args.interval},
+        "logging": {"level": "warning"},
+        "targets": [
+            {
+                "name": f"target-{index}",
+                "url": url,
+                "timeout": args.timeout,
+                "groups": {"host": str(index % args.hosts)},
+            }
+            for index, url in enumerate(urls)
+        ],
+    }
+    with open(path, "w") as file_p:
+        yaml.safe_dump(merge(config, extra), file_p)
+
+
+def get_usage(pid: int) -> Optional[Tuple[float, int]]:
+    """Get CPU seconds and peak resident memory of a process and its children from /proc.
+
+    Returns None where /proc is not available.
+    """
+    pids = [pid]
+    try:
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                with open(f"/proc/{entry}/stat") as stat:
+                    # The process name in parentheses may contain spaces
+                    fields = stat.read().rsplit(")", 1)[1].split()
+                if int(fields[1]) == pid:
+                    pids.append(int(entry))
+    except OSError:
+        if not os.path.isdir("/proc"):
+            return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu = 0.0
+    peak = 0
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{child}/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        peak += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / ticks
+    return cpu, peak
+
+
+def scrape(port: int, timeout: float) -> Tuple[float, bytes]:
+    """Scrape /metrics and return the wall time and body."""
+    start = time.perf_counter()
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=timeout) as resp:
+        body: bytes = resp.read()
+    return time.perf_counter() - start, body
+
+
+def parse(body: bytes) -> Dict[str, float]:
+    """Get the values of all samples of a metrics response by series."""
+    samples = {}
+    for line in body.decode("utf-8", "replace").splitlines():
+        match = SAMPLE.match(line)
+        if match is not None:
+            try:
+                samples[match.group(1)] = float(match.group(2))
+            except ValueError:
+                continue
+    return samples
+
+
+def wait_ready(port: int, proc: "subprocess.Popen[bytes]", timeout: float) -> None:
+    """Wait until the exporter answers on its index page."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"exporter exited with {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.1)
+    raise RuntimeError("exporter did not start in time")
+
+
+def run_case(
+    farm: TargetFarm, count: int, mode: str, args: argparse.Namespace, extra: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Benchmark one mode with a number of targets."""
+    probes = "redbox_exporter_probes_total"
+    render_sum = 'redbox_exporter_scrape_duration_seconds_sum{phase="render"}'
+    render_count = 'redbox_exporter_scrape_duration_seconds_count{phase="render"}'
+    scrape_timeout = args.scrape_timeout + 30
+
+    with tempfile.TemporaryDirectory(prefix="redbox-bench-") as tmp:
+        conf = os.path.join(tmp, "config.yml")
+        write_config(conf, farm.get_urls(count), mode, args, extra)
+        port = get_free_port()
+        with open(os.path.join(tmp, "redbox.log"), "wb") as log:
+            proc = subprocess.Popen(  # pylint: disable=consider-using-with
+                [sys.executable, BIN, "-c", conf, "-l", "127.0.0.1", "-p", str(port)],
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        try:
+            wait_ready(port, proc, 60)
+            usage_start = get_usage(proc.pid)
+
+            # The first scrape is not measured. In scheduler mode, wait for the first round.
+            start = time.perf_counter()
+            _, body = scrape(port, scrape_timeout)
+            first = parse(body)
+            while mode == "scheduler" and first.get(probes, 0) < count:
+                if time.perf_counter() - start > args.interval + args.timeout + 60:
+                    break
+                time.sleep(0.5)
+                _, body = scrape(port, scrape_timeout)
+                first = parse(body)
+            first_time = time.perf_counter()
+
+            walls = []
+            failed = 0
+            last = first
+            size = 0
+            for _ in range(args.scrapes):
+                if mode == "scheduler":
+                    time.sleep(args.interval / 2)
+                try:
+                    wall, body = scrape(port, scrape_timeout)
+                except (urllib.error.URLError, OSError):
+                    failed += 1
+                    continue
+                walls.append(wall)
+                size = len(body)
+                last = parse(body)
+            elapsed = time.perf_counter() - first_time
+
+            usage_end = get_usage(proc.pid)
+            if usage_start is not None and usage_end is not None:
+                cpu = usage_end[0] - usage_start[0]
+                peak = usage_end[1]
+            else:
+                cpu = last.get("redbox_exporter_process_cpu_seconds_total", 0.0) - first.get(
+                    "redbox_exporter_process_cpu_seconds_total", 0.0
+                )
+                peak = int(last.get("redbox_exporter_process_resident_memory_bytes", 0))
+        finally:
+            proc.send_signal(signal.SIGINT)
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    renders = last.get(render_count, 0.0) - first.get(render_count, 0.0)
+    render = last.get(render_sum, 0.0) - first.get(render_sum, 0.0)
+    return {
+        "mode": mode,
+        "targets": count,
+        "scrapes": len(walls),
+        "failed_scrapes": failed,
+        "scrape_seconds_min": min(walls) if walls else None,
+        "scrape_seconds_median": statistics.median(walls) if walls else None,
+        "scrape_seconds_max": max(walls) if walls else None,
+        "probes_per_second": (last.get(probes, 0.0) - first.get(probes, 0.0)) / elapsed,
+        "cpu_seconds": cpu,
+        "peak_rss_bytes": peak,
+        "render_seconds": render / renders if renders else None,
+        "response_bytes": size,
+    }
+
+
+# -------------------------------------------------------------------------------------------------
+# Report
+# -------------------------------------------------------------------------------------------------
+def get_commit() -> Optional[str]:
+    """Get the checked out git commit of the repository (None outside of git)."""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, check=True, text=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def compare(base: Dict[str, Any], report: Dict[str, Any], threshold: float) -> List[str]:
+    """Print the changes against a previous report and return the regressions."""
+    previous = {(result["mode"], result["targets"]): result for result in base["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get((result["mode"], result["targets"]))
+        if old is None:
+            continue
+        for key, lower_is_better in COMPARED.items():
+            if not old.get(key) or result.get(key) is None:
+                continue
+            change = (result[key] - old[key]) / old[key]
+            worse = change > threshold if lower_is_better else change < -threshold
+            case = f"{result['mode']}/{result['targets']} {key}"
+            line = f"{case:<45} {old[key]:>14.4f} -> {result[key]:>14.4f} {change:>+8.1%}"
+            print(line + ("  REGRESSION" if worse else ""))
+            if worse:
+                regressions.append(case)
+    return regressions
+
+
+def main() -> None:
+    """Run all benchmark cases and write the report."""
+    args = get_args()
+    extra: Dict[str, Any] = {}
+    if args.extra is not None:
+        with open(args.extra) as file_p:
+            extra = yaml.safe_load(file_p) or {}
+
+    farm = get_farm(args)
+    farm.start()
+    results = []
+    try:
+        for mode in args.modes.split(","):
+            for count in [int(count) for count in args.targets.split(",")]:
+                print(f"Benchmarking {mode} with {count} targets ...", file=sys.stderr)
+                result = run_case(farm, count, mode, args, extra)
+                print(json.dumps(result), file=sys.stderr)
+                results.append(result)
+    finally:
+        farm.stop()
+
+    report = {
+        "version": REPORT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "farm": farm.settings,
+        "settings": {
+            "scrapes": args.scrapes,
+            "interval": args.interval,
+            "timeout": args.timeout,
+            "scrape_timeout": args.scrape_timeout,
+            "extra": extra,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file_p:
+        json.dump(report, file_p, indent=2)
+    print(f"Report written to {args.output}", file=sys.stderr)
+
+    if args.compare is not None:
+        with open(args.compare) as file_p:
+            regressions = compare(json.load(file_p), report, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
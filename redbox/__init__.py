@@ -1,29 +1,74 @@
 """Main file for redbox_exporter."""
 
-from typing import Callable, Any
+from typing import Callable, List, Optional, Any
 
-import concurrent.futures
+import argparse
+import logging
 import os
 import sys
 import threading
-import time
 import timeit
 
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from socketserver import ThreadingMixIn
+from urllib.parse import SplitResult, parse_qs, urlsplit
 
 from .args import *
 from .config import *
 from .request import *
 from .prometheus import *
+from .histogram import *
+from .compression import *
+from .instrumentation import *
+from .log import *
+from .reload import *
+from .debug import *
+from .engine import *
+from .scheduler import *
+from .store import *
+from .workers import *
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# Seconds subtracted from the scrape timeout sent by Prometheus to answer in time
+SCRAPE_TIMEOUT_OFFSET = 0.5
+
+
+class Exporter:  # pylint: disable=too-few-public-methods
+    """Long-lived components of the exporter, shared by the handlers of all requests."""
+
+    def __init__(
+        self,
+        *,
+        reloader: Reloader,
+        debugger: Optional[Debugger],
+        req: Request,
+        store: Optional[SnapshotStore],
+        results: ResultCache,
+        limiter: Optional[InfoLimiter],
+        histograms: Optional[LatencyHistograms],
+        compressor: Compressor,
+        cache: Optional[ResponseCache],
+        stats: ExporterStats,
+    ) -> None:
+        self.reloader = reloader
+        self.debugger = debugger
+        self.req = req
+        self.store = store
+        self.results = results
+        self.limiter = limiter
+        self.histograms = histograms
+        self.compressor = compressor
+        self.cache = cache
+        self.stats = stats
 
 
 class Handler(BaseHTTPRequestHandler):
     """Simple webserver to serve metrics."""
 
-    def __init__(self, cfg: DsConfig, req: Request, *args: Any, **kwargs: Any) -> None:
+    def __init__(self, cfg: DsConfig, exporter: Exporter, *args: Any, **kwargs: Any) -> None:
         self.cfg = cfg
-        self.req = req
+        self.exporter = exporter
         BaseHTTPRequestHandler.__init__(self, *args, **kwargs)
 
     homepage = """<html>
@@ -39,6 +84,8 @@ class Handler(BaseHTTPRequestHandler):
       <li><strong>GitHub:</strong> <a href="{DEF_GITHUB}">{DEF_GITHUB}</a></li>
     </ul>
     <p>Go to <a href="/metrics">/metrics</a> to access metrics.</p>
+    <p>Go to <code>/probe?target=NAME</code> or <code>/probe?group_KEY=VALUE</code>
+      to probe selected targets only.</p>
   </body>
 </html>""".format(
         DEF_NAME=DEF_NAME,
@@ -52,91 +99,255 @@ class Handler(BaseHTTPRequestHandler):
         """Serves GET requests."""
         time_calling_start = timeit.default_timer()
 
+        url = urlsplit(self.path)
+
         # Display homepage
-        if self.path == "/":
+        if url.path == "/":
             self.send_response(200)
             self.send_header("Content-type", "text/html")
             self.end_headers()
             self.wfile.write(self.homepage.encode() + b"\n")
             return
         # We don't have a favicon
-        if self.path == "/favicon.ico":
+        if url.path == "/favicon.ico":
             self.send_response(404)
             self.end_headers()
             return
+        # Profiling and allocation tracing (if enabled)
+        if url.path.startswith("/debug/") and self.exporter.debugger is not None:
+            self.__debug(self.exporter.debugger, url)
+            return
+        # Probe selected targets only
+        selected = None
+        if url.path == "/probe":
+            selected = self.__get_selected(url.query)
+            if selected is None:
+                return
         # Redirect on wrong paths
-        if self.path != "/metrics":
+        elif url.path != "/metrics":
             self.send_response(302)
             self.send_header("Location", "/metrics")
             self.end_headers()
             return
 
-        # Check targets for their http response
-        # Run threaded so the time taken is not summed up by each defined target.
-        responses = []
-        config = self.cfg
-        request = self.req
+        profiler = get_profiler()
+        if profiler is None:
+            self.__scrape(url.path, selected, time_calling_start)
+        else:
+            profiler.run(True, self.__scrape, url.path, selected, time_calling_start)
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        """Log requests at debug level instead of writing every one of them to stderr."""
+        logger.debug("%s - " + format, self.address_string(), *args)
 
-        targets = config.targets
-        timeout = config.scrape_timeout
-        executor = concurrent.futures.ThreadPoolExecutor()
-        future_tasks = {executor.submit(request.request, target): target for target in targets}
+    def __scrape(
+        self, path: str, selected: Optional[List[DsTarget]], time_calling_start: float
+    ) -> None:
+        """Probe (or read the latest snapshot), render and send the metrics."""
+        # In scheduler mode /metrics only renders the latest snapshot,
+        # otherwise all (or all selected) targets are probed on every scrape,
+        # except for targets whose min_interval has not passed since their last probe.
         time_threads_start = timeit.default_timer()
-        has_timeout = False
-        try:
-            for future in concurrent.futures.as_completed(future_tasks, timeout=timeout):
-                responses.append(future.result())
-        except concurrent.futures.TimeoutError:
-            has_timeout = True
-            time_threads_end = timeit.default_timer()
-            print(
-                "Threads timed out after: {0:.6f} sec".format(
-                    time_threads_end - time_threads_start
-                ),
-                file=sys.stderr,
-            )
+        if self.exporter.store is not None and selected is None:
+            responses = self.exporter.store.snapshot()
         else:
-            time_threads_end = timeit.default_timer()
-
-        # If we encountered a thread timeout, we fill up all targets which had a timeout
-        # with default values and a timeout error;
-        if has_timeout:
-            for desired in targets:
-                desired_name = desired.name
-                need_to_add = True
-                for actual in responses:
-                    actual_name = actual.name
-                    if desired_name == actual_name:
-                        need_to_add = False
-                        break
-                if need_to_add:
-                    responses.append(
-                        request.build_failed_response(
-                            desired,
-                            "Timeout: Scrape timeout after {0:.6f}s".format(
-                                time_threads_end - time_threads_start
-                            ),
-                        )
-                    )
-
-        # Convert to prometheus format
+            cached, due = self.exporter.results.get(
+                self.cfg.targets if selected is None else selected
+            )
+            responses = []
+            if due:
+                responses = self.exporter.req.request_many(due, self.__get_scrape_timeout())
+                self.exporter.results.update(responses)
+            for response in responses:
+                # Shared responses were observed by the scrape which started the probe
+                if response.joined:
+                    continue
+                if self.exporter.histograms is not None:
+                    self.exporter.histograms.observe(response)
+                self.exporter.stats.observe_probe(response)
+            responses += cached
+        time_threads_end = timeit.default_timer()
+
+        # Convert to prometheus or OpenMetrics format and compress
+        # (only once per snapshot if cached)
         time_metrics_start = time_threads_end
-        metrics = get_prom_format(responses)
+        openmetrics = accepts_openmetrics(self.headers.get("Accept"))
+        content_type = CONTENT_TYPE_OPENMETRICS if openmetrics else CONTENT_TYPE_TEXT
+        encoding = self.exporter.compressor.negotiate(self.headers.get("Accept-Encoding"))
+        if self.exporter.cache is not None and selected is None:
+            body = self.exporter.cache.get(
+                responses,
+                content_type,
+                encoding,
+                lambda: self.__render(responses, None, openmetrics),
+            )
+        else:
+            body = self.exporter.compressor.compress(
+                self.__render(responses, selected, openmetrics), encoding
+            )
         time_metrics_end = timeit.default_timer()
 
         # Send response to scraper
         time_serving_start = time_metrics_end
         self.send_response(200)
-        self.send_header("Content-type", "text/plain")
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept, Accept-Encoding")
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
         self.end_headers()
-        self.wfile.write(metrics.encode() + b"\n")
+        self.wfile.write(body)
         time_serving_end = timeit.default_timer()
 
         # Add timing information for logging
-        print("Threads: {0:.5f}s".format(time_threads_end - time_threads_start), file=sys.stderr)
-        print("Convert: {0:.5f}s".format(time_metrics_end - time_metrics_start), file=sys.stderr)
-        print("Respond: {0:.5f}s".format(time_serving_end - time_serving_start), file=sys.stderr)
-        print("Overall: {0:.5f}s".format(time_serving_end - time_calling_start), file=sys.stderr)
+        logger.debug(
+            "Scrape of %s: Threads %.5fs, Convert %.5fs, Respond %.5fs, Overall %.5fs",
+            path,
+            time_threads_end - time_threads_start,
+            time_metrics_end - time_metrics_start,
+            time_serving_end - time_serving_start,
+            time_serving_end - time_calling_start,
+        )
+        self.exporter.stats.observe_scrape(
+            {
+                "probe": time_threads_end - time_threads_start,
+                "render": time_metrics_end - time_metrics_start,
+                "respond": time_serving_end - time_serving_start,
+                "total": time_serving_end - time_calling_start,
+            }
+        )
+
+    def __render(
+        self, responses: List[DsResponse], selected: Optional[List[DsTarget]], openmetrics: bool
+    ) -> bytes:
+        """Render responses and histograms (of the selected targets only) to a response body."""
+        metrics = get_prom_format(responses, self.exporter.limiter, openmetrics)
+        names = None if selected is None else {target.name for target in selected}
+        if self.exporter.histograms is not None:
+            metrics += "\n" + get_prom_histogram_format(
+                self.exporter.histograms, names, openmetrics
+            )
+        # Metrics about the exporter itself are only part of /metrics
+        if selected is None:
+            metrics += "\n" + get_prom_pool_format(self.exporter.req.stats(), openmetrics)
+            metrics += "\n" + get_prom_shard_format(
+                self.cfg.cluster, len(self.cfg.targets), openmetrics
+            )
+            dns_cache = get_dns_cache()
+            if dns_cache is not None:
+                metrics += "\n" + get_prom_dns_format(dns_cache.stats(), openmetrics)
+            metrics += "\n" + get_prom_exporter_format(self.exporter.stats.collect(), openmetrics)
+            metrics += "\n" + get_prom_reload_format(self.exporter.reloader.status(), openmetrics)
+        if openmetrics:
+            metrics += "\n" + OPENMETRICS_EOF
+        body = metrics.encode() + b"\n"
+        self.exporter.stats.observe_render(len(body))
+        return body
+
+    def __get_selected(self, query: str) -> Optional[List[DsTarget]]:
+        """Get the targets selected by target=NAME and group_KEY=VALUE query parameters.
+
+        Sends an error response and returns None if nothing is selected.
+        """
+        params = parse_qs(query)
+        names = params.get("target", [])
+        groups = {
+            key.split("_", 1)[1]: values
+            for key, values in params.items()
+            if key.startswith("group_")
+        }
+        if not names and not groups:
+            self.__send_error(400, "Missing 'target' or 'group_<key>' parameter")
+            return None
+        selected = self.cfg.select(names, groups)
+        if not selected:
+            self.__send_error(404, "No target matches the given parameters")
+            return None
+        return selected
+
+    def __get_scrape_timeout(self) -> float:
+        """Get the scrape timeout, capped by the one Prometheus sends along."""
+        timeout = float(self.cfg.scrape_timeout)
+        header = self.headers.get("X-Prometheus-Scrape-Timeout-Seconds")
+        if header is not None:
+            try:
+                timeout = min(timeout, float(header) - SCRAPE_TIMEOUT_OFFSET)
+            except ValueError:
+                pass
+        return max(timeout, 0.0)
+
+    def __debug(self, debugger: Debugger, url: SplitResult) -> None:
+        """Serve the /debug endpoints."""
+        params = parse_qs(url.query)
+        if not debugger.authorize(self.headers.get("Authorization"), params.get("token", [])):
+            self.__send_error(403, "Missing or invalid token")
+            return
+        try:
+            scrapes = int(params.get("scrapes", ["0"])[0])
+            seconds = float(params.get("seconds", [str(DEBUG_PROFILE_SECONDS)])[0])
+            limit = int(params.get("limit", [str(DEBUG_TEXT_LIMIT)])[0])
+            frames = int(params.get("frames", [str(DEBUG_TRACE_FRAMES)])[0])
+        except ValueError:
+            self.__send_error(400, "Invalid 'scrapes', 'seconds', 'limit' or 'frames' parameter")
+            return
+        sort = params.get("sort", ["cumulative"])[0]
+        key = params.get("key", ["lineno"])[0]
+        text = params.get("format", ["raw"])[0] == "text"
+        if seconds <= 0 or frames < 1 or sort not in PROFILE_SORT_KEYS:
+            self.__send_error(400, f"Invalid parameters, sort must be one of {PROFILE_SORT_KEYS}")
+            return
+        if key not in TRACEMALLOC_KEYS:
+            self.__send_error(400, f"Invalid parameters, key must be one of {TRACEMALLOC_KEYS}")
+            return
+
+        try:
+            if url.path == "/debug/profile":
+                stats = debugger.profiler.profile(scrapes, seconds)
+                if stats is None:
+                    self.__send_error(404, "Nothing was profiled")
+                elif text:
+                    self.__send_debug(get_pstats_text(stats, sort, limit).encode(), None)
+                else:
+                    self.__send_debug(get_pstats_dump(stats), "redbox.pstats")
+            elif url.path == "/debug/tracemalloc/start":
+                debugger.tracer.start(frames)
+                self.__send_debug(b"Tracing started\n", None)
+            elif url.path == "/debug/tracemalloc/stop":
+                debugger.tracer.stop()
+                self.__send_debug(b"Tracing stopped\n", None)
+            elif url.path == "/debug/tracemalloc/snapshot":
+                snapshot = debugger.tracer.snapshot()
+                if text:
+                    body = get_tracemalloc_text(snapshot.statistics(key), limit)
+                    self.__send_debug(body.encode(), None)
+                else:
+                    self.__send_debug(get_tracemalloc_dump(snapshot), "redbox.tracemalloc")
+            elif url.path == "/debug/tracemalloc/diff":
+                body = get_tracemalloc_text(debugger.tracer.diff(key), limit)
+                self.__send_debug(body.encode(), None)
+            else:
+                self.__send_error(404, "Unknown debug endpoint")
+        except RuntimeError as error:
+            self.__send_error(409, str(error))
+
+    def __send_debug(self, body: bytes, filename: Optional[str]) -> None:
+        """Send plain text or a file to download."""
+        self.send_response(200)
+        if filename is None:
+            self.send_header("Content-type", "text/plain")
+        else:
+            self.send_header("Content-type", "application/octet-stream")
+            self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __send_error(self, code: int, message: str) -> None:
+        """Send a plain text error response."""
+        self.send_response(code)
+        self.send_header("Content-type", "text/plain")
+        self.end_headers()
+        self.wfile.write(message.encode() + b"\n")
 
 
 class ThreadingSimpleServer(ThreadingMixIn, HTTPServer):
@@ -152,24 +363,95 @@ class ThreadingSimpleServer(ThreadingMixIn, HTTPServer):
     #    BaseHTTPRequestHandler.__init__(self, *args, **kwargs)
 
 
-def run_webserver(conf: DsConfig) -> None:
+def run_webserver(conf: DsConfig, args: argparse.Namespace) -> None:
     """Run webserver to serve metrics."""
-    print(time.asctime(), "Starting webserver on {}:{}".format(conf.listen_addr, conf.listen_port))
+    logger.info("Starting webserver on %s:%s", conf.listen_addr, conf.listen_port)
     # Initialize and run web server
 
-    def handler_with_extra_args(cfg: DsConfig, req: Request) -> Callable[[Any], Handler]:
-        return lambda *args: Handler(cfg, req, *args)
+    def handler_with_extra_args(exporter: Exporter) -> Callable[[Any], Handler]:
+        # Every request gets the configuration in use at that time
+        return lambda *args: Handler(exporter.reloader.config, exporter, *args)
+
+    # In low-cardinality mode error messages and extracts are rate limited
+    limiter = None
+    if conf.exposition["mode"] == "low_cardinality":
+        limiter = InfoLimiter(conf.exposition["info_interval"])
+
+    # Latency histograms are fed by every probe, scheduled or on scrape
+    histograms = None
+    if conf.histogram["enabled"]:
+        histograms = LatencyHistograms(conf.targets, conf.histogram["buckets"])
+
+    # Durations, sizes and probe counts of the exporter itself
+    stats = ExporterStats()
 
-    # Make conf variable available in Handler
-    req = RequestSimple()
+    # In scheduler mode targets are probed in the background
+    store = None
+    if conf.scheduler["enabled"]:
+        store = SnapshotStore(conf.targets, histograms, stats)
+
+    # Responses of targets with a min_interval are reused by scrapes until it passed
+    results = ResultCache(conf.targets)
+
+    # Snapshots only change on updates, so their responses are cached
+    # (for at most a second, so that the rendered result ages stay current)
+    compressor = Compressor(conf.compression)
+    cache = None
+    if store is not None:
+        cache = ResponseCache(compressor, RESULT_AGE_RESOLUTION)
+
+    # Probe in worker processes, each scheduling its own shard, or in this process
+    engine = None
+    scheduler = None
+    req: Request
+    if conf.workers["processes"] > 0:
+        req = RequestSharded(
+            conf, conf.workers["processes"], store.update if store is not None else None
+        )
+    else:
+        engine = Engine(conf, conf.targets)
+        req = engine.request
+        if store is not None:
+            scheduler = Scheduler(req, store.update, conf.targets, conf.scheduler)
+
+    # Scrapes and probes are only wrapped by the profiler if /debug is enabled
+    debugger = None
+    if conf.debug["enabled"]:
+        debugger = Debugger(conf.debug)
+        set_profiler(debugger.profiler)
+
+    # Reloaded targets are applied to every component keeping state per target
+    reloader = Reloader(args, conf)
+    for consumer in (limiter, histograms, store, results, scheduler):
+        if consumer is not None:
+            reloader.add_consumer(consumer.set_targets)
+    reloader.add_consumer(req.set_targets if engine is None else engine.set_targets)
 
     try:
         server = ThreadingSimpleServer(
-            (conf.listen_addr, conf.listen_port), handler_with_extra_args(conf, req)
+            (conf.listen_addr, conf.listen_port),
+            handler_with_extra_args(
+                Exporter(
+                    reloader=reloader,
+                    debugger=debugger,
+                    req=req,
+                    store=store,
+                    results=results,
+                    limiter=limiter,
+                    histograms=histograms,
+                    compressor=compressor,
+                    cache=cache,
+                    stats=stats,
+                )
+            ),
         )
     except OSError as error:
-        print(error, file=sys.stderr)
+        logger.error("%s", error)
+        stop_logging()
         sys.exit(1)
+    if scheduler is not None:
+        scheduler.start()
+    reloader.start()
     # Serve
     try:
         server.serve_forever()
@@ -177,7 +459,14 @@ def run_webserver(conf: DsConfig) -> None:
         pass
     # Shutdown
     server.server_close()
-    print(time.asctime(), "Server Stopped")
+    reloader.stop()
+    if scheduler is not None:
+        scheduler.stop()
+    if engine is not None:
+        engine.close()
+    else:
+        req.close()
+    logger.info("Server Stopped")
 
 
 def main() -> None:
@@ -185,14 +474,26 @@ def main() -> None:
     cmd_args = get_args()
 
     # Get configuration
+    time_load_start = timeit.default_timer()
     try:
         conf = get_config(cmd_args)
     except OSError as error:
         print(error, file=sys.stderr)
         sys.exit(1)
+    if cmd_args.check_config:
+        time_load = timeit.default_timer() - time_load_start
+        print(
+            f"Configuration OK: {len(conf.targets)} of {conf.cluster['targets_total']} targets "
+            f"loaded in {time_load:.3f} sec ({YAML_LOADER})"
+        )
+        sys.exit(0)
+
+    # Log through a background thread from here on
+    setup_logging(conf.logging)
 
     # Initialize and run web server
-    run_webserver(conf)
+    run_webserver(conf, cmd_args)
+    stop_logging()
 
 
 if __name__ == "__main__":
@@ -21,6 +21,7 @@ def get_args() -> argparse.Namespace:
         formatter_class=argparse.RawTextHelpFormatter,
         add_help=False,
         usage="""%(prog)s [options] -c CONF
+       %(prog)s --check-config -c CONF
        %(prog)s -v, --version
        %(prog)s -h, --help"""
         % ({"prog": DEF_NAME}),
@@ -54,6 +55,36 @@ Defaults to {} if neither, cmd argument or config settings exist.""".format(
             DEF_SRV_LISTEN_PORT
         ),
     )
+    optional.add_argument(
+        "--shard-index",
+        metavar="INDEX",
+        type=int,
+        default=None,
+        help="""Override cluster shard index from configuration file.
+This replica only probes targets of this shard (0 to shard count - 1).""",
+    )
+    optional.add_argument(
+        "--shard-count",
+        metavar="COUNT",
+        type=int,
+        default=None,
+        help="""Override cluster shard count from configuration file.
+Number of replicas sharing the targets of the configuration file.""",
+    )
+    optional.add_argument(
+        "--log-level",
+        metavar="LEVEL",
+        type=str,
+        choices=["debug", "info", "warning", "error"],
+        default=None,
+        help="""Override log level from configuration file.
+One of: debug, info, warning, error.""",
+    )
+    misc.add_argument(
+        "--check-config",
+        action="store_true",
+        help="""Validate the configuration file, show how long loading it took and exit.""",
+    )
     misc.add_argument(
         "-v",
         "--version",
@@ -0,0 +1,116 @@
+"""Compression of metrics responses negotiated by Accept-Encoding."""
+
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+import gzip
+import io
+import threading
+import timeit
+
+try:
+    import zstandard  # type: ignore
+except ImportError:
+    zstandard = None
+
+
+class Compressor:
+    """Negotiates and applies the response compression.
+
+    Supports gzip and, if the zstandard package is installed, zstd. If the
+    scraper accepts both with the same quality, zstd is preferred as it is
+    faster at a similar ratio.
+    """
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.__enabled = bool(settings["enabled"])
+        self.__gzip_level = int(settings["gzip_level"])
+        self.__zstd_level = int(settings["zstd_level"])
+        self.__encodings: List[str] = ["gzip"]
+        if zstandard is not None:
+            self.__encodings.insert(0, "zstd")
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """Get the encoding to use for an Accept-Encoding header or None to send it as is."""
+        if not self.__enabled or not accept_encoding:
+            return None
+        qualities: Dict[str, float] = {}
+        for item in accept_encoding.split(","):
+            coding, _, params = item.partition(";")
+            quality = 1.0
+            param, _, value = params.partition("=")
+            if param.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+            qualities[coding.strip().lower()] = quality
+        encoding = None
+        best = 0.0
+        for candidate in self.__encodings:
+            quality = qualities.get(candidate, qualities.get("*", 0.0))
+            if quality > best:
+                encoding = candidate
+                best = quality
+        return encoding
+
+    def compress(self, body: bytes, encoding: Optional[str]) -> bytes:
+        """Compress a response body with a negotiated encoding."""
+        if encoding == "gzip":
+            # A fixed mtime keeps the output identical for identical bodies
+            # (gzip.compress() only takes an mtime as of Python 3.8)
+            buffer = io.BytesIO()
+            with gzip.GzipFile(
+                fileobj=buffer, mode="wb", compresslevel=self.__gzip_level, mtime=0
+            ) as stream:
+                stream.write(body)
+            return buffer.getvalue()
+        if encoding == "zstd":
+            # Compressors are not thread-safe, so every call gets its own
+            compressed: bytes = zstandard.ZstdCompressor(level=self.__zstd_level).compress(body)
+            return compressed
+        return body
+
+
+class ResponseCache:
+    """Caches the rendered and compressed responses of the latest snapshot.
+
+    Snapshots of the store stay the same object until a result is updated, so
+    they key the cache by identity. Concurrent scrapes of the same snapshot wait
+    for a single rendering per content type and compression per encoding
+    instead of repeating them. Bodies are rendered again after max_age seconds,
+    as they contain the age of every result.
+    """
+
+    def __init__(self, compressor: Compressor, max_age: float) -> None:
+        self.__compressor = compressor
+        self.__max_age = max_age
+        self.__lock = threading.Lock()
+        self.__snapshot: Optional[object] = None
+        self.__rendered = 0.0
+        self.__bodies: Dict[Tuple[str, Optional[str]], bytes] = {}
+
+    def get(
+        self,
+        snapshot: object,
+        content_type: str,
+        encoding: Optional[str],
+        render: Callable[[], bytes],
+    ) -> bytes:
+        """Get the response body of a snapshot, rendering and compressing it only once."""
+        now = timeit.default_timer()
+        with self.__lock:
+            if snapshot is not self.__snapshot or now - self.__rendered >= self.__max_age:
+                self.__snapshot = snapshot
+                self.__rendered = now
+                self.__bodies = {}
+            body = self.__bodies.get((content_type, encoding))
+            if body is None:
+                plain = self.__bodies.get((content_type, None))
+                if plain is None:
+                    plain = self.__bodies[(content_type, None)] = render()
+                body = self.__compressor.compress(plain, encoding)
+                self.__bodies[(content_type, encoding)] = body
+            return body
@@ -1,17 +1,38 @@
 """Read yaml configuration file and return a parsed dictionary."""
 
-from typing import Dict, List, Any
+from typing import Dict, List, Tuple, Any
 
 import argparse
 import errno
+import glob
+import hashlib
+import importlib.util
+import json
 import os
 import re
+import stat
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader  # type: ignore
+
 from .types import DsConfig
 from .types import DsTarget
 from .template import CONFIG_TEMPLATE
 
+# Name of the yaml loader in use (CSafeLoader if PyYAML was built against libyaml)
+YAML_LOADER = SafeLoader.__name__
+
+# Settings in seconds which must not be negative, by section
+DURATIONS = {
+    "dns_cache": ("ttl", "negative_ttl", "prefetch_timeout"),
+    "connection_pool": ("keep_alive",),
+    "exposition": ("info_interval",),
+    "reload": ("watch_interval",),
+}
+
 
 def _read_config_file(path: str) -> Dict[Any, Any]:
     """Load configuration file and return yaml dictionary.
@@ -35,7 +56,7 @@ def _read_config_file(path: str) -> Dict[Any, Any]:
         raise OSError(f"[ERROR] {error}: {path}") from err_perm
     else:
         try:
-            return dict(yaml.safe_load(file_p))
+            return dict(yaml.load(file_p, Loader=SafeLoader))
         except yaml.YAMLError as err_yaml:
             error = str(err_yaml)
             raise OSError(f"[ERROR]: {path}\n{error}") from err_yaml
@@ -52,12 +73,140 @@ def _check_duplicate_targets(targets: List[Any]) -> None:
     Raises:
         OSError: If configuration file is not valid.
     """
-    names = []
+    names = set()
     for index, target in enumerate(targets):
         name = target["name"]
         if name in names:
             raise OSError(f"[CONFIG-FAIL] conf[target][{index}[name] has duplicate value '{name}'")
-        names.append(name)
+        names.add(name)
+
+
+def _check_extract(section: str, targets: List[Any]) -> None:
+    """Check if all "extract" regexes compile.
+
+    Args:
+        section (str): Name of the section holding the targets.
+        targets (list): Yaml configuration of targets.
+
+    Raises:
+        OSError: If configuration file is not valid.
+    """
+    for index, target in enumerate(targets):
+        for key, regexes in target.get("extract", {}).items():
+            if not isinstance(regexes, list):
+                raise OSError(f"[CONFIG-FAIL] {section}[{index}][extract][{key}] must be a list")
+            for regex in regexes:
+                try:
+                    re.compile(str(regex).encode())
+                except re.error as err_re:
+                    raise OSError(
+                        f"[CONFIG-FAIL] {section}[{index}][extract][{key}] "
+                        f"invalid regex '{regex}': {err_re}"
+                    ) from err_re
+
+
+def _check_buckets(section: str, buckets: Any) -> None:
+    """Check if histogram buckets are a strictly increasing list of numbers.
+
+    Args:
+        section (str): Name of the section holding the buckets.
+        buckets (list): Histogram bucket upper bounds.
+
+    Raises:
+        OSError: If configuration file is not valid.
+    """
+    for index, bucket in enumerate(buckets):
+        if isinstance(bucket, bool) or not isinstance(bucket, (int, float)):
+            raise OSError(f"[CONFIG-FAIL] {section}[{index}] = '{bucket}' must be a number")
+        if index > 0 and bucket <= buckets[index - 1]:
+            raise OSError(f"[CONFIG-FAIL] {section}[{index}] = '{bucket}' must be increasing")
+
+
+def _check_scheduler(scheduler: Dict[Any, Any]) -> None:
+    """Check if the scheduler interval is positive (the scheduler would spin otherwise).
+
+    Args:
+        scheduler (dict): Scheduler settings.
+
+    Raises:
+        OSError: If configuration is not valid.
+    """
+    interval = scheduler.get("interval", 1)
+    if interval <= 0:
+        raise OSError(
+            f"[CONFIG-FAIL] conf[scheduler][interval] = '{interval}' must be greater than 0"
+        )
+
+
+def _check_durations(conf: Dict[Any, Any]) -> None:
+    """Check if the durations of all sections are not negative.
+
+    Args:
+        conf (dict): Configuration.
+
+    Raises:
+        OSError: If configuration is not valid.
+    """
+    for section, keys in DURATIONS.items():
+        for key in keys:
+            value = conf.get(section, {}).get(key, 0)
+            if value < 0:
+                raise OSError(
+                    f"[CONFIG-FAIL] conf[{section}][{key}] = '{value}' must not be negative"
+                )
+
+
+def _check_engine(engine: Dict[Any, Any]) -> None:
+    """Check if the packages the probe engine requires are installed.
+
+    Args:
+        engine (dict): Engine settings.
+
+    Raises:
+        OSError: If configuration is not valid.
+    """
+    if engine.get("type") == "async" and importlib.util.find_spec("aiohttp") is None:
+        raise OSError("[CONFIG-FAIL] conf[engine][type] = 'async' requires the aiohttp package")
+
+
+def _check_intervals(section: str, targets: List[Any]) -> None:
+    """Check if the intervals of all targets are not negative (0 uses the default).
+
+    Args:
+        section (str): Name of the section holding the targets.
+        targets (list): Targets to check.
+
+    Raises:
+        OSError: If configuration is not valid.
+    """
+    for index, target in enumerate(targets):
+        for key in ("interval", "min_interval"):
+            value = target.get(key, 0)
+            if value < 0:
+                raise OSError(
+                    f"[CONFIG-FAIL] {section}[{index}][{key}] = '{value}' must not be negative"
+                )
+
+
+def _compile_template(template: Dict[Any, Any]) -> Dict[Any, Any]:
+    """Recursively copy the configuration template with its "allowed" regexes compiled.
+
+    Args:
+        template (dict): Configuration template.
+
+    Returns:
+        dict: Template with an additional "regex" (compiled "allowed" or None) per key.
+    """
+    compiled = {}
+    for key, spec in template.items():
+        compiled[key] = dict(spec)
+        compiled[key]["regex"] = re.compile(spec["allowed"]) if "allowed" in spec else None
+        compiled[key]["childs"] = _compile_template(spec["childs"])
+    return compiled
+
+
+# Template with precompiled regexes, built once and used for every validation
+_COMPILED_TEMPLATE = _compile_template(CONFIG_TEMPLATE)
 
 
 def _check_config(section: str, config: Dict[Any, Any], template: Dict[Any, Any]) -> None:
@@ -66,40 +215,36 @@ def _check_config(section: str, config: Dict[Any, Any], template: Dict[Any, Any]
     Args:
         section (str): Name of the current section to validate.
         config (dict): Yaml configuration.
-        template (dict): Configuration template.
+        template (dict): Compiled configuration template (see _compile_template).
 
     Raises:
         OSError: If configuration file is not valid.
     """
-    for key in template:
-        # print(f"[CONFIG-INFO] checking {section}[{key}]")
-
+    for key, spec in template.items():
         # Check Required
-        if template[key]["required"] and key not in config:
-            raise OSError(f"[CONFIG-FAIL] {section}[{key}] not defined, but required")
+        if key not in config:
+            if spec["required"]:
+                raise OSError(f"[CONFIG-FAIL] {section}[{key}] not defined, but required")
+            continue
+        value = config[key]
 
         # Check Type
-        if key in config and not isinstance(config[key], template[key]["type"]):
-            req_type = template[key]["type"]
+        if not isinstance(value, spec["type"]):
+            req_type = spec["type"]
             raise OSError(f"[CONFIG-FAIL] {section}[{key}] must be of type: {req_type}")
 
         # Check Allowed value by Regex
-        if key in config and "allowed" in template[key]:
-            regex = template[key]["allowed"]
-            value = str(config[key])
-            regobj = re.compile(regex)
-            if regobj.match(value) is None:
-                raise OSError(f"[CONFIG-FAIL] {section}[{key}] = '{value}' must match: '{regex}'")
+        if spec["regex"] is not None and spec["regex"].match(str(value)) is None:
+            regex = spec["allowed"]
+            raise OSError(f"[CONFIG-FAIL] {section}[{key}] = '{value}' must match: '{regex}'")
 
         # Recurse into childs
-        if template[key]["childs"]:
-            if key in config and isinstance(config[key], dict):
-                _check_config(section + f"[{key}]", config[key], template[key]["childs"])
-            if key in config and isinstance(config[key], list):
-                for index, value in enumerate(config[key]):
-                    _check_config(
-                        section + f"[{key}][{index}]", config[key][index], template[key]["childs"]
-                    )
+        if spec["childs"]:
+            if isinstance(value, dict):
+                _check_config(section + f"[{key}]", value, spec["childs"])
+            if isinstance(value, list):
+                for index, child in enumerate(value):
+                    _check_config(section + f"[{key}][{index}]", child, spec["childs"])
 
 
 def _merge_defaults(
@@ -120,6 +265,9 @@ def _merge_defaults(
 
         # Recurse into childs
         if template[key]["childs"] and "default" not in template[key]:
+            # Optional sections without a default get their child defaults
+            if key not in config and template[key]["type"] == dict:
+                config[key] = {}
             if key in config:
                 if template[key]["type"] == list:
                     for index, value in enumerate(config[key]):
@@ -140,6 +288,173 @@ def _merge_defaults(
     return config
 
 
+def _read_target_file(path: str) -> List[Any]:
+    """Load a target file (a yaml or json list of targets).
+
+    Args:
+        path (str): Path to the target file.
+
+    Returns:
+        list: Targets in yaml format (Python dicts).
+
+    Raises:
+        OSError: If the file cannot be read or parsed or is not a list.
+    """
+    try:
+        with open(path) as file_p:
+            if path.endswith(".json"):
+                targets = json.load(file_p)
+            else:
+                targets = yaml.load(file_p, Loader=SafeLoader)
+    except (yaml.YAMLError, ValueError) as err_parse:
+        raise OSError(f"[ERROR]: {path}\n{err_parse}") from err_parse
+    except OSError as err_file:
+        raise OSError(f"[ERROR] {err_file.strerror}: {path}") from err_file
+    if targets is None:
+        return []
+    if not isinstance(targets, list):
+        raise OSError(f"[CONFIG-FAIL] {path} must be a list of targets")
+    return targets
+
+
+def _load_target_file(path: str) -> List[Dict[Any, Any]]:
+    """Load, validate and merge the targets of a target file with their defaults.
+
+    Args:
+        path (str): Path to the target file.
+
+    Returns:
+        list: Targets with default values.
+
+    Raises:
+        OSError: If the file is not valid.
+    """
+    config = {"targets": _read_target_file(path)}
+    _check_config(path, config, {"targets": _COMPILED_TEMPLATE["targets"]})
+    _check_extract(f"{path}[targets]", config["targets"])
+    _check_intervals(f"{path}[targets]", config["targets"])
+    for index, target in enumerate(config["targets"]):
+        _check_buckets(f"{path}[targets][{index}][buckets]", target.get("buckets", []))
+    config = _merge_defaults(path, config, {"targets": CONFIG_TEMPLATE["targets"]})
+    return list(config["targets"])
+
+
+# Validated targets of every loaded target file with the modification time and size it had
+_TARGET_FILES: Dict[str, Tuple[Tuple[int, int], List[Dict[Any, Any]]]] = {}
+
+
+def get_target_files(patterns: List[str], base: str) -> Dict[str, Tuple[int, int]]:
+    """Find all target files matching glob patterns.
+
+    Args:
+        patterns (list): Glob patterns, relative ones are relative to base.
+        base (str): Directory of the configuration file.
+
+    Returns:
+        dict: Modification time (ns) and size of each file by path in a stable order.
+    """
+    files = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(base, pattern))):
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            if stat.S_ISREG(stat_result.st_mode):
+                files[path] = (stat_result.st_mtime_ns, stat_result.st_size)
+    return files
+
+
+def _get_file_targets(files: Dict[str, Tuple[int, int]]) -> List[Dict[Any, Any]]:
+    """Get the targets of all target files.
+
+    Only files whose modification time or size changed since they were last
+    loaded are read and validated again, all others are taken from the cache.
+
+    Args:
+        files (dict): Modification time and size of each file by path.
+
+    Returns:
+        list: Targets with default values.
+
+    Raises:
+        OSError: If a changed file is not valid.
+    """
+    loaded = {}
+    for path, stat_key in files.items():
+        cached = _TARGET_FILES.get(path)
+        if cached is None or cached[0] != stat_key:
+            cached = (stat_key, _load_target_file(path))
+        loaded[path] = cached
+    # Only replace the cache when all files are valid, which also forgets removed files
+    _TARGET_FILES.clear()
+    _TARGET_FILES.update(loaded)
+    return [target for path in files for target in loaded[path][1]]
+
+
+def _get_shard(name: str, count: int) -> int:
+    """Get the cluster shard of a target by jump consistent hashing of its name.
+
+    When the shard count grows from n to n + 1, only 1/(n + 1) of all targets move
+    (all of them to the new shard), so adding a replica reassigns as few as possible.
+    See: https://arxiv.org/abs/1406.2294
+
+    Args:
+        name (str): Name of the target.
+        count (int): Number of shards.
+
+    Returns:
+        int: Shard index from 0 to count - 1.
+    """
+    key = int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "big")
+    shard, jump = -1, 0
+    while jump < count:
+        shard = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((shard + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return shard
+
+
+def _check_cluster(cluster: Dict[Any, Any]) -> None:
+    """Check if the shard index is within the shard count.
+
+    Args:
+        cluster (dict): Cluster sharding settings.
+
+    Raises:
+        OSError: If configuration is not valid.
+    """
+    index = cluster["shard_index"]
+    count = cluster["shard_count"]
+    if count < 1:
+        raise OSError(f"[CONFIG-FAIL] conf[cluster][shard_count] = '{count}' must be at least 1")
+    if not 0 <= index < count:
+        raise OSError(
+            f"[CONFIG-FAIL] conf[cluster][shard_index] = '{index}' must be 0 to {count - 1}"
+        )
+
+
+def _check_limits(limits: Dict[Any, Any]) -> None:
+    """Check if the limits of every host and group key are valid (like the default limits).
+
+    Args:
+        limits (dict): Probe limit settings.
+
+    Raises:
+        OSError: If configuration is not valid.
+    """
+    template = _COMPILED_TEMPLATE["limits"]["childs"]["host"]["childs"]
+    for key in ("hosts", "groups"):
+        for name, settings in limits.get(key, {}).items():
+            section = f"conf[limits][{key}][{name}]"
+            if not isinstance(settings, dict):
+                raise OSError(f"[CONFIG-FAIL] {section} must be of type: {dict}")
+            for setting in settings:
+                if setting not in template:
+                    raise OSError(f"[CONFIG-FAIL] {section}[{setting}] is not a valid limit")
+            _check_config(section, settings, template)
+
+
 def get_config(args: argparse.Namespace) -> DsConfig:
     """Return configuration file as dictionary.
 
@@ -155,22 +470,52 @@ def get_config(args: argparse.Namespace) -> DsConfig:
     conf = _read_config_file(args.conf)
 
     # Validate
-    _check_config("conf", conf, CONFIG_TEMPLATE)
-    _check_duplicate_targets(conf["targets"])
+    _check_config("conf", conf, _COMPILED_TEMPLATE)
+    if "targets" not in conf and "target_files" not in conf:
+        raise OSError("[CONFIG-FAIL] conf[targets] not defined, but required")
+    conf.setdefault("targets", [])
+    for index, pattern in enumerate(conf.get("target_files", [])):
+        if not isinstance(pattern, str):
+            raise OSError(f"[CONFIG-FAIL] conf[target_files][{index}] must be of type: {str}")
+    _check_extract("conf[targets]", conf["targets"])
+    _check_intervals("conf[targets]", conf["targets"])
+    _check_scheduler(conf.get("scheduler", {}))
+    _check_durations(conf)
+    _check_engine(conf.get("engine", {}))
+    _check_limits(conf.get("limits", {}))
+    _check_buckets("conf[histogram][buckets]", conf.get("histogram", {}).get("buckets", []))
+    for index, target in enumerate(conf["targets"]):
+        _check_buckets(f"conf[targets][{index}][buckets]", target.get("buckets", []))
 
     # Merge with defaults
     conf = _merge_defaults("conf", conf, CONFIG_TEMPLATE)
 
+    # Add the targets of target files (targets names are unique across all of them)
+    files = get_target_files(conf["target_files"], os.path.dirname(args.conf))
+    conf["targets"] = conf["targets"] + _get_file_targets(files)
+    _check_duplicate_targets(conf["targets"])
+
     # Override with command line arguments if exist
     if args.listen is not None:
         conf["listen_addr"] = args.listen
     if args.port is not None:
         conf["listen_port"] = args.port
+    if args.shard_index is not None:
+        conf["cluster"]["shard_index"] = args.shard_index
+    if args.shard_count is not None:
+        conf["cluster"]["shard_count"] = args.shard_count
+    _check_cluster(conf["cluster"])
+    if args.log_level is not None:
+        conf["logging"]["level"] = args.log_level
 
     # Return with correct data type
-    return DsConfig(
-        conf["scrape_timeout"],
-        conf["listen_addr"],
-        conf["listen_port"],
-        [DsTarget(target) for target in conf["targets"]],
-    )
+    # Only keep the targets of this replica's shard
+    count = conf["cluster"]["shard_count"]
+    index = conf["cluster"]["shard_index"]
+    conf["cluster"]["targets_total"] = len(conf["targets"])
+    conf["targets"] = [
+        DsTarget(target)
+        for target in conf["targets"]
+        if count == 1 or _get_shard(str(target["name"]), count) == index
+    ]
+    return DsConfig(conf)
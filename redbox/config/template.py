@@ -7,9 +7,27 @@ regexp:    Regexp expression for valid values of this key.
 required:  Determines if this key is requuired or not.
 childs:    Defines child nodes if key is a list or dictionary.
 """
+
 from ..defaults import DEF_SCRAPE_TIMEOUT
 from ..defaults import DEF_SRV_LISTEN_ADDR, DEF_SRV_LISTEN_PORT
-from ..defaults import DEF_REQUEST_METHOD, DEF_REQUEST_TIMEOUT
+from ..defaults import DEF_REQUEST_METHOD, DEF_REQUEST_TIMEOUT, DEF_REQUEST_MAX_EXTRACT_BYTES
+from ..defaults import DEF_SCHEDULER_ENABLED, DEF_SCHEDULER_INTERVAL
+from ..defaults import DEF_SCHEDULER_JITTER
+from ..defaults import DEF_PROBE_POOL_SIZE
+from ..defaults import DEF_LIMITS_CONCURRENCY, DEF_LIMITS_RATE, DEF_LIMITS_BURST
+from ..defaults import DEF_WORKERS_PROCESSES
+from ..defaults import DEF_CLUSTER_SHARD_INDEX, DEF_CLUSTER_SHARD_COUNT
+from ..defaults import DEF_EXPOSITION_MODE, DEF_EXPOSITION_INFO_INTERVAL
+from ..defaults import DEF_HISTOGRAM_ENABLED, DEF_HISTOGRAM_BUCKETS
+from ..defaults import DEF_ENGINE_TYPE, DEF_ENGINE_CONCURRENCY
+from ..defaults import DEF_POOL_ENABLED, DEF_POOL_SIZE, DEF_POOL_KEEP_ALIVE
+from ..defaults import DEF_DNS_CACHE_ENABLED, DEF_DNS_CACHE_TTL, DEF_DNS_CACHE_NEGATIVE_TTL
+from ..defaults import DEF_DNS_CACHE_PREFETCH_WORKERS, DEF_DNS_CACHE_PREFETCH_TIMEOUT
+from ..defaults import DEF_COMPRESSION_ENABLED, DEF_COMPRESSION_GZIP_LEVEL
+from ..defaults import DEF_COMPRESSION_ZSTD_LEVEL
+from ..defaults import DEF_RELOAD_WATCH_INTERVAL
+from ..defaults import DEF_DEBUG_ENABLED, DEF_DEBUG_TOKEN
+from ..defaults import DEF_LOG_LEVEL, DEF_LOG_FORMAT, DEF_LOG_SUCCESS_SAMPLE, DEF_LOG_QUEUE_SIZE
 
 
 CONFIG_TEMPLATE = {
@@ -33,9 +51,340 @@ CONFIG_TEMPLATE = {
         "allowed": "^[0-9]+$",
         "childs": {},
     },
+    "scheduler": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "enabled": {
+                "type": bool,
+                "default": DEF_SCHEDULER_ENABLED,
+                "required": False,
+                "childs": {},
+            },
+            "interval": {
+                "type": (int, float),
+                "default": DEF_SCHEDULER_INTERVAL,
+                "required": False,
+                "childs": {},
+            },
+            "jitter": {
+                "type": (int, float),
+                "default": DEF_SCHEDULER_JITTER,
+                "required": False,
+                "allowed": "^(0(\\.[0-9]+)?|1(\\.0+)?)$",
+                "childs": {},
+            },
+        },
+    },
+    "exposition": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "mode": {
+                "type": str,
+                "default": DEF_EXPOSITION_MODE,
+                "required": False,
+                "allowed": "^(full|low_cardinality)$",
+                "childs": {},
+            },
+            "info_interval": {
+                "type": (int, float),
+                "default": DEF_EXPOSITION_INFO_INTERVAL,
+                "required": False,
+                "childs": {},
+            },
+        },
+    },
+    "histogram": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "enabled": {
+                "type": bool,
+                "default": DEF_HISTOGRAM_ENABLED,
+                "required": False,
+                "childs": {},
+            },
+            "buckets": {
+                "type": list,
+                "default": DEF_HISTOGRAM_BUCKETS,
+                "required": False,
+                "childs": {},
+            },
+        },
+    },
+    "cluster": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "shard_index": {
+                "type": int,
+                "default": DEF_CLUSTER_SHARD_INDEX,
+                "required": False,
+                "allowed": "^[0-9]+$",
+                "childs": {},
+            },
+            "shard_count": {
+                "type": int,
+                "default": DEF_CLUSTER_SHARD_COUNT,
+                "required": False,
+                "allowed": "^[1-9][0-9]*$",
+                "childs": {},
+            },
+        },
+    },
+    "workers": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "processes": {
+                "type": int,
+                "default": DEF_WORKERS_PROCESSES,
+                "required": False,
+                "allowed": "^[0-9]+$",
+                "childs": {},
+            },
+        },
+    },
+    "probe_pool": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "size": {
+                "type": int,
+                "default": DEF_PROBE_POOL_SIZE,
+                "required": False,
+                "allowed": "^[1-9][0-9]*$",
+                "childs": {},
+            },
+        },
+    },
+    "limits": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "host": {
+                "type": dict,
+                "required": False,
+                "childs": {
+                    "concurrency": {
+                        "type": int,
+                        "default": DEF_LIMITS_CONCURRENCY,
+                        "required": False,
+                        "allowed": "^[0-9]+$",
+                        "childs": {},
+                    },
+                    "rate": {
+                        "type": (int, float),
+                        "default": DEF_LIMITS_RATE,
+                        "required": False,
+                        "allowed": "^[0-9]+(\\.[0-9]+)?$",
+                        "childs": {},
+                    },
+                    "burst": {
+                        "type": int,
+                        "default": DEF_LIMITS_BURST,
+                        "required": False,
+                        "allowed": "^[1-9][0-9]*$",
+                        "childs": {},
+                    },
+                },
+            },
+            "hosts": {
+                "type": dict,
+                "default": {},
+                "required": False,
+                "childs": {},
+            },
+            "groups": {
+                "type": dict,
+                "default": {},
+                "required": False,
+                "childs": {},
+            },
+        },
+    },
+    "engine": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "type": {
+                "type": str,
+                "default": DEF_ENGINE_TYPE,
+                "required": False,
+                "allowed": "^(simple|async)$",
+                "childs": {},
+            },
+            "concurrency": {
+                "type": int,
+                "default": DEF_ENGINE_CONCURRENCY,
+                "required": False,
+                "allowed": "^[1-9][0-9]*$",
+                "childs": {},
+            },
+        },
+    },
+    "connection_pool": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "enabled": {
+                "type": bool,
+                "default": DEF_POOL_ENABLED,
+                "required": False,
+                "childs": {},
+            },
+            "size": {
+                "type": int,
+                "default": DEF_POOL_SIZE,
+                "required": False,
+                "allowed": "^[1-9][0-9]*$",
+                "childs": {},
+            },
+            "keep_alive": {
+                "type": (int, float),
+                "default": DEF_POOL_KEEP_ALIVE,
+                "required": False,
+                "childs": {},
+            },
+        },
+    },
+    "dns_cache": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "enabled": {
+                "type": bool,
+                "default": DEF_DNS_CACHE_ENABLED,
+                "required": False,
+                "childs": {},
+            },
+            "ttl": {
+                "type": (int, float),
+                "default": DEF_DNS_CACHE_TTL,
+                "required": False,
+                "childs": {},
+            },
+            "negative_ttl": {
+                "type": (int, float),
+                "default": DEF_DNS_CACHE_NEGATIVE_TTL,
+                "required": False,
+                "childs": {},
+            },
+            "prefetch_workers": {
+                "type": int,
+                "default": DEF_DNS_CACHE_PREFETCH_WORKERS,
+                "required": False,
+                "allowed": "^[1-9][0-9]*$",
+                "childs": {},
+            },
+            "prefetch_timeout": {
+                "type": (int, float),
+                "default": DEF_DNS_CACHE_PREFETCH_TIMEOUT,
+                "required": False,
+                "childs": {},
+            },
+        },
+    },
+    "compression": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "enabled": {
+                "type": bool,
+                "default": DEF_COMPRESSION_ENABLED,
+                "required": False,
+                "childs": {},
+            },
+            "gzip_level": {
+                "type": int,
+                "default": DEF_COMPRESSION_GZIP_LEVEL,
+                "required": False,
+                "allowed": "^[1-9]$",
+                "childs": {},
+            },
+            "zstd_level": {
+                "type": int,
+                "default": DEF_COMPRESSION_ZSTD_LEVEL,
+                "required": False,
+                "allowed": "^([1-9]|1[0-9]|2[0-2])$",
+                "childs": {},
+            },
+        },
+    },
+    "logging": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "level": {
+                "type": str,
+                "default": DEF_LOG_LEVEL,
+                "required": False,
+                "allowed": "^(debug|info|warning|error)$",
+                "childs": {},
+            },
+            "format": {
+                "type": str,
+                "default": DEF_LOG_FORMAT,
+                "required": False,
+                "allowed": "^(text|json)$",
+                "childs": {},
+            },
+            "success_sample": {
+                "type": (int, float),
+                "default": DEF_LOG_SUCCESS_SAMPLE,
+                "required": False,
+                "allowed": "^(0(\\.[0-9]+)?|1(\\.0+)?)$",
+                "childs": {},
+            },
+            "queue_size": {
+                "type": int,
+                "default": DEF_LOG_QUEUE_SIZE,
+                "required": False,
+                "allowed": "^[1-9][0-9]*$",
+                "childs": {},
+            },
+        },
+    },
+    "reload": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "watch_interval": {
+                "type": (int, float),
+                "default": DEF_RELOAD_WATCH_INTERVAL,
+                "required": False,
+                "childs": {},
+            },
+        },
+    },
+    "debug": {
+        "type": dict,
+        "required": False,
+        "childs": {
+            "enabled": {
+                "type": bool,
+                "default": DEF_DEBUG_ENABLED,
+                "required": False,
+                "childs": {},
+            },
+            "token": {
+                "type": str,
+                "default": DEF_DEBUG_TOKEN,
+                "required": False,
+                "childs": {},
+            },
+        },
+    },
+    "target_files": {
+        "type": list,
+        "default": [],
+        "required": False,
+        "childs": {},
+    },
     "targets": {
         "type": list,
-        "required": True,
+        "required": False,
         "childs": {
             "name": {
                 "type": str,
@@ -78,6 +427,38 @@ CONFIG_TEMPLATE = {
                 "default": DEF_REQUEST_TIMEOUT,
                 "childs": {},
             },
+            "interval": {
+                "type": (int, float),
+                "required": False,
+                "default": 0,
+                "childs": {},
+            },
+            "min_interval": {
+                "type": (int, float),
+                "required": False,
+                "default": 0,
+                "childs": {},
+            },
+            "reuse_connection": {
+                "type": bool,
+                "required": False,
+                "default": True,
+                "childs": {},
+            },
+            "max_body_bytes": {
+                "type": int,
+                "required": False,
+                "default": 0,
+                "allowed": "^[0-9]+$",
+                "childs": {},
+            },
+            "max_extract_bytes": {
+                "type": int,
+                "required": False,
+                "default": DEF_REQUEST_MAX_EXTRACT_BYTES,
+                "allowed": "^[0-9]+$",
+                "childs": {},
+            },
             "redirect": {
                 "type": bool,
                 "required": False,
@@ -175,6 +556,12 @@ CONFIG_TEMPLATE = {
                 "default": {},
                 "childs": {},
             },
+            "buckets": {
+                "type": list,
+                "required": False,
+                "default": [],
+                "childs": {},
+            },
         },
     },
 }
@@ -1,9 +1,27 @@
 """Datatype definition."""
 
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple, Any
 
 from ...types import DsTarget
 
+# Sections of settings, each exposed as a dict by the property of the same name
+SECTIONS = (
+    "scheduler",
+    "exposition",
+    "histogram",
+    "cluster",
+    "workers",
+    "probe_pool",
+    "limits",
+    "engine",
+    "connection_pool",
+    "dns_cache",
+    "compression",
+    "logging",
+    "reload",
+    "debug",
+)
+
 
 class DsConfig:
     """Datastructure for config."""
@@ -23,15 +41,114 @@ class DsConfig:
         """Listen port."""
         return self.__listen_port
 
+    @property
+    def scheduler(self) -> Dict[str, Any]:
+        """Background scheduler settings."""
+        return self.__sections["scheduler"]
+
+    @property
+    def exposition(self) -> Dict[str, Any]:
+        """Metrics exposition settings."""
+        return self.__sections["exposition"]
+
+    @property
+    def histogram(self) -> Dict[str, Any]:
+        """Latency histogram settings."""
+        return self.__sections["histogram"]
+
+    @property
+    def cluster(self) -> Dict[str, Any]:
+        """Cluster sharding settings and the number of targets before sharding."""
+        return self.__sections["cluster"]
+
+    @property
+    def workers(self) -> Dict[str, Any]:
+        """Worker process settings."""
+        return self.__sections["workers"]
+
+    @property
+    def probe_pool(self) -> Dict[str, Any]:
+        """Probe pool settings."""
+        return self.__sections["probe_pool"]
+
+    @property
+    def limits(self) -> Dict[str, Any]:
+        """Per-host and per-group probe limit settings."""
+        return self.__sections["limits"]
+
+    @property
+    def engine(self) -> Dict[str, Any]:
+        """Probe engine settings."""
+        return self.__sections["engine"]
+
+    @property
+    def connection_pool(self) -> Dict[str, Any]:
+        """Connection pool settings."""
+        return self.__sections["connection_pool"]
+
+    @property
+    def dns_cache(self) -> Dict[str, Any]:
+        """DNS cache settings."""
+        return self.__sections["dns_cache"]
+
+    @property
+    def compression(self) -> Dict[str, Any]:
+        """Response compression settings."""
+        return self.__sections["compression"]
+
+    @property
+    def logging(self) -> Dict[str, Any]:
+        """Logging settings."""
+        return self.__sections["logging"]
+
+    @property
+    def reload(self) -> Dict[str, Any]:
+        """Configuration reload settings."""
+        return self.__sections["reload"]
+
+    @property
+    def debug(self) -> Dict[str, Any]:
+        """Profiling and allocation tracing endpoint settings."""
+        return self.__sections["debug"]
+
+    @property
+    def target_files(self) -> List[str]:
+        """Glob patterns of files with additional targets."""
+        return self.__target_files
+
     @property
     def targets(self) -> List[DsTarget]:
         """List of targets to check."""
         return self.__targets
 
-    def __init__(
-        self, scrape_timeout: int, listen_addr: str, listen_port: int, targets: List[DsTarget]
-    ) -> None:
-        self.__scrape_timeout = scrape_timeout
-        self.__listen_addr = listen_addr
-        self.__listen_port = listen_port
-        self.__targets = targets
+    def __init__(self, config: Dict[str, Any]) -> None:
+        self.__scrape_timeout = int(config["scrape_timeout"])
+        self.__listen_addr = str(config["listen_addr"])
+        self.__listen_port = int(config["listen_port"])
+        self.__sections = {section: dict(config[section]) for section in SECTIONS}
+        self.__target_files = list(config["target_files"])
+        self.__targets = list(config["targets"])
+
+        # Index targets by name and by group value to select them without a scan
+        self.__name_index: Dict[str, int] = {}
+        self.__group_index: Dict[Tuple[str, str], Set[int]] = {}
+        for position, target in enumerate(self.__targets):
+            self.__name_index[target.name] = position
+            for key, value in target.groups.items():
+                self.__group_index.setdefault((str(key), str(value)), set()).add(position)
+
+    def select(self, names: List[str], groups: Dict[str, List[str]]) -> List[DsTarget]:
+        """Get targets by name and group values in configuration order.
+
+        Targets must have any of the given names (if any are given) and for every
+        given group key, any of the given values of that group.
+        """
+        positions: Optional[Set[int]] = None
+        if names:
+            positions = {self.__name_index[name] for name in names if name in self.__name_index}
+        for key, values in groups.items():
+            matching: Set[int] = set()
+            for value in values:
+                matching |= self.__group_index.get((key, value), set())
+            positions = matching if positions is None else positions & matching
+        return [self.__targets[position] for position in sorted(positions or set())]
@@ -0,0 +1,261 @@
+"""On-demand CPU profiling and allocation tracing of the exporter process."""
+
+from typing import Callable, Dict, List, Optional, TypeVar, Any
+
+import cProfile
+import hmac
+import io
+import marshal
+import pickle
+import pstats
+import threading
+import tracemalloc
+
+T = TypeVar("T")
+
+# Sort keys of text profiles
+PROFILE_SORT_KEYS = ("cumulative", "tottime", "calls", "ncalls", "filename", "name")
+
+# Grouping keys of allocation statistics
+TRACEMALLOC_KEYS = ("lineno", "filename", "traceback")
+
+# Defaults of the query parameters of the /debug endpoints
+DEBUG_PROFILE_SECONDS = 30.0
+DEBUG_TEXT_LIMIT = 50
+DEBUG_TRACE_FRAMES = 25
+
+
+class ProfileSession:
+    """Profiles collected until a number of scrapes finished or the session is stopped."""
+
+    def __init__(self, scrapes: int) -> None:
+        self.__lock = threading.Lock()
+        self.__remaining = scrapes
+        self.__profiles: List[cProfile.Profile] = []
+        self.__done = threading.Event()
+
+    @property
+    def done(self) -> threading.Event:
+        """Set once the number of scrapes finished."""
+        return self.__done
+
+    def add(self, profile: cProfile.Profile, scrape: bool) -> None:
+        """Add the profile of a finished scrape or probe."""
+        with self.__lock:
+            self.__profiles.append(profile)
+            if scrape:
+                self.__remaining -= 1
+                if self.__remaining == 0:
+                    self.__done.set()
+
+    def stats(self) -> Optional[pstats.Stats]:
+        """Merge all profiles (None if nothing was profiled)."""
+        with self.__lock:
+            if not self.__profiles:
+                return None
+            stats = pstats.Stats(self.__profiles[0])
+            for profile in self.__profiles[1:]:
+                stats.add(profile)
+            return stats
+
+
+class Profiler:
+    """Runs cProfile over scrapes and probes while a profiling session is active.
+
+    cProfile only profiles the thread it is enabled in, so every scrape and
+    every probe of the probe pool is profiled on its own and all of them are
+    merged at the end. Without a session, run() only checks a single attribute.
+    Probes of worker processes and coroutines of the async engine are not seen.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__session: Optional[ProfileSession] = None
+        self.__local = threading.local()
+
+    @property
+    def active(self) -> bool:
+        """True while a profiling session is running."""
+        return self.__session is not None
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def profile(self, scrapes: int, seconds: float) -> Optional[pstats.Stats]:
+        """Profile the next scrapes (if more than 0) or everything for a number of seconds.
+
+        Waits at most seconds in both cases.
+
+        Raises:
+            RuntimeError: If another session is running.
+        """
+        session = ProfileSession(scrapes)
+        with self.__lock:
+            if self.__session is not None:
+                raise RuntimeError("Another profile is running")
+            self.__session = session
+        try:
+            session.done.wait(seconds)
+        finally:
+            with self.__lock:
+                self.__session = None
+        return session.stats()
+
+    def run(self, scrape: bool, func: Callable[..., T], *args: Any) -> T:
+        """Run func(*args), profiled if a session is running and counted if it is a scrape."""
+        session = self.__session
+        # Probes of a scrape may run in its own thread, which is profiled already
+        if session is None or getattr(self.__local, "profiling", False):
+            return func(*args)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is active in this thread
+            return func(*args)
+        self.__local.profiling = True
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            self.__local.profiling = False
+            session.add(profile, scrape)
+
+
+class AllocationTracer:
+    """Takes tracemalloc snapshots and diffs them against the previous one.
+
+    Tracing slows down every allocation, so it only runs between start() and stop().
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__previous: Optional[tracemalloc.Snapshot] = None
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def start(self, frames: int) -> None:
+        """Start tracing with this many frames per traceback and take a first snapshot."""
+        with self.__lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            tracemalloc.start(frames)
+            self.__previous = AllocationTracer.__take()
+
+    def stop(self) -> None:
+        """Stop tracing and free all traces."""
+        with self.__lock:
+            tracemalloc.stop()
+            self.__previous = None
+
+    def snapshot(self) -> tracemalloc.Snapshot:
+        """Take a snapshot, which the next diff is compared against.
+
+        Raises:
+            RuntimeError: If tracing was not started.
+        """
+        with self.__lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("Tracing is not started")
+            self.__previous = AllocationTracer.__take()
+            return self.__previous
+
+    def diff(self, key: str) -> List[tracemalloc.StatisticDiff]:
+        """Take a snapshot and compare it against the previous one, grouped by key.
+
+        Raises:
+            RuntimeError: If tracing was not started.
+        """
+        with self.__lock:
+            if not tracemalloc.is_tracing() or self.__previous is None:
+                raise RuntimeError("Tracing is not started")
+            current = AllocationTracer.__take()
+            diff = current.compare_to(self.__previous, key)
+            self.__previous = current
+            return diff
+
+    # --------------------------------------------------------------------------
+    # Private Functions
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def __take() -> tracemalloc.Snapshot:
+        """Take a snapshot without the allocations of tracemalloc itself."""
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            )
+        )
+
+
+class Debugger:
+    """Profiler and allocation tracer of the /debug endpoints, guarded by an optional token."""
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.__token = str(settings["token"])
+        self.__profiler = Profiler()
+        self.__tracer = AllocationTracer()
+
+    @property
+    def profiler(self) -> Profiler:
+        """CPU profiler."""
+        return self.__profiler
+
+    @property
+    def tracer(self) -> AllocationTracer:
+        """Allocation tracer."""
+        return self.__tracer
+
+    def authorize(self, authorization: Optional[str], tokens: List[str]) -> bool:
+        """Check the token of a request, sent as bearer token or token parameter."""
+        if not self.__token:
+            return True
+        candidates = list(tokens)
+        if authorization is not None and authorization.startswith("Bearer "):
+            candidates.append(authorization.split(" ", 1)[1].strip())
+        return any(hmac.compare_digest(token, self.__token) for token in candidates)
+
+
+# The profiler wrapping scrapes and probes, None if the /debug endpoints are disabled
+_PROFILER: Optional[Profiler] = None
+
+
+# -------------------------------------------------------------------------------------------------
+# Public Methods
+# -------------------------------------------------------------------------------------------------
+def set_profiler(profiler: Optional[Profiler]) -> None:
+    """Set the profiler used by scrapes and probes (None to disable profiling)."""
+    global _PROFILER  # pylint: disable=global-statement
+    _PROFILER = profiler
+
+
+def get_profiler() -> Optional[Profiler]:
+    """Return the profiler in use or None if disabled."""
+    return _PROFILER
+
+
+def get_pstats_dump(stats: pstats.Stats) -> bytes:
+    """Serialize profile stats like pstats.Stats.dump_stats() (load with pstats.Stats(path))."""
+    return marshal.dumps(stats.stats)  # type: ignore
+
+
+def get_pstats_text(stats: pstats.Stats, sort: str, limit: int) -> str:
+    """Format the top functions of profile stats as text."""
+    stream = io.StringIO()
+    stats.stream = stream  # type: ignore
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def get_tracemalloc_dump(snapshot: tracemalloc.Snapshot) -> bytes:
+    """Serialize a snapshot like tracemalloc.Snapshot.dump() (load with Snapshot.load(path))."""
+    return pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)
+
+
+def get_tracemalloc_text(stats: List[Any], limit: int) -> str:
+    """Format the top statistics (or statistic diffs) of a snapshot as text."""
+    lines = [str(stat) for stat in stats[:limit]]
+    total = sum(stat.size for stat in stats)
+    lines.append(f"Total traced: {total} bytes in {len(stats)} entries")
+    return "\n".join(lines) + "\n"
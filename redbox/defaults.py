@@ -13,9 +13,72 @@ DEF_SRV_LISTEN_PORT = 8080
 
 DEF_SCRAPE_TIMEOUT = 29
 
+# Background scheduler defaults
+DEF_SCHEDULER_ENABLED = False
+DEF_SCHEDULER_INTERVAL = 30
+DEF_SCHEDULER_JITTER = 1.0
+
+# Exposition defaults
+DEF_EXPOSITION_MODE = "full"
+DEF_EXPOSITION_INFO_INTERVAL = 300
+
+# Latency histogram defaults
+DEF_HISTOGRAM_ENABLED = False
+DEF_HISTOGRAM_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Cluster sharding defaults (one replica owns all targets)
+DEF_CLUSTER_SHARD_INDEX = 0
+DEF_CLUSTER_SHARD_COUNT = 1
+
+# Worker process defaults (0: probe in the main process)
+DEF_WORKERS_PROCESSES = 0
+
+# Probe pool defaults
+DEF_PROBE_POOL_SIZE = 64
+
+# Probe engine defaults
+DEF_ENGINE_TYPE = "simple"
+DEF_ENGINE_CONCURRENCY = 100
+
+# Connection pool defaults
+DEF_POOL_ENABLED = True
+DEF_POOL_SIZE = 10
+DEF_POOL_KEEP_ALIVE = 60
+
+# DNS cache defaults
+DEF_DNS_CACHE_ENABLED = False
+DEF_DNS_CACHE_TTL = 60
+DEF_DNS_CACHE_NEGATIVE_TTL = 10
+DEF_DNS_CACHE_PREFETCH_WORKERS = 16
+DEF_DNS_CACHE_PREFETCH_TIMEOUT = 2
+
+# Probe limit defaults (0: unlimited)
+DEF_LIMITS_CONCURRENCY = 0
+DEF_LIMITS_RATE = 0
+DEF_LIMITS_BURST = 1
+
+# Logging defaults
+DEF_LOG_LEVEL = "info"
+DEF_LOG_FORMAT = "text"
+DEF_LOG_SUCCESS_SAMPLE = 1.0
+DEF_LOG_QUEUE_SIZE = 10000
+
+# Reload defaults
+DEF_RELOAD_WATCH_INTERVAL = 0
+
+# Debug endpoint defaults
+DEF_DEBUG_ENABLED = False
+DEF_DEBUG_TOKEN = ""
+
+# Response compression defaults
+DEF_COMPRESSION_ENABLED = True
+DEF_COMPRESSION_GZIP_LEVEL = 6
+DEF_COMPRESSION_ZSTD_LEVEL = 3
+
 # HTTP check defaults
 DEF_REQUEST_METHOD = "get"
 DEF_REQUEST_TIMEOUT = 60
+DEF_REQUEST_MAX_EXTRACT_BYTES = 1048576
 DEF_REQUEST_USERAGENT = "RedBox Exporter/" + DEF_VERSION
 
 
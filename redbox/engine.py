@@ -0,0 +1,57 @@
+"""Build the probe engine and its resources from configuration."""
+
+from typing import List
+
+from .config import DsConfig
+from .types import DsTarget
+from .request import Request
+from .request import RequestSimple, RequestAsync
+from .request import ProbePool, SessionPool, Throttle
+from .request import DnsCache, set_dns_cache
+
+
+class Engine:
+    """Probe engine together with the DNS cache, sessions, limits and probe pool it uses."""
+
+    def __init__(self, conf: DsConfig, targets: List[DsTarget]) -> None:
+        # Warm up the DNS cache before the first probe
+        self.__dns_cache = None
+        if conf.dns_cache["enabled"]:
+            self.__dns_cache = DnsCache(conf.dns_cache)
+            set_dns_cache(self.__dns_cache)
+            self.__dns_cache.prefetch({target.hostname for target in targets if target.hostname})
+
+        self.__sessions = None
+        if conf.connection_pool["enabled"]:
+            self.__sessions = SessionPool(conf.connection_pool)
+        self.__throttle = None
+        if Throttle.is_limited(conf.limits):
+            self.__throttle = Throttle(conf.limits)
+        self.__pool = ProbePool(conf.probe_pool["size"], self.__throttle)
+        request: Request = RequestSimple(self.__pool, self.__sessions)
+        if conf.engine["type"] == "async":
+            request = RequestAsync(self.__pool, conf.engine["concurrency"], request)
+        self.__request = request
+
+    @property
+    def request(self) -> Request:
+        """Request handler to probe targets with."""
+        return self.__request
+
+    def set_targets(self, targets: List[DsTarget]) -> None:
+        """Apply reloaded targets to the request handler and the DNS cache."""
+        self.__request.set_targets(targets)
+        if self.__dns_cache is not None:
+            self.__dns_cache.set_targets(targets)
+
+    def close(self) -> None:
+        """Stop the request handler and release all resources."""
+        self.__request.close()
+        self.__pool.shutdown()
+        if self.__throttle is not None:
+            self.__throttle.close()
+        if self.__sessions is not None:
+            self.__sessions.close()
+        if self.__dns_cache is not None:
+            set_dns_cache(None)
+            self.__dns_cache.close()
@@ -0,0 +1,118 @@
+"""Cumulative latency histograms per target."""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+import threading
+from array import array
+from bisect import bisect_left
+
+from .types import DsResponse
+from .types import DsTarget
+
+# Response timings which are observed into histograms
+HISTOGRAM_FIELDS = ("time_ttfb", "time_download", "time_total")
+
+# A collected histogram: target, upper bounds, cumulative counts (+Inf last), sum and count
+Collected = Tuple[DsTarget, Tuple[float, ...], List[int], float, int]
+
+
+class LatencyHistograms:
+    """Latency histograms of all targets kept in preallocated flat arrays.
+
+    Each observed field has one array of bucket counters for all targets, in
+    which every target owns a slice of ``len(buckets) + 1`` counters (the last
+    one is +Inf). Counters are stored per bucket and only made cumulative when
+    collected, so an observation is a single bisect and a few increments.
+
+    Failed probes without a HTTP response carry no timing and are left out.
+    """
+
+    def __init__(self, targets: List[DsTarget], buckets: List[float]) -> None:
+        self.__lock = threading.Lock()
+        self.__buckets = buckets
+        self.__targets: List[DsTarget] = []
+        self.__index: Dict[str, int] = {}
+        self.__bounds: List[Tuple[float, ...]] = []
+        self.__offsets: List[int] = []
+        self.__counts: Dict[str, "array[int]"] = {}
+        self.__sums: Dict[str, "array[float]"] = {}
+        self.__totals: "array[int]" = array("Q")
+        self.set_targets(targets)
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def observe(self, response: DsResponse) -> None:
+        """Add the timings of a response to the histograms of its target."""
+        if response.status_code == 0:
+            return
+        with self.__lock:
+            index = self.__index.get(response.name)
+            if index is None:
+                return
+            bounds = self.__bounds[index]
+            offset = self.__offsets[index]
+            for field in HISTOGRAM_FIELDS:
+                value = getattr(response, field)
+                self.__counts[field][offset + bisect_left(bounds, value)] += 1
+                self.__sums[field][index] += value
+            self.__totals[index] += 1
+
+    def set_targets(self, targets: List[DsTarget]) -> None:
+        """Lay out the arrays for new targets, keeping the histograms of unchanged targets."""
+        index: Dict[str, int] = {}
+        bounds: List[Tuple[float, ...]] = []
+        offsets: List[int] = []
+        size = 0
+        for position, target in enumerate(targets):
+            index[target.name] = position
+            bounds.append(tuple(float(bound) for bound in (target.buckets or self.__buckets)))
+            offsets.append(size)
+            size += len(bounds[position]) + 1
+        counts = {field: array("Q", bytes(8 * size)) for field in HISTOGRAM_FIELDS}
+        sums = {field: array("d", bytes(8 * len(targets))) for field in HISTOGRAM_FIELDS}
+        totals = array("Q", bytes(8 * len(targets)))
+
+        with self.__lock:
+            for position, target in enumerate(targets):
+                old = self.__index.get(target.name)
+                if old is None or self.__targets[old].fingerprint != target.fingerprint:
+                    continue
+                start = self.__offsets[old]
+                end = start + len(bounds[position]) + 1
+                new_start = offsets[position]
+                new_end = new_start + end - start
+                for field in HISTOGRAM_FIELDS:
+                    counts[field][new_start:new_end] = self.__counts[field][start:end]
+                    sums[field][position] = self.__sums[field][old]
+                totals[position] = self.__totals[old]
+            self.__targets = list(targets)
+            self.__index = index
+            self.__bounds = bounds
+            self.__offsets = offsets
+            self.__counts = counts
+            self.__sums = sums
+            self.__totals = totals
+
+    def collect(self, field: str, names: Optional[Set[str]] = None) -> List[Collected]:
+        """Get the cumulative histograms of one field in target order.
+
+        If names are given, only the histograms of these targets are collected.
+        """
+        collected = []
+        with self.__lock:
+            counts = self.__counts[field]
+            sums = self.__sums[field]
+            for index, target in enumerate(self.__targets):
+                if names is not None and target.name not in names:
+                    continue
+                bounds = self.__bounds[index]
+                offset = self.__offsets[index]
+                end = offset + len(bounds) + 1
+                cumulative = []
+                running = 0
+                for count in counts[offset:end]:
+                    running += count
+                    cumulative.append(running)
+                collected.append((target, bounds, cumulative, sums[index], self.__totals[index]))
+        return collected
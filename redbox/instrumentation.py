@@ -0,0 +1,81 @@
+"""Metrics about the exporter itself."""
+
+from typing import Dict, List, Tuple, Any
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from .types import DsResponse
+
+# Phases of a scrape: probing (or reading the snapshot), rendering, responding and all of it
+SCRAPE_PHASES = ("probe", "render", "respond", "total")
+
+# Upper bounds of the scrape duration histograms in seconds
+SCRAPE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def get_process_stats() -> Tuple[float, int]:
+    """Return CPU seconds and resident memory in bytes of the exporter process.
+
+    Resident memory is read from /proc and reported as 0 where it is missing.
+    """
+    cpu = time.process_time()
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            rss = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        rss = 0
+    return cpu, rss
+
+
+class ExporterStats:
+    """Collects scrape durations per phase, probed bytes and rendered sizes."""
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__counts = {phase: [0] * (len(SCRAPE_BUCKETS) + 1) for phase in SCRAPE_PHASES}
+        self.__sums = {phase: 0.0 for phase in SCRAPE_PHASES}
+        self.__probes = 0
+        self.__downloaded = 0
+        self.__render_size = 0
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def observe_scrape(self, durations: Dict[str, float]) -> None:
+        """Add the durations of the phases of a scrape."""
+        with self.__lock:
+            for phase, duration in durations.items():
+                self.__counts[phase][bisect_left(SCRAPE_BUCKETS, duration)] += 1
+                self.__sums[phase] += duration
+
+    def observe_probe(self, response: DsResponse) -> None:
+        """Count a finished probe and the bytes it downloaded."""
+        with self.__lock:
+            self.__probes += 1
+            self.__downloaded += response.size
+
+    def observe_render(self, size: int) -> None:
+        """Set the size of the latest rendered (uncompressed) response."""
+        with self.__lock:
+            self.__render_size = size
+
+    def collect(self) -> Dict[str, Any]:
+        """Return the cumulative scrape duration histograms and all counters."""
+        with self.__lock:
+            durations: Dict[str, Tuple[List[int], float]] = {}
+            for phase in SCRAPE_PHASES:
+                cumulative = []
+                running = 0
+                for count in self.__counts[phase]:
+                    running += count
+                    cumulative.append(running)
+                durations[phase] = (cumulative, self.__sums[phase])
+            return {
+                "durations": durations,
+                "probes": self.__probes,
+                "downloaded": self.__downloaded,
+                "render_size": self.__render_size,
+            }
@@ -0,0 +1,140 @@
+"""Queued, level controlled logging."""
+
+from typing import Dict, Optional, Any
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+# All modules log to children of this logger (logging.getLogger(__name__))
+LOGGER_NAME = "redbox"
+
+# Text format of log lines
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Attributes every log record has, anything else was passed via extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as single line JSON objects including their extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a log record."""
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SuccessSampler(logging.Filter):
+    """Keeps only a fraction of the records logged with ``extra={"success": True}``.
+
+    Records are kept evenly spread instead of randomly. The credit is not
+    locked, as a lost update only shifts which record is kept.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.__rate = rate
+        self.__credit = 0.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Check if a record is kept."""
+        if not getattr(record, "success", False) or self.__rate >= 1:
+            return True
+        self.__credit += self.__rate
+        if self.__credit < 1:
+            return False
+        self.__credit -= 1
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler which drops records if the queue is full instead of blocking.
+
+    Records are formatted by the draining thread only, so logging costs the
+    calling thread nothing but creating the record.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Return the record as is, it never leaves this process."""
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Put a record into the queue or drop it."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class BlockingQueueListener(logging.handlers.QueueListener):
+    """Queue listener which waits for space in a full queue to stop."""
+
+    def enqueue_sentinel(self) -> None:
+        """Put the stop marker into the queue, waiting until the queue has space for it."""
+        self.queue.put(self._sentinel)  # type: ignore
+
+
+# The thread draining the queue, None if logging is not set up
+_LISTENER: Optional[logging.handlers.QueueListener] = None
+
+# The process which started the thread draining the queue
+_LISTENER_PID = 0
+
+
+# -------------------------------------------------------------------------------------------------
+# Public Methods
+# -------------------------------------------------------------------------------------------------
+def setup_logging(settings: Dict[str, Any]) -> None:
+    """Send all log records through a queue drained by a background thread.
+
+    Can be called again (e.g. in a forked process) to replace the current setup.
+    """
+    global _LISTENER, _LISTENER_PID  # pylint: disable=global-statement
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    # A forked process has a copy of the queue, but not the thread draining it
+    if _LISTENER is not None and _LISTENER_PID == os.getpid():
+        _LISTENER.stop()
+
+    output = logging.StreamHandler(sys.stderr)
+    if settings["format"] == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    records: "queue.Queue[Any]" = queue.Queue(settings["queue_size"])
+    handler = DroppingQueueHandler(records)
+    handler.addFilter(SuccessSampler(float(settings["success_sample"])))
+    logger.addHandler(handler)
+    logger.setLevel(settings["level"].upper())
+    logger.propagate = False
+
+    _LISTENER = BlockingQueueListener(records, output)
+    _LISTENER_PID = os.getpid()
+    _LISTENER.start()
+
+
+def stop_logging() -> None:
+    """Write all queued log records and stop the background thread."""
+    global _LISTENER  # pylint: disable=global-statement
+    if _LISTENER is not None and _LISTENER_PID == os.getpid():
+        _LISTENER.stop()
+    _LISTENER = None
@@ -1,12 +1,66 @@
 """Converts response list into prometheus format."""
 
-from typing import List, Dict, Any
+from typing import List, Dict, Optional, Set, Tuple, Any
+
+import threading
+import time
+import timeit
 
 from .types import DsResponse
+from .types import DsTarget
+from .histogram import LatencyHistograms
+from .instrumentation import SCRAPE_BUCKETS, get_process_stats
 
 
 METRIC_PREFIX = "redbox"
 
+# Content types of the classic text format and of OpenMetrics
+CONTENT_TYPE_TEXT = "text/plain; version=0.0.4; charset=utf-8"
+CONTENT_TYPE_OPENMETRICS = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Terminates an OpenMetrics exposition
+OPENMETRICS_EOF = "# EOF"
+
+# Rendered result ages are current to this many seconds (see ResponseCache)
+RESULT_AGE_RESOLUTION = 1.0
+
+# Metric types missing in the classic text format and their replacement
+CLASSIC_TYPES = {"info": "gauge"}
+
+# OpenMetrics names counter and info families without the suffix of their samples
+FAMILY_SUFFIXES = {"counter": "_total", "info": "_info"}
+
+
+class InfoLimiter:
+    """Rate limits label changes of the redbox_result_info metric.
+
+    A changed error message or extract of a target is only exposed once its
+    previous value has been exposed for at least ``interval`` seconds, so that
+    flapping targets do not create a new series on every scrape.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.__interval = interval
+        self.__lock = threading.Lock()
+        self.__last: Dict[str, Tuple[Tuple[str, List[str]], float]] = {}
+
+    def get(self, response: DsResponse) -> Tuple[str, List[str]]:
+        """Get error message and extract to expose for a response."""
+        current = (response.err_msg, response.extract)
+        now = timeit.default_timer()
+        with self.__lock:
+            last = self.__last.get(response.name)
+            if last is None or (last[0] != current and now - last[1] >= self.__interval):
+                self.__last[response.name] = (current, now)
+                return current
+            return last[0]
+
+    def set_targets(self, targets: List[DsTarget]) -> None:
+        """Forget the exposed values of targets which no longer exist."""
+        names = {target.name for target in targets}
+        with self.__lock:
+            self.__last = {name: last for name, last in self.__last.items() if name in names}
+
 
 def __float2str(value: float) -> str:
     """Convert a float into a human readable string representatoin."""
@@ -15,157 +69,636 @@ def __float2str(value: float) -> str:
     return "{0:.5f}".format(value)
 
 
-def _get_metrics(responses: List[DsResponse], metric_settings: Dict[str, Any]) -> List[str]:
+def __escape(value: str) -> str:
+    """Escape a label value (backslash, double-quote and line feed)."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def __join(extract: List[str]) -> str:
+    """Get extracted strings as a single escaped label value."""
+    return "\\n".join([__escape(item) for item in extract])
+
+
+def accepts_openmetrics(accept: Optional[str]) -> bool:
+    """Check if an Accept header prefers OpenMetrics over the classic text format."""
+    if not accept:
+        return False
+    openmetrics = 0.0
+    text = 0.0
+    for item in accept.split(","):
+        media_type, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        media_type = media_type.strip().lower()
+        if media_type == "application/openmetrics-text":
+            openmetrics = max(openmetrics, quality)
+        elif media_type in ("text/plain", "text/*", "*/*"):
+            text = max(text, quality)
+    return openmetrics > 0 and openmetrics >= text
+
+
+def _get_family(
+    name: str, m_type: str, m_help: str, openmetrics: bool, unit: str = ""
+) -> Tuple[str, List[str]]:
+    """Get the sample name and the metadata lines of a metric family.
+
+    Samples are the same in both formats, only the metadata differs: OpenMetrics
+    has additional types, names counter and info families without the suffix of
+    their samples and declares units (if the name carries the unit as suffix).
+    """
+    metric = METRIC_PREFIX + "_" + name
+    if not openmetrics:
+        return metric, [
+            f"# HELP {metric} {m_help}",
+            f"# TYPE {metric} {CLASSIC_TYPES.get(m_type, m_type)}",
+        ]
+    family = metric
+    suffix = FAMILY_SUFFIXES.get(m_type, "")
+    if suffix and family.endswith(suffix):
+        family = family.rsplit(suffix, 1)[0]
+    lines = [
+        f"# HELP {family} {m_help}",
+        f"# TYPE {family} {m_type}",
+    ]
+    if unit and family.endswith("_" + unit):
+        lines.append(f"# UNIT {family} {unit}")
+    return metric, lines
+
+
+def _get_identity_labels(name: str, groups: Dict[str, str], url: str) -> str:
+    """Get formated labels identifying a target (name, groups and url)."""
+    group_labels = ['group_{}="{}",'.format(key, __escape(str(groups[key]))) for key in groups]
+    return f'name="{__escape(name)}",' + "".join(group_labels) + f'url="{__escape(url)}"'
+
+
+def _get_labels(response: DsResponse, low_cardinality: bool) -> str:
+    """Get formated labels of a response.
+
+    In low-cardinality mode only the stable identity labels are kept,
+    so that every scrape does not create a new series.
+    """
+    identity = _get_identity_labels(response.name, response.groups, response.url)
+    status_family = response.status_family
+    if low_cardinality:
+        return identity + f',status_family="{status_family}"'
+
+    size = response.size
+    time_ttfb = __float2str(response.time_ttfb)
+    time_download = __float2str(response.time_download)
+    time_render = __float2str(response.time_render)
+    time_total = __float2str(response.time_total)
+    status_code = response.status_code
+    success = "1" if response.success else "0"
+    err_msg = __escape(response.err_msg)
+    extract = __join(response.extract)
+    return (
+        identity + ","
+        f'bytes="{size}",'
+        f'time_ttfb="{time_ttfb}",'
+        f'time_download="{time_download}",'
+        f'time_render="{time_render}",'
+        f'time_total="{time_total}",'
+        f'status_code="{status_code}",'
+        f'status_family="{status_family}",'
+        f'success="{success}",'
+        f'err_msg="{err_msg}",'
+        f'extract="{extract}"'
+    )
+
+
+def _get_metrics(
+    responses: List[DsResponse],
+    labels: List[str],
+    metric_settings: Dict[str, Any],
+    openmetrics: bool,
+) -> List[str]:
     """Wrapper function to get formated prometheus metrics."""
     m_name = metric_settings["name"]
     m_type = metric_settings["type"]
     m_help = metric_settings["help"]
     m_func = metric_settings["func"]
+    m_unit = metric_settings.get("unit", "")
 
-    metric = METRIC_PREFIX + "_" + m_name
-    lines = [
-        f"# HELP {metric} {m_help}",
-        f"# TYPE {metric} {m_type}",
-    ]
+    metric, lines = _get_family(m_name, m_type, m_help, openmetrics, m_unit)
+
+    for response, label in zip(responses, labels):
+        lines.append(f"{metric}{{{label}}} " + m_func(response))
+    return lines
 
-    for response in responses:
-        name = response.name
-        groups = ['group_{}="{}",'.format(key, response.groups[key]) for key in response.groups]
-        url = response.url
-        size = response.size
-        time_ttfb = __float2str(response.time_ttfb)
-        time_download = __float2str(response.time_download)
-        time_render = __float2str(response.time_render)
-        time_total = __float2str(response.time_total)
-        status_code = response.status_code
-        status_family = response.status_family
-        success = "1" if response.success else "0"
-        err_msg = response.err_msg
-        extract = "\\n".join(response.extract)
 
+def _get_info(responses: List[DsResponse], limiter: InfoLimiter, openmetrics: bool) -> List[str]:
+    """Get formated info metrics carrying error message and extracted strings."""
+    metric, lines = _get_family(
+        "result_info",
+        "info",
+        "Returns '1' with error message and extracted strings as labels.",
+        openmetrics,
+    )
+    for response in responses:
+        err_msg, extract = limiter.get(response)
+        identity = _get_identity_labels(response.name, response.groups, response.url)
         lines.append(
-            f"{metric}{{"
-            f'name="{name}",' + "".join(groups) + f'url="{url}",'
-            f'bytes="{size}",'
-            f'time_ttfb="{time_ttfb}",'
-            f'time_download="{time_download}",'
-            f'time_render="{time_render}",'
-            f'time_total="{time_total}",'
-            f'status_code="{status_code}",'
-            f'status_family="{status_family}",'
-            f'success="{success}",'
-            f'err_msg="{err_msg}",'
-            f'extract="{extract}"'
-            "} " + m_func(response)
+            f"{metric}{{{identity},"
+            f'err_msg="{__escape(err_msg)}",'
+            f'extract="{__join(extract)}"'
+            "} 1"
         )
     return lines
 
 
-def _get_time_ttfb(responses: List[DsResponse]) -> List[str]:
+def _get_samples(
+    name: str,
+    m_type: str,
+    m_help: str,
+    samples: List[Tuple[str, str]],
+    openmetrics: bool,
+    unit: str = "",
+) -> List[str]:
+    """Get formated prometheus metrics from a list of (labels, value) samples."""
+    metric, lines = _get_family(name, m_type, m_help, openmetrics, unit)
+    for labels, value in samples:
+        lines.append(f"{metric}{{{labels}}} {value}" if labels else f"{metric} {value}")
+    return lines
+
+
+def _get_time_dns(responses: List[DsResponse], labels: List[str], openmetrics: bool) -> List[str]:
+    """Get formated DNS time metrics."""
+    metric_settings = {
+        "name": "time_dns",
+        "type": "gauge",
+        "unit": "seconds",
+        "help": "Returns the DNS time in seconds (time taken to resolve the hostname).",
+        "func": lambda response: __float2str(response.time_dns),
+    }
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
+
+
+def _get_time_connect(
+    responses: List[DsResponse], labels: List[str], openmetrics: bool
+) -> List[str]:
+    """Get formated connect time metrics."""
+    metric_settings = {
+        "name": "time_connect",
+        "type": "gauge",
+        "unit": "seconds",
+        "help": "Returns the connect time in seconds (time taken to establish TCP connections).",
+        "func": lambda response: __float2str(response.time_connect),
+    }
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
+
+
+def _get_time_tls(responses: List[DsResponse], labels: List[str], openmetrics: bool) -> List[str]:
+    """Get formated TLS time metrics."""
+    metric_settings = {
+        "name": "time_tls",
+        "type": "gauge",
+        "unit": "seconds",
+        "help": "Returns the TLS time in seconds (time taken for TLS handshakes).",
+        "func": lambda response: __float2str(response.time_tls),
+    }
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
+
+
+def _get_time_ttfb(responses: List[DsResponse], labels: List[str], openmetrics: bool) -> List[str]:
     """Get formated TTFB time metrics."""
     metric_settings = {
         "name": "time_ttfb",
-        "type": "untyped",
+        "type": "gauge",
+        "unit": "seconds",
         "help": "Returns the TTFB time in seconds (time taken for headers to arrive).",
         "func": lambda response: __float2str(response.time_ttfb),
     }
-    return _get_metrics(responses, metric_settings)
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
 
 
-def _get_time_download(responses: List[DsResponse]) -> List[str]:
+def _get_time_download(
+    responses: List[DsResponse], labels: List[str], openmetrics: bool
+) -> List[str]:
     """Get formated download time metrics."""
     metric_settings = {
         "name": "time_download",
-        "type": "untyped",
+        "type": "gauge",
+        "unit": "seconds",
         "help": "Returns the download time in seconds (time taken to download the body).",
         "func": lambda response: __float2str(response.time_download),
     }
-    return _get_metrics(responses, metric_settings)
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
 
 
-def _get_time_render(responses: List[DsResponse]) -> List[str]:
+def _get_time_render(
+    responses: List[DsResponse], labels: List[str], openmetrics: bool
+) -> List[str]:
     """Get formated render time metrics."""
     metric_settings = {
         "name": "time_render",
-        "type": "untyped",
+        "type": "gauge",
+        "unit": "seconds",
         "help": "Returns the render time in seconds (time taken to HTML/JS render the body).",
         "func": lambda response: __float2str(response.time_render),
     }
-    return _get_metrics(responses, metric_settings)
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
 
 
-def _get_time_total(responses: List[DsResponse]) -> List[str]:
+def _get_time_total(responses: List[DsResponse], labels: List[str], openmetrics: bool) -> List[str]:
     """Get formated total time metrics."""
     metric_settings = {
         "name": "time_total",
-        "type": "untyped",
+        "type": "gauge",
+        "unit": "seconds",
         "help": "Returns the total time in seconds (time taken to request, render and download).",
         "func": lambda response: __float2str(response.time_total),
     }
-    return _get_metrics(responses, metric_settings)
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
 
 
-def _get_content_size(responses: List[DsResponse]) -> List[str]:
+def _get_time_queue(responses: List[DsResponse], labels: List[str], openmetrics: bool) -> List[str]:
+    """Get formated queue time metrics."""
+    metric_settings = {
+        "name": "time_queue",
+        "type": "gauge",
+        "unit": "seconds",
+        "help": "Returns the time in seconds the probe waited before it started (not in total).",
+        "func": lambda response: __float2str(response.time_queue),
+    }
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
+
+
+def _get_result_age(responses: List[DsResponse], labels: List[str], openmetrics: bool) -> List[str]:
+    """Get formated result age metrics."""
+    now = time.time()
+    metric_settings = {
+        "name": "result_age_seconds",
+        "type": "gauge",
+        "unit": "seconds",
+        "help": "Returns the time in seconds since the result was probed (reused or scheduled).",
+        "func": lambda response: __float2str(max(0.0, now - response.timestamp)),
+    }
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
+
+
+def _get_connection_reused(
+    responses: List[DsResponse], labels: List[str], openmetrics: bool
+) -> List[str]:
+    """Get formated connection reuse metrics."""
+    metric_settings = {
+        "name": "connection_reused",
+        "type": "gauge",
+        "help": "Returns '1' if a kept-alive connection was reused (TTFB without handshakes).",
+        "func": lambda response: "1" if response.connection_reused else "0",
+    }
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
+
+
+def _get_content_size(
+    responses: List[DsResponse], labels: List[str], openmetrics: bool
+) -> List[str]:
     """Get formated content size metrics."""
     metric_settings = {
         "name": "content_size",
-        "type": "untyped",
+        "type": "gauge",
+        "unit": "bytes",
         "help": "Returns the content size in bytes.",
         "func": lambda response: str(response.size),
     }
-    return _get_metrics(responses, metric_settings)
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
 
 
-def _get_failure(responses: List[DsResponse]) -> List[str]:
+def _get_failure(responses: List[DsResponse], labels: List[str], openmetrics: bool) -> List[str]:
     """Get formated failure metrics."""
     metric_settings = {
         "name": "failure",
-        "type": "untyped",
+        "type": "gauge",
         "help": "Returns '1' if request or defined conditions fail or '0' on success.",
         "func": lambda response: "0" if response.success else "1",
     }
-    return _get_metrics(responses, metric_settings)
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
 
 
-def _get_success(responses: List[DsResponse]) -> List[str]:
+def _get_success(responses: List[DsResponse], labels: List[str], openmetrics: bool) -> List[str]:
     """Get formated success metrics."""
     metric_settings = {
         "name": "success",
-        "type": "untyped",
+        "type": "gauge",
         "help": "Returns '1' if request and defined conditions succeed or '0' on failure.",
         "func": lambda response: "1" if response.success else "0",
     }
-    return _get_metrics(responses, metric_settings)
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
 
 
-def _get_status_code(responses: List[DsResponse]) -> List[str]:
+def _get_status_code(
+    responses: List[DsResponse], labels: List[str], openmetrics: bool
+) -> List[str]:
     """Get formated status code metrics."""
     metric_settings = {
         "name": "status_code",
-        "type": "untyped",
+        "type": "gauge",
         "help": "Returns the response http status code or '0' if request failed.",
         "func": lambda response: str(response.status_code),
     }
-    return _get_metrics(responses, metric_settings)
-
-
-def get_prom_format(responses: List[DsResponse]) -> str:
-    """Format response list into prometheus format."""
-    times_ttfb = _get_time_ttfb(responses)
-    times_download = _get_time_download(responses)
-    times_render = _get_time_render(responses)
-    times_total = _get_time_total(responses)
-    sizes = _get_content_size(responses)
-    fails = _get_failure(responses)
-    success = _get_success(responses)
-    status_codes = _get_status_code(responses)
+    return _get_metrics(responses, labels, metric_settings, openmetrics)
+
+
+def get_prom_format(
+    responses: List[DsResponse], limiter: Optional[InfoLimiter] = None, openmetrics: bool = False
+) -> str:
+    """Format response list into prometheus or OpenMetrics format.
+
+    If an InfoLimiter is given, metrics are rendered in low-cardinality mode:
+    volatile values are only sample values and error message and extracted
+    strings move to the rate limited redbox_result_info metric.
+
+    Labels of every response are encoded once and shared by all metrics.
+    """
+    labels = [_get_labels(response, limiter is not None) for response in responses]
+    times_dns = _get_time_dns(responses, labels, openmetrics)
+    times_connect = _get_time_connect(responses, labels, openmetrics)
+    times_tls = _get_time_tls(responses, labels, openmetrics)
+    times_ttfb = _get_time_ttfb(responses, labels, openmetrics)
+    times_download = _get_time_download(responses, labels, openmetrics)
+    times_render = _get_time_render(responses, labels, openmetrics)
+    times_total = _get_time_total(responses, labels, openmetrics)
+    times_queue = _get_time_queue(responses, labels, openmetrics)
+    ages = _get_result_age(responses, labels, openmetrics)
+    sizes = _get_content_size(responses, labels, openmetrics)
+    reused = _get_connection_reused(responses, labels, openmetrics)
+    fails = _get_failure(responses, labels, openmetrics)
+    success = _get_success(responses, labels, openmetrics)
+    status_codes = _get_status_code(responses, labels, openmetrics)
+    infos = _get_info(responses, limiter, openmetrics) if limiter is not None else []
     return "\n".join(
-        times_ttfb
+        times_dns
+        + times_connect
+        + times_tls
+        + times_ttfb
         + times_download
         + times_render
         + times_total
+        + times_queue
+        + ages
         + sizes
+        + reused
         + fails
         + success
         + status_codes
+        + infos
+    )
+
+
+def _get_histogram(
+    histograms: LatencyHistograms,
+    names: Optional[Set[str]],
+    field: str,
+    m_help: str,
+    openmetrics: bool,
+) -> List[str]:
+    """Get formated histogram metrics of one response timing."""
+    metric, lines = _get_family(field + "_seconds", "histogram", m_help, openmetrics, "seconds")
+    for target, bounds, cumulative, total, count in histograms.collect(field, names):
+        identity = _get_identity_labels(target.name, target.groups, target.url)
+        for bound, value in zip(bounds, cumulative):
+            lines.append(f'{metric}_bucket{{{identity},le="{bound}"}} {value}')
+        lines.append(f'{metric}_bucket{{{identity},le="+Inf"}} {cumulative[-1]}')
+        lines.append(f"{metric}_sum{{{identity}}} {total}")
+        lines.append(f"{metric}_count{{{identity}}} {count}")
+    return lines
+
+
+def get_prom_histogram_format(
+    histograms: LatencyHistograms, names: Optional[Set[str]] = None, openmetrics: bool = False
+) -> str:
+    """Format latency histograms (of the given target names only) into prometheus format."""
+    return "\n".join(
+        _get_histogram(
+            histograms,
+            names,
+            "time_ttfb",
+            "Histogram of the TTFB time (time taken for headers to arrive).",
+            openmetrics,
+        )
+        + _get_histogram(
+            histograms,
+            names,
+            "time_download",
+            "Histogram of the download time (time taken for the body).",
+            openmetrics,
+        )
+        + _get_histogram(
+            histograms,
+            names,
+            "time_total",
+            "Histogram of the total time (request, render and download).",
+            openmetrics,
+        )
+    )
+
+
+def get_prom_dns_format(stats: Dict[str, int], openmetrics: bool = False) -> str:
+    """Format DNS cache statistics into prometheus format."""
+    return "\n".join(
+        _get_samples(
+            "dns_cache_size",
+            "gauge",
+            "Returns the number of hostnames in the DNS cache.",
+            [("", str(stats["size"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "dns_cache_hits_total",
+            "counter",
+            "Returns the number of hostname lookups answered from the DNS cache.",
+            [("", str(stats["hits"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "dns_cache_misses_total",
+            "counter",
+            "Returns the number of hostname lookups sent to the system resolver.",
+            [("", str(stats["misses"]))],
+            openmetrics,
+        )
+    )
+
+
+def get_prom_shard_format(cluster: Dict[str, int], targets: int, openmetrics: bool = False) -> str:
+    """Format cluster shard identity into prometheus format."""
+    index = cluster["shard_index"]
+    count = cluster["shard_count"]
+    return "\n".join(
+        _get_samples(
+            "shard_info",
+            "info",
+            "Returns '1' with shard index and shard count of this replica as labels.",
+            [(f'shard_index="{index}",shard_count="{count}"', "1")],
+            openmetrics,
+        )
+        + _get_samples(
+            "shard_targets",
+            "gauge",
+            "Returns the number of targets owned by this replica.",
+            [("", str(targets))],
+            openmetrics,
+        )
+        + _get_samples(
+            "shard_config_targets",
+            "gauge",
+            "Returns the number of targets in the configuration of all replicas.",
+            [("", str(cluster["targets_total"]))],
+            openmetrics,
+        )
+    )
+
+
+def get_prom_pool_format(stats: Dict[str, int], openmetrics: bool = False) -> str:
+    """Format probe pool statistics into prometheus format."""
+    return "\n".join(
+        _get_samples(
+            "exporter_probe_pool_size",
+            "gauge",
+            "Returns the max number of probes running at the same time.",
+            [("", str(stats["size"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "exporter_probe_inflight",
+            "gauge",
+            "Returns the number of probes currently running or queued.",
+            [("", str(stats["inflight"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "exporter_probe_queued",
+            "gauge",
+            "Returns the number of probes waiting for a free thread of the probe pool.",
+            [("", str(stats["queued"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "exporter_probe_throttled",
+            "gauge",
+            "Returns the number of queued probes waiting for the limits of their host or groups.",
+            [("", str(stats["throttled"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "exporter_probe_orphaned",
+            "gauge",
+            "Returns the number of probes still running after their deadline has passed.",
+            [("", str(stats["orphaned"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "exporter_probe_rejected_total",
+            "counter",
+            "Returns the number of probes not started, as the target was still being probed.",
+            [("", str(stats["rejected"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "exporter_probe_cancelled_total",
+            "counter",
+            "Returns the number of queued probes cancelled after their deadline has passed.",
+            [("", str(stats["cancelled"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "exporter_probe_aborted_total",
+            "counter",
+            "Returns the number of running probes aborted after their deadline has passed.",
+            [("", str(stats["aborted"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "exporter_probe_joined_total",
+            "counter",
+            "Returns the number of probes not started, as an overlapping scrape shared its own.",
+            [("", str(stats["joined"]))],
+            openmetrics,
+        )
+    )
+
+
+def get_prom_exporter_format(collected: Dict[str, Any], openmetrics: bool = False) -> str:
+    """Format scrape durations, probe counters and process usage into prometheus format."""
+    metric, lines = _get_family(
+        "exporter_scrape_duration_seconds",
+        "histogram",
+        "Histogram of the scrape duration per phase (probe, render, respond and total).",
+        openmetrics,
+        "seconds",
+    )
+    for phase, (cumulative, total) in collected["durations"].items():
+        for bound, value in zip(SCRAPE_BUCKETS, cumulative):
+            lines.append(f'{metric}_bucket{{phase="{phase}",le="{float(bound)}"}} {value}')
+        lines.append(f'{metric}_bucket{{phase="{phase}",le="+Inf"}} {cumulative[-1]}')
+        lines.append(f'{metric}_sum{{phase="{phase}"}} {total}')
+        lines.append(f'{metric}_count{{phase="{phase}"}} {cumulative[-1]}')
+    cpu, rss = get_process_stats()
+    return "\n".join(
+        lines
+        + _get_samples(
+            "exporter_probes_total",
+            "counter",
+            "Returns the number of finished probes.",
+            [("", str(collected["probes"]))],
+            openmetrics,
+        )
+        + _get_samples(
+            "exporter_downloaded_bytes_total",
+            "counter",
+            "Returns the number of body bytes downloaded by all probes.",
+            [("", str(collected["downloaded"]))],
+            openmetrics,
+            "bytes",
+        )
+        + _get_samples(
+            "exporter_render_size_bytes",
+            "gauge",
+            "Returns the size of the latest rendered (uncompressed) response in bytes.",
+            [("", str(collected["render_size"]))],
+            openmetrics,
+            "bytes",
+        )
+        + _get_samples(
+            "exporter_process_cpu_seconds_total",
+            "counter",
+            "Returns the CPU time (user and system) used by the exporter process in seconds.",
+            [("", str(cpu))],
+            openmetrics,
+            "seconds",
+        )
+        + _get_samples(
+            "exporter_process_resident_memory_bytes",
+            "gauge",
+            "Returns the resident memory of the exporter process in bytes.",
+            [("", str(rss))],
+            openmetrics,
+            "bytes",
+        )
+    )
+
+
+def get_prom_reload_format(status: Dict[str, Any], openmetrics: bool = False) -> str:
+    """Format the result of the last configuration reload into prometheus format."""
+    return "\n".join(
+        _get_samples(
+            "config_last_reload_success",
+            "gauge",
+            "Returns '1' if the last configuration reload succeeded or '0' if it failed.",
+            [("", "1" if status["success"] else "0")],
+            openmetrics,
+        )
+        + _get_samples(
+            "config_last_reload_success_timestamp_seconds",
+            "gauge",
+            "Returns the time of the last successful configuration load as unix timestamp.",
+            [("", str(status["success_time"]))],
+            openmetrics,
+            "seconds",
+        )
     )
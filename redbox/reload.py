@@ -0,0 +1,169 @@
+"""Reload the configuration at runtime."""
+
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+
+from .config import DsConfig
+from .config import get_config
+from .config import get_target_files
+from .types import DsTarget
+
+# Settings which are only applied on start (cluster settings apply with the targets)
+RESTART_SETTINGS = (
+    "listen_addr",
+    "listen_port",
+    "scheduler",
+    "exposition",
+    "histogram",
+    "workers",
+    "probe_pool",
+    "limits",
+    "engine",
+    "connection_pool",
+    "dns_cache",
+    "compression",
+    "logging",
+    "reload",
+    "debug",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Reloader:
+    """Reloads the configuration on SIGHUP or when the configuration or a target file changed.
+
+    The whole configuration is read and validated again. Once valid, the new
+    targets are diffed against the running ones by name and handed to every
+    registered target consumer (store, histograms, scheduler, ...), which keep
+    their state of unchanged targets. An invalid configuration is logged and
+    the running one is kept.
+    """
+
+    def __init__(self, args: argparse.Namespace, conf: DsConfig) -> None:
+        self.__args = args
+        self.__conf = conf
+        self.__consumers: List[Callable[[List[DsTarget]], None]] = []
+        self.__watch_interval = float(conf.reload["watch_interval"])
+        self.__file = self.__stat()
+        self.__success = True
+        self.__success_time = time.time()
+        self.__lock = threading.Lock()
+        self.__requested = False
+        self.__stop = threading.Event()
+        self.__wakeup = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="reloader", daemon=True)
+
+    @property
+    def config(self) -> DsConfig:
+        """Configuration in use."""
+        return self.__conf
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def add_consumer(self, consumer: Callable[[List[DsTarget]], None]) -> None:
+        """Register a function which applies new targets (e.g. SnapshotStore.set_targets)."""
+        self.__consumers.append(consumer)
+
+    def start(self) -> None:
+        """Reload on SIGHUP (and file changes if watched) from now on."""
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.__on_signal)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Stop reloading."""
+        self.__stop.set()
+        self.__wakeup.set()
+        self.__thread.join()
+
+    def reload(self) -> bool:
+        """Read, validate and apply the configuration file.
+
+        Returns False (and keeps the running configuration) if it is invalid.
+        """
+        with self.__lock:
+            self.__file = self.__stat()
+            time_load_start = time.time()
+            try:
+                conf = get_config(self.__args)
+            except OSError as error:
+                logger.error("Reload failed, keeping the running configuration: %s", error)
+                self.__success = False
+                return False
+
+            changed = [
+                key for key in RESTART_SETTINGS if getattr(conf, key) != getattr(self.__conf, key)
+            ]
+            if changed:
+                logger.warning("Changes of %s only apply after a restart", ", ".join(changed))
+
+            added, removed, updated = Reloader.__diff(self.__conf.targets, conf.targets)
+            before = [target.fingerprint for target in self.__conf.targets]
+            if before != [target.fingerprint for target in conf.targets]:
+                for consumer in self.__consumers:
+                    consumer(conf.targets)
+            self.__conf = conf
+            self.__success = True
+            self.__success_time = time.time()
+            logger.info(
+                "Reloaded configuration: %d added, %d removed, %d changed, %d targets in %.3f sec",
+                len(added),
+                len(removed),
+                len(updated),
+                len(conf.targets),
+                self.__success_time - time_load_start,
+            )
+            return True
+
+    def status(self) -> Dict[str, Any]:
+        """Return if the last reload succeeded and the time of the last successful one."""
+        with self.__lock:
+            return {"success": self.__success, "success_time": self.__success_time}
+
+    # --------------------------------------------------------------------------
+    # Private Functions
+    # --------------------------------------------------------------------------
+    def __on_signal(self, *_: Any) -> None:
+        """Request a reload from the signal handler, which must not do the work itself."""
+        self.__requested = True
+        self.__wakeup.set()
+
+    def __stat(self) -> Tuple[Optional[Tuple[int, int]], Dict[str, Tuple[int, int]]]:
+        """Get modification time and size of the configuration file and all target files."""
+        files = get_target_files(self.__conf.target_files, os.path.dirname(self.__args.conf))
+        try:
+            stat = os.stat(self.__args.conf)
+        except OSError:
+            return (None, files)
+        return ((stat.st_mtime_ns, stat.st_size), files)
+
+    def __run(self) -> None:
+        """Reload when requested or when the watched file changed until stopped."""
+        while not self.__stop.is_set():
+            self.__wakeup.wait(self.__watch_interval if self.__watch_interval > 0 else None)
+            self.__wakeup.clear()
+            if self.__stop.is_set():
+                return
+            requested, self.__requested = self.__requested, False
+            if requested or (self.__watch_interval > 0 and self.__stat() != self.__file):
+                self.reload()
+
+    @staticmethod
+    def __diff(
+        running: List[DsTarget], loaded: List[DsTarget]
+    ) -> Tuple[List[str], List[str], List[str]]:
+        """Get names of added, removed and changed targets."""
+        before = {target.name: target.fingerprint for target in running}
+        after = {target.name: target.fingerprint for target in loaded}
+        added = [name for name in after if name not in before]
+        removed = [name for name in before if name not in after]
+        updated = [name for name in after if name in before and before[name] != after[name]]
+        return added, removed, updated
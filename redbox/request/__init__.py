@@ -3,4 +3,10 @@
 from .types import DsTarget
 from .types import DsResponse
 from .classes import Request
+from .pool import ProbePool
+from .throttle import Throttle
 from .request_simple import RequestSimple
+from .request_async import RequestAsync
+from .transport import SessionPool
+from .resolver import DnsCache
+from .resolver import set_dns_cache, get_dns_cache, prefetch
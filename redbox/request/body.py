@@ -0,0 +1,136 @@
+"""Consume response bodies as a stream."""
+
+from typing import List, Optional, Pattern, Tuple
+
+import timeit
+
+from ..types.ds_extract import Bucket
+from .types import DsTarget
+from .pool import get_probe_abort
+
+# Read response bodies in chunks of this size
+CHUNK_SIZE = 65536
+
+# Error message of probes aborted by their caller
+ABORTED = "Cancelled: Probe aborted, as the scrape which started it timed out"
+
+
+class BodyError(Exception):
+    """Raised if a response body exceeds its size limit or deadline."""
+
+
+class Extractor:
+    """Runs the extract regexes for a status code over a body streamed chunk by chunk.
+
+    The body is searched in a window, which is moved on once it holds twice
+    ``max_length`` bytes. Matches starting in the first half are taken, the
+    second half is searched again together with the next chunks, so matches of
+    up to ``max_length`` bytes are found anywhere in the body (0 searches the
+    whole body at once). As with re.findall, matches do not overlap and the
+    first regex (in order of precedence) with any match wins, later regexes are
+    not searched anymore once an earlier one matched.
+    """
+
+    def __init__(self, buckets: Tuple[Bucket, ...], max_length: int) -> None:
+        self.__buckets = buckets
+        self.__max_length = max_length
+        self.__window = bytearray()
+        # Body offset of the window and per regex: offset to continue at and matches
+        self.__offset = 0
+        self.__resume = [[0] * len(patterns) for _, patterns in buckets]
+        self.__matches: List[List[List[bytes]]] = [
+            [[] for _ in patterns] for _, patterns in buckets
+        ]
+        self.__winner: Optional[Tuple[int, int]] = None
+
+    def feed(self, chunk: bytes) -> None:
+        """Search the next chunk of the body."""
+        self.__window += chunk
+        if self.__max_length and len(self.__window) >= 2 * self.__max_length:
+            done = len(self.__window) - self.__max_length
+            self.__search(done)
+            del self.__window[:done]
+            self.__offset += done
+
+    def finish(self) -> List[str]:
+        """Search the rest of the body and return the matches of the winning regex."""
+        self.__search(len(self.__window) + 1)
+        self.__window = bytearray()
+        if self.__winner is None:
+            return []
+        bucket, index = self.__winner
+        return [item.decode("utf-8") for item in self.__matches[bucket][index]]
+
+    def __search(self, done: int) -> None:
+        """Collect matches starting before done (relative to the window) of every regex."""
+        window = bytes(self.__window)
+        for bucket, (combined, patterns) in enumerate(self.__buckets):
+            if self.__winner is not None and bucket > self.__winner[0]:
+                return
+            start = min(self.__resume[bucket]) - self.__offset
+            if combined is not None and combined.search(window, max(start, 0)) is None:
+                continue
+            for index, pattern in enumerate(patterns):
+                if self.__winner is not None and (bucket, index) > self.__winner:
+                    return
+                if self.__collect(bucket, index, pattern, window, done):
+                    self.__winner = (bucket, index)
+
+    def __collect(
+        self, bucket: int, index: int, pattern: Pattern[bytes], window: bytes, done: int
+    ) -> bool:
+        """Collect the matches of a single regex, returns True if it has any."""
+        matches = self.__matches[bucket][index]
+        resume = self.__resume[bucket][index]
+        for match in pattern.finditer(window, max(resume - self.__offset, 0)):
+            if match.start() >= done:
+                break
+            matches.append(match.group(1 if pattern.groups else 0) or b"")
+            # Empty matches would be found again at the same offset
+            resume = self.__offset + max(match.end(), match.start() + 1)
+        self.__resume[bucket][index] = max(resume, self.__offset + done)
+        return bool(matches)
+
+
+class BodySink:
+    """Counts a response body chunk by chunk without keeping it in memory.
+
+    If the target defines extract regexes for the status code, they are run over
+    the body as it streams in (see Extractor), buffering at most twice
+    ``max_extract_bytes`` of it. Downloads are aborted once the body exceeds
+    ``max_body_bytes`` of the target (0 disables the limit), the deadline passed
+    or the probe has been aborted.
+    """
+
+    def __init__(self, target: DsTarget, deadline: Optional[float], status_code: int) -> None:
+        self.__limit = target.max_body_bytes
+        self.__deadline = deadline
+        self.__abort = get_probe_abort()
+        self.__extractor = None
+        buckets = target.extract_plan.get(status_code)
+        if buckets:
+            self.__extractor = Extractor(buckets, target.max_extract_bytes)
+        self.__size = 0
+
+    @property
+    def size(self) -> int:
+        """Number of body bytes consumed so far."""
+        return self.__size
+
+    def feed(self, chunk: bytes) -> None:
+        """Consume the next chunk of the body."""
+        self.__size += len(chunk)
+        if self.__limit and self.__size > self.__limit:
+            raise BodyError(f"Body exceeds max_body_bytes of {self.__limit} bytes")
+        if self.__deadline is not None and timeit.default_timer() > self.__deadline:
+            raise BodyError(f"Timeout: Deadline exceeded after {self.__size} body bytes")
+        if self.__abort is not None and self.__abort.aborted:
+            raise BodyError(f"{ABORTED} after {self.__size} body bytes")
+        if self.__extractor is not None:
+            self.__extractor.feed(chunk)
+
+    def extract(self) -> List[str]:
+        """Get the strings extracted from the whole body."""
+        if self.__extractor is None:
+            return []
+        return self.__extractor.finish()
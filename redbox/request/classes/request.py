@@ -1,41 +1,195 @@
 """Abstract class definition."""
 
-from typing import List, Dict
+from typing import List, Dict, Optional, Set, Tuple, Union
 
-import re
+import concurrent.futures
+import logging
+import timeit
 from abc import ABC
 from abc import abstractmethod
 
 from ..types import DsTarget
 from ..types import DsResponse
 from ..conditions import evaluate_response
+from ..pool import ProbePool
+from ..resolver import prefetch
+
+logger = logging.getLogger(__name__)
 
 
 class Request(ABC):
     """Abstract class to be implemented by all Request handlers."""
 
+    def __init__(self, pool: ProbePool) -> None:
+        self.__pool = pool
+
+    @property
+    def pool(self) -> ProbePool:
+        """Shared probe pool."""
+        return self.__pool
+
     # --------------------------------------------------------------------------
     # Abstract Functions
     # --------------------------------------------------------------------------
     @abstractmethod
-    def request(self, target: DsTarget) -> DsResponse:
-        """Make a request and return the response."""
+    def request(self, target: DsTarget, deadline: Optional[float] = None) -> DsResponse:
+        """Make a request and return the response.
+
+        If a deadline (timeit.default_timer() based) is given, the request must not
+        take longer than that.
+        """
         raise NotImplementedError
 
     # --------------------------------------------------------------------------
     # Public Functions
     # --------------------------------------------------------------------------
+    def request_many(self, targets: List[DsTarget], timeout: Union[int, float]) -> List[DsResponse]:
+        """Request all targets concurrently and return their responses.
+
+        Targets which did not finish within timeout get a failed response.
+        Run in the shared probe pool so the time taken is not summed up by each defined target.
+        Targets which are being probed already (e.g. by an overlapping scrape) are not
+        probed again, but get a copy of the response of the in-flight probe.
+        """
+        responses: List[DsResponse] = []
+        time_threads_start = timeit.default_timer()
+        deadline = time_threads_start + timeout
+        prefetch([target.hostname for target in targets], timeout)
+        future_tasks = {}
+        joined: Set["concurrent.futures.Future[DsResponse]"] = set()
+        for target in targets:
+            future = self.pool.join(target.name)
+            if future is not None:
+                joined.add(future)
+            else:
+                future = self.submit(target, deadline)
+            if future is None:
+                responses.append(self.build_rejected_response(target))
+            else:
+                future_tasks[future] = target
+        has_timeout = False
+        try:
+            remaining = max(0, deadline - timeit.default_timer())
+            for future in concurrent.futures.as_completed(future_tasks, timeout=remaining):
+                if future.cancelled():
+                    responses.append(self.build_cancelled_response(future_tasks[future]))
+                else:
+                    responses.append(future.result())
+        except concurrent.futures.TimeoutError:
+            has_timeout = True
+            time_threads_end = timeit.default_timer()
+            # Probes still waiting for a free worker will never be needed
+            # (joined probes are left to the scrape which started them)
+            self.pool.cancel(
+                [future for future in future_tasks if not future.done() and future not in joined]
+            )
+            logger.warning(
+                "Threads timed out after: %.6f sec", time_threads_end - time_threads_start
+            )
+        else:
+            time_threads_end = timeit.default_timer()
+
+        # If we encountered a thread timeout, we fill up all targets which had a timeout
+        # with default values and a timeout error;
+        if has_timeout:
+            responses = self.fill_timed_out(
+                targets, responses, time_threads_end - time_threads_start
+            )
+        return responses
+
+    def submit(
+        self, target: DsTarget, deadline: float
+    ) -> "Optional[concurrent.futures.Future[DsResponse]]":
+        """Probe a target in the background (in the shared probe pool).
+
+        Returns None if a probe of this target is still in flight.
+        """
+        return self.pool.submit(target, self.request, deadline)
+
+    def close(self) -> None:
+        """Release resources held by this request handler."""
+
+    def set_targets(self, targets: List[DsTarget]) -> None:
+        """Apply reloaded targets (request handlers probing any given target ignore them)."""
+
+    def stats(self) -> Dict[str, int]:
+        """Return statistics of the probe pool (size, inflight, ..., throttled, joined)."""
+        return self.pool.stats()
+
+    def log_response(self, response: DsResponse, request_time: float) -> DsResponse:
+        """Log the result of a probe and return its response.
+
+        Successful probes are logged with the success flag, so they can be sampled.
+        """
+        logger.info(
+            "Target Response [%d]: %.3f sec for %s",
+            response.status_code,
+            request_time,
+            response.name,
+            extra={
+                "target": response.name,
+                "status_code": response.status_code,
+                "duration": request_time,
+                "success": response.success,
+            },
+        )
+        return response
+
+    def fill_timed_out(
+        self, targets: List[DsTarget], responses: List[DsResponse], elapsed: float
+    ) -> List[DsResponse]:
+        """Add a scrape timeout response for every target without a response."""
+        names = {response.name for response in responses}
+        for desired in targets:
+            if desired.name not in names:
+                responses.append(
+                    self.build_failed_response(
+                        desired, "Timeout: Scrape timeout after {0:.6f}s".format(elapsed)
+                    )
+                )
+        return responses
+
+    @staticmethod
+    def get_timeout(target: DsTarget, deadline: Optional[float]) -> float:
+        """Get target timeout, capped by the time left until deadline."""
+        if deadline is None:
+            return float(target.timeout)
+        return min(float(target.timeout), deadline - timeit.default_timer())
+
+    @staticmethod
+    def build_rejected_response(target: DsTarget) -> DsResponse:
+        """Get a failed response for a target which is still being probed."""
+        return Request.build_failed_response(
+            target, "Rejected: Previous probe of this target is still running"
+        )
+
+    @staticmethod
+    def build_cancelled_response(target: DsTarget) -> DsResponse:
+        """Get a failed response for a joined probe which its own scrape cancelled."""
+        return Request.build_failed_response(
+            target, "Cancelled: Joined probe timed out in the scrape which started it"
+        )
+
     @staticmethod
     def build_valid_response(
         target: DsTarget,
         headers: Dict[str, str],
-        body: bytes,
+        extract: List[str],
         time_ttfb: float,
         time_download: float,
         time_render: float,
         status_code: int,
+        *,
+        connection_reused: bool = False,
+        size: int = 0,
+        phases: Optional[Tuple[float, float, float]] = None,
     ) -> DsResponse:
-        """Get a filled in data structure for a succeeded response."""
+        """Get a filled in data structure for a succeeded response.
+
+        Extract holds the strings extracted from the body while it was streamed.
+        Phases are the DNS, connect and TLS times, which are all part of time_ttfb.
+        """
+        time_dns, time_connect, time_tls = phases or (0, 0, 0)
         return evaluate_response(
             target,
             DsResponse(
@@ -44,16 +198,19 @@ class Request(ABC):
                     "groups": target.groups,
                     "url": target.url,
                     "headers": headers,
-                    "body": body,
-                    "size": len(body),
+                    "size": size,
+                    "time_dns": time_dns,
+                    "time_connect": time_connect,
+                    "time_tls": time_tls,
                     "time_ttfb": time_ttfb,
                     "time_download": time_download,
                     "time_render": time_render,
                     "time_total": (time_ttfb + time_download + time_render),
+                    "connection_reused": connection_reused,
                     "status_code": status_code,
                     "status_family": str(status_code)[0] + "xx",
                     "success": True,
-                    "extract": Request.__extract_from_body(target, body, status_code),
+                    "extract": extract,
                     "err_msg": "",
                 }
             ),
@@ -68,12 +225,15 @@ class Request(ABC):
                 "groups": target.groups,
                 "url": target.url,
                 "headers": [],
-                "body": b"",
                 "size": 0,
+                "time_dns": 0,
+                "time_connect": 0,
+                "time_tls": 0,
                 "time_ttfb": 0,
                 "time_download": 0,
                 "time_render": 0,
                 "time_total": 0,
+                "connection_reused": False,
                 "status_code": 0,
                 "status_family": "0xx",
                 "success": False,
@@ -81,32 +241,3 @@ class Request(ABC):
                 "err_msg": err_msg,
             }
         )
-
-    # --------------------------------------------------------------------------
-    # Private Functions
-    # --------------------------------------------------------------------------
-    @staticmethod
-    def __extract_from_body(target: DsTarget, body: bytes, status_code: int) -> List[str]:
-        """Create human readable error message."""
-        if target.extract:
-            if str(status_code) in target.extract:
-                for regex in target.extract[str(status_code)]:
-                    regobj = re.compile(regex.encode(), re.IGNORECASE)
-                    result = regobj.findall(body)
-                    if result:
-                        return [item.decode("utf-8") for item in result]
-
-            if str(status_code)[0] + "xx" in target.extract:
-                for regex in target.extract[str(status_code)[0] + "xx"]:
-                    regobj = re.compile(regex.encode(), re.IGNORECASE)
-                    result = regobj.findall(body)
-                    if result:
-                        return [item.decode("utf-8") for item in result]
-
-            if "*" in target.extract:
-                for regex in target.extract["*"]:
-                    regobj = re.compile(regex.encode(), re.IGNORECASE)
-                    result = regobj.findall(body)
-                    if result:
-                        return [item.decode("utf-8") for item in result]
-        return []
@@ -0,0 +1,299 @@
+"""Process-wide bounded pool for running probes."""
+
+from typing import Callable, Dict, List, Optional
+
+import concurrent.futures
+import copy
+import threading
+import timeit
+
+from ..debug import get_profiler
+from .types import DsResponse
+from .types import DsTarget
+from .throttle import Throttle, ThrottleTicket
+
+# Abort handle of the probe currently running in this thread (set by the probe pool)
+_LOCAL = threading.local()
+
+
+def get_probe_abort() -> "Optional[ProbeAbort]":
+    """Return the abort handle of the probe running in this thread (None if not pooled)."""
+    abort: Optional[ProbeAbort] = getattr(_LOCAL, "abort", None)
+    return abort
+
+
+class ProbeAbort:
+    """Aborts a running probe whose caller gave up on it.
+
+    Request handlers check ``aborted`` between steps and register callbacks,
+    which interrupt blocking work (e.g. shut down the socket a probe waits on).
+    Once the probe finished, aborting it has no effect anymore.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__aborted = False
+        self.__finished = False
+        self.__callbacks: List[Callable[[], object]] = []
+
+    @property
+    def aborted(self) -> bool:
+        """Returns True if the probe has been aborted."""
+        return self.__aborted
+
+    def add_callback(self, callback: Callable[[], object]) -> None:
+        """Call callback on abort (right away if the probe has been aborted already)."""
+        with self.__lock:
+            if not self.__aborted:
+                if not self.__finished:
+                    self.__callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], object]) -> None:
+        """Do not call callback on abort anymore."""
+        with self.__lock:
+            if callback in self.__callbacks:
+                self.__callbacks.remove(callback)
+
+    def abort(self) -> bool:
+        """Abort the probe, returns False if it has finished or was aborted already."""
+        with self.__lock:
+            if self.__aborted or self.__finished:
+                return False
+            self.__aborted = True
+            callbacks = self.__callbacks
+            self.__callbacks = []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:  # pylint: disable=broad-except
+                pass
+        return True
+
+    def finish(self) -> None:
+        """Mark the probe as finished and drop its callbacks."""
+        with self.__lock:
+            self.__finished = True
+            self.__callbacks = []
+
+
+class ProbePool:
+    """Bounded thread pool shared by all scrapes and the scheduler.
+
+    The pool tracks in-flight probes per target name and refuses to start a
+    second probe of a target while one is still running. Instead, overlapping
+    scrapes can join the in-flight probe and share its response. Every probe
+    carries a deadline, which the request handlers use to cap their own timeouts.
+    Probes which have not started before the caller gave up are cancelled,
+    running ones are aborted (see ProbeAbort).
+    With a throttle, probes only enter the pool once the limits of their host
+    and groups admit them. The time waited until a probe started is set as its
+    time_queue.
+    """
+
+    def __init__(self, size: int, throttle: Optional[Throttle] = None) -> None:
+        self.__size = size
+        self.__throttle = throttle
+        self.__executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="probe"
+        )
+        self.__lock = threading.Lock()
+        self.__inflight: Dict[str, float] = {}
+        self.__flights: Dict[str, "concurrent.futures.Future[DsResponse]"] = {}
+        self.__aborts: Dict["concurrent.futures.Future[DsResponse]", ProbeAbort] = {}
+        self.__queued = 0
+        self.__rejected = 0
+        self.__cancelled = 0
+        self.__aborted = 0
+        self.__joined = 0
+
+    @property
+    def throttle(self) -> Optional[Throttle]:
+        """Per-host and per-group limits of probes (None if unlimited)."""
+        return self.__throttle
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def acquire(
+        self,
+        name: str,
+        deadline: float,
+        flight: "Optional[concurrent.futures.Future[DsResponse]]" = None,
+    ) -> bool:
+        """Register an in-flight probe of a target and the future others can join.
+
+        Returns False (and counts a rejection) if the target is still being probed.
+        """
+        with self.__lock:
+            if name in self.__inflight:
+                self.__rejected += 1
+                return False
+            self.__inflight[name] = deadline
+            if flight is not None:
+                self.__flights[name] = flight
+            return True
+
+    def release(
+        self, name: str, future: "Optional[concurrent.futures.Future[DsResponse]]" = None
+    ) -> None:
+        """Unregister an in-flight probe of a target (and the future it was submitted as)."""
+        with self.__lock:
+            self.__inflight.pop(name, None)
+            self.__flights.pop(name, None)
+            if future is not None:
+                self.__aborts.pop(future, None)
+
+    def join(self, name: str) -> "Optional[concurrent.futures.Future[DsResponse]]":
+        """Join the in-flight probe of a target instead of probing it again.
+
+        Returns None if the target is not being probed. Otherwise the returned
+        future gets a copy of the response of the in-flight probe, which is marked
+        as joined, or is cancelled if the in-flight probe is cancelled.
+        """
+        with self.__lock:
+            flight = self.__flights.get(name)
+            if flight is None:
+                return None
+            self.__joined += 1
+        joined: "concurrent.futures.Future[DsResponse]" = concurrent.futures.Future()
+        flight.add_done_callback(lambda _: ProbePool.__follow(flight, joined))
+        return joined
+
+    def submit(
+        self,
+        target: DsTarget,
+        func: Callable[[DsTarget, float], DsResponse],
+        deadline: float,
+    ) -> "Optional[concurrent.futures.Future[DsResponse]]":
+        """Run func(target, deadline) in the pool.
+
+        Returns None if a probe of this target is still in flight.
+        """
+        future: "concurrent.futures.Future[DsResponse]" = concurrent.futures.Future()
+        if not self.acquire(target.name, deadline, future):
+            return None
+        submitted = timeit.default_timer()
+        abort = ProbeAbort()
+
+        def run(target: DsTarget, deadline: float) -> DsResponse:
+            with self.__lock:
+                self.__queued -= 1
+            time_queue = timeit.default_timer() - submitted
+            _LOCAL.abort = abort
+            try:
+                profiler = get_profiler()
+                if profiler is not None:
+                    response = profiler.run(False, func, target, deadline)
+                else:
+                    response = func(target, deadline)
+            finally:
+                _LOCAL.abort = None
+                abort.finish()
+            response.time_queue = time_queue
+            return response
+
+        def probe(ticket: Optional[ThrottleTicket]) -> None:
+            try:
+                if not future.set_running_or_notify_cancel():
+                    return
+                try:
+                    future.set_result(run(target, deadline))
+                except BaseException as error:  # pylint: disable=broad-except
+                    future.set_exception(error)
+            finally:
+                if ticket is not None and self.__throttle is not None:
+                    self.__throttle.release(ticket)
+
+        def start(ticket: Optional[ThrottleTicket]) -> None:
+            try:
+                self.__executor.submit(probe, ticket)
+            except RuntimeError:
+                # Pool is shut down
+                if ticket is not None and self.__throttle is not None:
+                    self.__throttle.release(ticket)
+                future.cancel()
+
+        with self.__lock:
+            self.__queued += 1
+            self.__aborts[future] = abort
+        future.add_done_callback(lambda _: self.release(target.name, future))
+        if self.__throttle is None:
+            start(None)
+        else:
+            self.__throttle.submit(target, deadline, start)
+        return future
+
+    def cancel(self, futures: "List[concurrent.futures.Future[DsResponse]]") -> None:
+        """Cancel probes which have not been started yet and abort running ones."""
+        for future in futures:
+            if future.cancel():
+                with self.__lock:
+                    self.__queued -= 1
+                    self.__cancelled += 1
+                continue
+            with self.__lock:
+                abort = self.__aborts.get(future)
+            if abort is not None and abort.abort():
+                with self.__lock:
+                    self.__aborted += 1
+
+    def shutdown(self) -> None:
+        """Cancel queued probes and stop the pool."""
+        with self.__lock:
+            futures = list(self.__aborts)
+        # Queued probes skip their work once cancelled, running ones finish
+        for future in futures:
+            if future.cancel():
+                with self.__lock:
+                    self.__queued -= 1
+                    self.__cancelled += 1
+        self.__executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Return pool size and counts of in-flight, queued, orphaned and rejected probes.
+
+        Queued probes wait for a free thread of the pool or, counted as throttled
+        as well, for the limits of their host or groups. Orphaned probes are still
+        running although their deadline has passed. Aborted probes were running
+        when their caller gave up on them. Joined probes were shared by an
+        overlapping scrape instead of probing the target again.
+        """
+        now = timeit.default_timer()
+        throttled = 0 if self.__throttle is None else self.__throttle.stats()["throttled"]
+        with self.__lock:
+            return {
+                "size": self.__size,
+                "inflight": len(self.__inflight),
+                "queued": self.__queued,
+                "orphaned": len([1 for deadline in self.__inflight.values() if deadline < now]),
+                "rejected": self.__rejected,
+                "cancelled": self.__cancelled,
+                "aborted": self.__aborted,
+                "throttled": throttled,
+                "joined": self.__joined,
+            }
+
+    # --------------------------------------------------------------------------
+    # Private Functions
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def __follow(
+        flight: "concurrent.futures.Future[DsResponse]",
+        joined: "concurrent.futures.Future[DsResponse]",
+    ) -> None:
+        """Hand the outcome of an in-flight probe to a scrape which joined it."""
+        if flight.cancelled():
+            # Only this wakes up callers waiting for it in wait() or as_completed()
+            if joined.cancel():
+                joined.set_running_or_notify_cancel()
+        elif joined.set_running_or_notify_cancel():
+            error = flight.exception()
+            if error is not None:
+                joined.set_exception(error)
+            else:
+                # Every scrape gets its own copy, only the joined one is marked
+                response = copy.copy(flight.result())
+                response.joined = True
+                joined.set_result(response)
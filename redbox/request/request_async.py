@@ -0,0 +1,412 @@
+"""Make HTTP requests to defined targets on a single event loop."""
+
+from typing import Dict, List, Optional, Tuple, Union, Any
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import socket
+import ssl
+import threading
+import timeit
+from urllib.parse import urlencode, urlsplit, urlunsplit
+
+import requests.utils
+
+try:
+    import aiohttp  # type: ignore
+    from aiohttp.abc import AbstractResolver  # type: ignore
+except ImportError:
+    aiohttp = None
+    AbstractResolver = object
+
+from .types import DsResponse
+from .types import DsTarget
+from .classes import Request
+from .body import BodySink, BodyError, CHUNK_SIZE, ABORTED
+from .pool import ProbePool, get_probe_abort
+from .throttle import Throttle, ThrottleTicket
+from .transport import Phases
+from .resolver import get_cached, getaddrinfo, prefetch
+
+# Same redirect limit as the requests module uses
+MAX_REDIRECTS = 30
+
+logger = logging.getLogger(__name__)
+
+
+class RequestAsync(Request):
+    """HTTP requests on a single asyncio event loop.
+
+    All probes run as coroutines on one background event loop and at most
+    ``concurrency`` of them are in flight at the same time. Requests are made
+    with aiohttp (an optional dependency), set up like the requests module
+    (default headers, redirects, gzip/deflate, proxies from the environment), so
+    responses are comparable to RequestSimple. Every probe opens its own
+    connections. The TLS handshake is part of the connect phase, as aiohttp
+    does not report it separately. Targets using digest auth are handed to the
+    fallback request handler in the loop's thread pool.
+    Probes wait for the limits of the probe pool's throttle on the loop.
+    """
+
+    def __init__(self, pool: ProbePool, concurrency: int, fallback: Request) -> None:
+        super().__init__(pool)
+        if aiohttp is None:
+            raise RuntimeError("The async engine requires the aiohttp package")
+        self.__concurrency = concurrency
+        self.__fallback = fallback
+        self.__ssl = ssl.create_default_context(cafile=requests.utils.DEFAULT_CA_BUNDLE_PATH)
+        self.__semaphore: Optional[asyncio.Semaphore] = None
+        self.__session: Any = None
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__loop.run_forever, name="engine", daemon=True)
+        self.__thread.start()
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def request(self, target: DsTarget, deadline: Optional[float] = None) -> DsResponse:
+        """Make Http request and return response."""
+        future = asyncio.run_coroutine_threadsafe(self.__probe(target, deadline), self.__loop)
+        # Aborting a pooled probe cancels its coroutine
+        abort = get_probe_abort()
+        if abort is not None:
+            abort.add_callback(future.cancel)
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            return self.log_response(self.build_failed_response(target, ABORTED), float(0))
+
+    def submit(
+        self, target: DsTarget, deadline: float
+    ) -> "Optional[concurrent.futures.Future[DsResponse]]":
+        """Probe a target on the event loop, without occupying a thread of the probe pool."""
+        flight: "concurrent.futures.Future[DsResponse]" = concurrent.futures.Future()
+        if not self.pool.acquire(target.name, deadline, flight):
+            return None
+        probe = asyncio.run_coroutine_threadsafe(
+            self.__probe_tracked(target, deadline), self.__loop
+        )
+        probe.add_done_callback(functools.partial(RequestAsync.__land, flight))
+        return flight
+
+    def request_many(self, targets: List[DsTarget], timeout: Union[int, float]) -> List[DsResponse]:
+        """Request all targets on the event loop and return their responses."""
+        start = timeit.default_timer()
+        prefetch([target.hostname for target in targets], timeout)
+        timeout -= timeit.default_timer() - start
+        future = asyncio.run_coroutine_threadsafe(self.__probe_many(targets, timeout), self.__loop)
+        return future.result()
+
+    def close(self) -> None:
+        """Close the HTTP session and stop the event loop."""
+        if self.__session is not None:
+            asyncio.run_coroutine_threadsafe(self.__session.close(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+
+    # --------------------------------------------------------------------------
+    # Private Functions: Probing
+    # --------------------------------------------------------------------------
+    async def __probe_many(
+        self, targets: List[DsTarget], timeout: Union[int, float]
+    ) -> List[DsResponse]:
+        """Probe all targets and cancel the ones exceeding timeout."""
+        if not targets:
+            return []
+        start = timeit.default_timer()
+        deadline = start + timeout
+        responses = []
+        tasks: Dict["asyncio.Future[DsResponse]", DsTarget] = {}
+        for target in targets:
+            # Join the probe of an overlapping scrape (or the scheduler) if there is one
+            joined = self.pool.join(target.name)
+            if joined is not None:
+                tasks[asyncio.wrap_future(joined)] = target
+                continue
+            # In-flight probes are tracked in the shared pool, even if it runs no coroutines
+            flight: "concurrent.futures.Future[DsResponse]" = concurrent.futures.Future()
+            if self.pool.acquire(target.name, deadline, flight):
+                probe = asyncio.ensure_future(self.__probe_tracked(target, deadline))
+                probe.add_done_callback(functools.partial(RequestAsync.__land, flight))
+                tasks[probe] = target
+            else:
+                responses.append(self.build_rejected_response(target))
+        if not tasks:
+            return responses
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        for task, target in tasks.items():
+            if task in done:
+                if task.cancelled():
+                    responses.append(self.build_cancelled_response(target))
+                else:
+                    responses.append(task.result())
+        if pending:
+            elapsed = timeit.default_timer() - start
+            logger.warning("Coroutines timed out after: %.6f sec", elapsed)
+            responses = self.fill_timed_out(targets, responses, elapsed)
+        return responses
+
+    async def __probe_tracked(self, target: DsTarget, deadline: float) -> DsResponse:
+        """Probe a single target and unregister it from the pool once done or cancelled."""
+        throttle = self.pool.throttle
+        ticket = None
+        try:
+            start = timeit.default_timer()
+            if throttle is not None:
+                ticket = await RequestAsync.__admit(throttle, target, deadline)
+            return await self.__probe(target, deadline, start)
+        finally:
+            if ticket is not None and throttle is not None:
+                throttle.release(ticket)
+            self.pool.release(target.name)
+
+    async def __probe(
+        self, target: DsTarget, deadline: Optional[float], start: Optional[float] = None
+    ) -> DsResponse:
+        """Probe a single target within the concurrency limit.
+
+        The time since start (if given) until the probe got a slot is its time_queue.
+        """
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.__concurrency)
+        async with self.__semaphore:
+            time_queue = 0.0 if start is None else timeit.default_timer() - start
+            if target.digest_auth:
+                loop = asyncio.get_event_loop()
+                response = await loop.run_in_executor(
+                    None, self.__fallback.request, target, deadline
+                )
+            else:
+                response = await self.__fetch(target, deadline)
+        if start is not None:
+            response.time_queue = time_queue
+        return response
+
+    @staticmethod
+    def __land(
+        flight: "concurrent.futures.Future[DsResponse]",
+        task: "Union[asyncio.Future[DsResponse], concurrent.futures.Future[DsResponse]]",
+    ) -> None:
+        """Hand the outcome of a probe to the future scrapes joining it wait for."""
+        if task.cancelled():
+            flight.cancel()
+        elif task.exception() is not None:
+            flight.set_exception(task.exception())
+        else:
+            flight.set_result(task.result())
+
+    @staticmethod
+    async def __admit(throttle: Throttle, target: DsTarget, deadline: float) -> ThrottleTicket:
+        """Wait until the throttle admits a probe of the target."""
+        loop = asyncio.get_event_loop()
+        admitted: "asyncio.Future[ThrottleTicket]" = loop.create_future()
+
+        def resolve(ticket: ThrottleTicket) -> None:
+            # The probe may have timed out while waiting
+            if admitted.cancelled():
+                throttle.release(ticket)
+            else:
+                admitted.set_result(ticket)
+
+        def start(ticket: ThrottleTicket) -> None:
+            loop.call_soon_threadsafe(resolve, ticket)
+
+        throttle.submit(target, deadline, start)
+        return await admitted
+
+    async def __fetch(self, target: DsTarget, deadline: Optional[float]) -> DsResponse:
+        """Make Http request and return response."""
+        error = ""
+        status_code = 0
+        request_time = float(0)
+        timeout = self.get_timeout(target, deadline)
+        if timeout <= 0:
+            return self.build_failed_response(target, "Timeout: Deadline exceeded before start")
+        trace = _Trace()
+        try:
+            start = timeit.default_timer()
+            # A single timeout for all redirects and the body, like the deadline
+            status_code, headers, sink = await asyncio.wait_for(
+                self.__send(target, deadline, trace), timeout
+            )
+            request_time = timeit.default_timer() - start
+        except asyncio.TimeoutError:
+            error = "Timeout: No response after {0:.3f}s".format(timeout)
+        except (OSError, ValueError, BodyError) as err:
+            error = str(err) or type(err).__name__
+        except aiohttp.ClientError as err:
+            error = str(err) or type(err).__name__
+
+        if error:
+            return self.log_response(self.build_failed_response(target, error), request_time)
+
+        # Like RequestSimple: TTFB of the last response, the rest counts as download
+        phases = trace.phases
+        valid = self.build_valid_response(
+            target,
+            headers,
+            sink.extract(),
+            trace.time_ttfb,
+            request_time - trace.time_ttfb,
+            float(0),
+            status_code,
+            size=sink.size,
+            phases=(phases.dns, phases.connect, phases.tls),
+        )
+        return self.log_response(valid, request_time)
+
+    # --------------------------------------------------------------------------
+    # Private Functions: HTTP
+    # --------------------------------------------------------------------------
+    async def __send(
+        self, target: DsTarget, deadline: Optional[float], trace: "_Trace"
+    ) -> Tuple[int, Dict[str, str], BodySink]:
+        """Send a request, follow redirects and stream the body of the last response."""
+        auth = None
+        if target.basic_auth:
+            auth = aiohttp.BasicAuth(target.basic_auth["username"], target.basic_auth["password"])
+        async with self.__get_session().request(
+            target.method.upper(),
+            RequestAsync.__get_url(target),
+            headers=RequestAsync.__get_headers(target),
+            auth=auth,
+            max_redirects=MAX_REDIRECTS,
+            trace_request_ctx=trace,
+        ) as response:
+            trace.time_ttfb = timeit.default_timer() - trace.hop_start
+            sink = BodySink(target, deadline, response.status)
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                sink.feed(chunk)
+            # Repeated headers are folded the same way requests does
+            headers = {key: ", ".join(response.headers.getall(key)) for key in response.headers}
+            return (response.status, headers, sink)
+
+    def __get_session(self) -> Any:
+        """Get the HTTP session of the event loop (created on first use within the loop)."""
+        if self.__session is None:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_request_start.append(_Trace.on_hop)
+            trace_config.on_request_redirect.append(_Trace.on_hop)
+            trace_config.on_dns_resolvehost_start.append(_Trace.on_dns_start)
+            trace_config.on_dns_resolvehost_end.append(_Trace.on_dns_end)
+            trace_config.on_connection_create_start.append(_Trace.on_connect_start)
+            trace_config.on_connection_create_end.append(_Trace.on_connect_end)
+            connector = aiohttp.TCPConnector(
+                limit=0,
+                force_close=True,
+                use_dns_cache=False,
+                resolver=_CachedResolver(),
+                ssl=self.__ssl,
+            )
+            self.__session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                trace_configs=[trace_config],
+                timeout=aiohttp.ClientTimeout(total=None),
+                trust_env=True,
+            )
+        return self.__session
+
+    @staticmethod
+    def __get_url(target: DsTarget) -> str:
+        """Get target url with params appended to its query string."""
+        if not target.params:
+            return target.url
+        parts = urlsplit(target.url)
+        query = urlencode(target.params, doseq=True)
+        if parts.query:
+            query = parts.query + "&" + query
+        return urlunsplit(parts._replace(query=query))
+
+    @staticmethod
+    def __get_headers(target: DsTarget) -> Dict[str, str]:
+        """Get request headers: requests defaults, overwritten by target headers."""
+        headers = {
+            "User-Agent": requests.utils.default_user_agent(),
+            "Accept-Encoding": "gzip, deflate",
+            "Accept": "*/*",
+            "Connection": "close",
+        }
+        for key, value in target.headers.items():
+            for default in [name for name in headers if name.lower() == str(key).lower()]:
+                del headers[default]
+            headers[str(key)] = str(value)
+        return headers
+
+
+class _Trace:
+    """Timings of a single probe, collected from aiohttp's request tracing.
+
+    Phases are summed up over all connections opened by the probe (e.g. on
+    redirects). A hop starts with the request and with every redirect.
+    """
+
+    def __init__(self) -> None:
+        self.phases = Phases()
+        self.hop_start = timeit.default_timer()
+        self.time_ttfb = float(0)
+        self.dns_start = float(0)
+        self.connect_start = float(0)
+        self.connect_dns = float(0)
+
+    @staticmethod
+    async def on_hop(_: Any, context: Any, __: Any) -> None:
+        """Start timing the next request of the probe."""
+        context.trace_request_ctx.hop_start = timeit.default_timer()
+
+    @staticmethod
+    async def on_dns_start(_: Any, context: Any, __: Any) -> None:
+        """Start timing a hostname resolution."""
+        context.trace_request_ctx.dns_start = timeit.default_timer()
+
+    @staticmethod
+    async def on_dns_end(_: Any, context: Any, __: Any) -> None:
+        """Add the time a hostname resolution took to the DNS phase."""
+        trace = context.trace_request_ctx
+        trace.phases.dns += timeit.default_timer() - trace.dns_start
+
+    @staticmethod
+    async def on_connect_start(_: Any, context: Any, __: Any) -> None:
+        """Start timing a new connection."""
+        trace = context.trace_request_ctx
+        trace.connect_start = timeit.default_timer()
+        trace.connect_dns = trace.phases.dns
+
+    @staticmethod
+    async def on_connect_end(_: Any, context: Any, __: Any) -> None:
+        """Add the time a new connection took, without resolving its hostname, to connect."""
+        trace = context.trace_request_ctx
+        elapsed = timeit.default_timer() - trace.connect_start
+        trace.phases.connect += elapsed - (trace.phases.dns - trace.connect_dns)
+
+
+class _CachedResolver(AbstractResolver):  # type: ignore
+    """Resolves hostnames for aiohttp through the DNS cache (if enabled)."""
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> List[Dict[str, Any]]:
+        """Resolve a hostname without blocking the event loop."""
+        infos = get_cached(host, port)
+        if infos is None:
+            loop = asyncio.get_event_loop()
+            infos = await loop.run_in_executor(None, getaddrinfo, host, port, family)
+        return [
+            {
+                "hostname": host,
+                "host": address[0],
+                "port": address[1],
+                "family": fam,
+                "proto": proto,
+                "flags": socket.AI_NUMERICHOST,
+            }
+            for fam, _, proto, _, address in infos
+            if family in (0, fam)
+        ]
+
+    async def close(self) -> None:
+        """Nothing to release."""
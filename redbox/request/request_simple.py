@@ -3,7 +3,6 @@
 from typing import Optional, Any, Tuple, Union
 
 import re
-import sys
 import timeit
 
 import requests
@@ -13,37 +12,70 @@ from requests.auth import HTTPDigestAuth
 from .types import DsResponse
 from .types import DsTarget
 from .classes import Request
+from .body import BodySink, BodyError, CHUNK_SIZE, ABORTED
+from .pool import ProbePool, get_probe_abort
+from .transport import SessionPool
+from .transport import create_session, reset_probe_state, get_connection_reused, get_phases
 
 
 class RequestSimple(Request):
-    """Simple HTTP request."""
+    """Simple HTTP request.
+
+    If a SessionPool is given, requests are sent over long-lived per-origin sessions,
+    unless a target opts out via ``reuse_connection: false``.
+    """
+
+    def __init__(self, pool: ProbePool, sessions: Optional[SessionPool] = None) -> None:
+        super().__init__(pool)
+        self.__sessions = sessions
 
     # --------------------------------------------------------------------------
     # Public Functions
     # --------------------------------------------------------------------------
-    def request(self, target: DsTarget) -> DsResponse:
+    def request(self, target: DsTarget, deadline: Optional[float] = None) -> DsResponse:
         """Make Http request and return response."""
         error = ""
         failed = 0
         request_time = float(0)
+        remaining = self.get_timeout(target, deadline)
+        if remaining <= 0:
+            return self.build_failed_response(target, "Timeout: Deadline exceeded before start")
         try:
             auth = RequestSimple.__get_auth(target)
-            timeout = RequestSimple.__get_timeout(target)
+            timeout = RequestSimple.__get_timeout(remaining)
+            session, one_off = self.__get_session(target)
 
+            reset_probe_state()
             start = timeit.default_timer()
-            response = requests.request(
-                target.method,
-                target.url,
-                params=target.params,
-                headers=target.headers,
-                timeout=timeout,
-                auth=auth,
-            )
+            try:
+                response = session.request(
+                    target.method,
+                    target.url,
+                    params=target.params,
+                    headers=target.headers,
+                    timeout=timeout,
+                    auth=auth,
+                    stream=True,
+                )
+                # The body is streamed, so it never has to be held in memory as a whole
+                sink = BodySink(target, deadline, response.status_code)
+                try:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        sink.feed(chunk)
+                finally:
+                    response.close()
+            finally:
+                if one_off:
+                    session.close()
             # Note: response.elapsed.total_seconds() will only get you the time it takes
             # until you get the return headers without the response contents.
             # So here we also measure the complete request time including the body response.
             request_time = timeit.default_timer() - start
 
+        except BodyError as body_err:
+            error = str(body_err)
+            failed = 1
+
         except requests.exceptions.URLRequired as url_err:
             error = str(url_err)
             failed = 1
@@ -68,28 +100,31 @@ class RequestSimple(Request):
         except requests.exceptions.RequestException as req_err:
             error = str(req_err)
             failed = 1
-        else:
-            response.close()
-
-        print(
-            "Target Response [{}]: {} sec for {}".format(
-                0 if failed else response.status_code, "{0:.3f}".format(request_time), target.name
-            ),
-            file=sys.stderr,
-        )
 
         if failed == 1:
-            return self.build_failed_response(target, RequestSimple.__format_error(error))
+            # Errors of the shut down connection are not the target's fault
+            abort = get_probe_abort()
+            if abort is not None and abort.aborted and not error.startswith(ABORTED):
+                error = ABORTED
+            return self.log_response(
+                self.build_failed_response(target, RequestSimple.__format_error(error)),
+                request_time,
+            )
 
-        return self.build_valid_response(
+        phases = get_phases()
+        valid = self.build_valid_response(
             target,
             dict(response.headers),
-            response.content,
+            sink.extract(),
             response.elapsed.total_seconds(),
             request_time - response.elapsed.total_seconds(),
             float(0),
             response.status_code,
+            connection_reused=get_connection_reused(),
+            size=sink.size,
+            phases=(phases.dns, phases.connect, phases.tls),
         )
+        return self.log_response(valid, request_time)
 
     # --------------------------------------------------------------------------
     # Private Functions
@@ -109,6 +144,12 @@ class RequestSimple(Request):
                 pass
         return str(error)
 
+    def __get_session(self, target: DsTarget) -> Tuple[requests.Session, bool]:
+        """Get a pooled session or a one-off one, which must be closed after the request."""
+        if self.__sessions is not None and target.reuse_connection:
+            return (self.__sessions.get(target.url), False)
+        return (create_session(1, block_cookies=False), True)
+
     @staticmethod
     def __get_auth(target: DsTarget) -> Optional[Any]:
         """Get authentication mechanism if defined."""
@@ -125,16 +166,16 @@ class RequestSimple(Request):
         return None
 
     @staticmethod
-    def __get_timeout(target: DsTarget) -> Tuple[Union[int, float], Union[int, float]]:
+    def __get_timeout(timeout: float) -> Tuple[Union[int, float], Union[int, float]]:
         """Get timeout values."""
         # The connect timeout is the number of seconds Requests will wait for your client to
         # establish a connection to a remote machine (corresponding to the connect()) call on
         # the socket. It’s a good practice to set connect timeouts to slightly larger than a
         # multiple of 3, which is the default TCP packet retransmission window.
-        conn_timeout = target.timeout
+        conn_timeout = timeout
         # Once your client has connected to the server and sent the HTTP request, the read timeout
         # is the number of seconds the client will wait for the server to send a response.
         # (Specifically, it’s the number of seconds that the client will wait between bytes sent
         # from the server.
-        read_timeout = target.timeout
+        read_timeout = timeout
         return (conn_timeout, read_timeout)
@@ -0,0 +1,195 @@
+"""Process-wide DNS cache shared by all probe engines."""
+
+from typing import Dict, Iterable, List, Optional, Tuple, Union, Any
+
+import concurrent.futures
+import socket
+import threading
+import timeit
+
+from .types import DsTarget
+
+# getaddrinfo() result entries
+AddrInfo = Tuple[Any, Any, int, str, Any]
+
+# A cache entry: expiry and either the resolved addresses or the resolution error
+Entry = Tuple[float, Union[List[AddrInfo], socket.gaierror]]
+
+
+class DnsCache:
+    """Caches resolved addresses of hostnames.
+
+    The system resolver does not return TTLs, so positive answers are kept for
+    ``ttl`` and failed resolutions for ``negative_ttl`` seconds. Concurrent misses
+    of the same hostname wait for a single resolution. Hostnames are resolved
+    once for all families and ports, which are applied when reading the cache.
+    Prefetches share one pool of ``prefetch_workers`` threads. Hosts of targets
+    removed by a reload are evicted once the new targets are set.
+    """
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.__ttl = float(settings["ttl"])
+        self.__negative_ttl = float(settings["negative_ttl"])
+        self.__workers = int(settings["prefetch_workers"])
+        self.__prefetch_timeout = float(settings["prefetch_timeout"])
+        self.__executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.__workers, thread_name_prefix="dns"
+        )
+        self.__lock = threading.Lock()
+        self.__entries: Dict[str, Entry] = {}
+        self.__pending: Dict[str, threading.Event] = {}
+        self.__hits = 0
+        self.__misses = 0
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def get(self, host: str, port: int, family: int = 0) -> Optional[List[AddrInfo]]:
+        """Get cached addresses of a host or None if it must be resolved first.
+
+        Raises:
+            socket.gaierror: If the host failed to resolve (negative cache hit).
+        """
+        now = timeit.default_timer()
+        with self.__lock:
+            entry = self.__entries.get(host)
+            if entry is None or entry[0] <= now:
+                return None
+            self.__hits += 1
+        return DnsCache.__apply(entry[1], port, family)
+
+    def resolve(self, host: str, port: int, family: int = 0) -> List[AddrInfo]:
+        """Get addresses of a host from the cache or the system resolver.
+
+        Raises:
+            socket.gaierror: If the host cannot be resolved.
+        """
+        cached = self.get(host, port, family)
+        if cached is not None:
+            return cached
+        self.__refresh(host)
+        with self.__lock:
+            entry = self.__entries.get(host)
+        if entry is None:
+            # The resolution we waited for failed with an unexpected error
+            return socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+        return DnsCache.__apply(entry[1], port, family)
+
+    def prefetch(self, hosts: Iterable[str], timeout: Optional[float] = None) -> None:
+        """Resolve all missing or expired hosts in parallel.
+
+        Waits at most ``prefetch_timeout`` or timeout seconds, whichever is shorter.
+        Hosts still resolving afterwards are stored once done.
+        """
+        now = timeit.default_timer()
+        with self.__lock:
+            # Hosts still resolving from an earlier prefetch are not queued again
+            expired = {
+                host
+                for host in hosts
+                if host not in self.__pending
+                and (host not in self.__entries or self.__entries[host][0] <= now)
+            }
+        if not expired:
+            return
+        futures = [self.__executor.submit(self.__refresh, host) for host in expired]
+        if timeout is None or timeout > self.__prefetch_timeout:
+            timeout = self.__prefetch_timeout
+        concurrent.futures.wait(futures, timeout=timeout)
+
+    def set_targets(self, targets: List[DsTarget]) -> None:
+        """Evict the hosts of targets which are gone (e.g. removed by a reload)."""
+        hosts = {target.hostname for target in targets}
+        with self.__lock:
+            for host in [host for host in self.__entries if host not in hosts]:
+                del self.__entries[host]
+
+    def close(self) -> None:
+        """Stop the prefetch threads (resolutions still running are dropped)."""
+        self.__executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Return number of cached hosts, cache hits and cache misses."""
+        with self.__lock:
+            return {"size": len(self.__entries), "hits": self.__hits, "misses": self.__misses}
+
+    # --------------------------------------------------------------------------
+    # Private Functions
+    # --------------------------------------------------------------------------
+    def __refresh(self, host: str) -> None:
+        """Resolve a host and store the result, or wait for a resolution already running."""
+        with self.__lock:
+            event = self.__pending.get(host)
+            owner = event is None
+            if event is None:
+                event = self.__pending[host] = threading.Event()
+                self.__misses += 1
+        if not owner:
+            event.wait()
+            return
+        result: Union[List[AddrInfo], socket.gaierror]
+        try:
+            try:
+                result = socket.getaddrinfo(host, None, 0, socket.SOCK_STREAM)
+                expiry = timeit.default_timer() + self.__ttl
+            except socket.gaierror as error:
+                result = error
+                expiry = timeit.default_timer() + self.__negative_ttl
+            with self.__lock:
+                self.__entries[host] = (expiry, result)
+        finally:
+            with self.__lock:
+                del self.__pending[host]
+            event.set()
+
+    @staticmethod
+    def __apply(
+        result: Union[List[AddrInfo], socket.gaierror], port: int, family: int
+    ) -> List[AddrInfo]:
+        """Filter cached addresses by family and set the port."""
+        if isinstance(result, socket.gaierror):
+            # Raise a copy, as raising the cached error again would grow its traceback
+            raise socket.gaierror(result.errno, result.strerror)
+        return [
+            (fam, kind, proto, name, (address[0], port) + tuple(address[2:]))
+            for fam, kind, proto, name, address in result
+            if family in (0, fam)
+        ]
+
+
+# The cache in use, None if disabled
+_CACHE: Optional[DnsCache] = None
+
+
+# -------------------------------------------------------------------------------------------------
+# Public Methods
+# -------------------------------------------------------------------------------------------------
+def set_dns_cache(cache: Optional[DnsCache]) -> None:
+    """Set the DNS cache used by all probe engines (None to disable caching)."""
+    global _CACHE  # pylint: disable=global-statement
+    _CACHE = cache
+
+
+def get_dns_cache() -> Optional[DnsCache]:
+    """Return the DNS cache in use or None if disabled."""
+    return _CACHE
+
+
+def getaddrinfo(host: str, port: int, family: int = 0) -> List[AddrInfo]:
+    """Resolve TCP addresses of a host, through the DNS cache if enabled."""
+    if _CACHE is None:
+        return socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+    return _CACHE.resolve(host, port, family)
+
+
+def get_cached(host: str, port: int) -> Optional[List[AddrInfo]]:
+    """Return cached TCP addresses of a host or None if it must be resolved."""
+    if _CACHE is None:
+        return None
+    return _CACHE.get(host, port)
+
+
+def prefetch(hosts: Iterable[str], timeout: float) -> None:
+    """Resolve all hosts into the DNS cache ahead of probing, if enabled."""
+    if _CACHE is not None and timeout > 0:
+        _CACHE.prefetch([host for host in hosts if host], timeout)
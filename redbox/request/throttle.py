@@ -0,0 +1,279 @@
+"""Per-host and per-group concurrency and rate limits of probes."""
+
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Any
+
+import threading
+import timeit
+from collections import deque
+
+from .types import DsTarget
+
+
+class TokenBucket:
+    """Lets probes start at rate per second on average and up to burst of them at once."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.__rate = rate
+        self.__burst = float(max(1, burst))
+        self.__tokens = self.__burst
+        self.__updated = timeit.default_timer()
+
+    def wait(self, now: float) -> float:
+        """Get the seconds until a token is available (0 if one is available now)."""
+        self.__refill(now)
+        if self.__tokens >= 1:
+            return 0.0
+        return (1 - self.__tokens) / self.__rate
+
+    def take(self, now: float) -> None:
+        """Take a token."""
+        self.__refill(now)
+        self.__tokens -= 1
+
+    def __refill(self, now: float) -> None:
+        """Add the tokens accrued since the last update."""
+        self.__tokens = min(self.__burst, self.__tokens + (now - self.__updated) * self.__rate)
+        self.__updated = now
+
+
+class Limit:
+    """Concurrency cap and token bucket shared by all probes of one host or group value."""
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.__concurrency = int(settings["concurrency"])
+        self.__bucket = None
+        if settings["rate"] > 0:
+            self.__bucket = TokenBucket(float(settings["rate"]), int(settings["burst"]))
+        self.__running = 0
+
+    def wait(self, now: float) -> Optional[float]:
+        """Get the seconds until a probe may start (None if it has to wait for a release)."""
+        if 0 < self.__concurrency <= self.__running:
+            return None
+        if self.__bucket is None:
+            return 0.0
+        return self.__bucket.wait(now)
+
+    def acquire(self, now: float) -> None:
+        """Start a probe."""
+        self.__running += 1
+        if self.__bucket is not None:
+            self.__bucket.take(now)
+
+    def release(self) -> None:
+        """Finish a probe."""
+        self.__running -= 1
+
+
+class ThrottleTicket:
+    """A probe waiting for or holding the limits of its host and groups."""
+
+    def __init__(
+        self,
+        host: str,
+        limits: List[Limit],
+        deadline: float,
+        start: Callable[["ThrottleTicket"], None],
+    ) -> None:
+        self.__host = host
+        self.__limits = limits
+        self.__deadline = deadline
+        self.__start = start
+        self.acquired = False
+
+    @property
+    def host(self) -> str:
+        """Hostname of the probed target."""
+        return self.__host
+
+    @property
+    def limits(self) -> List[Limit]:
+        """Limits of the host and groups of the probed target."""
+        return self.__limits
+
+    @property
+    def deadline(self) -> float:
+        """Deadline of the probe, after which it starts regardless of the limits."""
+        return self.__deadline
+
+    def start(self) -> None:
+        """Start the probe."""
+        self.__start(self)
+
+
+class Throttle:
+    """Admits probes within per-host and per-group concurrency caps and rate limits.
+
+    Probes over a limit wait in a FIFO queue per host. Hosts with waiting probes
+    are served round robin, one probe per host and turn, so a host with many
+    targets cannot hold back the others. A dispatcher thread starts waiting
+    probes once a probe of their host or group finished or a token is due.
+    Probes whose deadline passed while waiting are started without holding
+    any limit, so they fail right away instead of waiting any longer.
+    """
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.__host = dict(settings["host"])
+        self.__hosts: Dict[str, Dict[str, Any]] = {
+            str(host).lower(): dict(self.__host, **limits)
+            for host, limits in settings["hosts"].items()
+        }
+        self.__groups: Dict[str, Dict[str, Any]] = {
+            str(key): dict(self.__host, **limits) for key, limits in settings["groups"].items()
+        }
+        self.__limits: Dict[str, Optional[Limit]] = {}
+        self.__queues: Dict[str, Deque[ThrottleTicket]] = {}
+        self.__order: Deque[str] = deque()
+        self.__waiting = 0
+        self.__stop = False
+        self.__cond = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run, name="throttle", daemon=True)
+        self.__thread.start()
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def is_limited(settings: Dict[str, Any]) -> bool:
+        """Check if limit settings limit anything at all."""
+        limits = [settings["host"]] + list(settings["hosts"].values())
+        limits += list(settings["groups"].values())
+        return any(limit.get("concurrency", 0) > 0 or limit.get("rate", 0) > 0 for limit in limits)
+
+    def submit(
+        self, target: DsTarget, deadline: float, start: Callable[[ThrottleTicket], None]
+    ) -> None:
+        """Call start(ticket) once the target may be probed (possibly right away).
+
+        The ticket has to be released once the probe finished.
+        """
+        now = timeit.default_timer()
+        with self.__cond:
+            ticket = ThrottleTicket(target.hostname, self.__get_limits(target), deadline, start)
+            # Nothing waits, so starting right away cannot overtake another probe
+            if self.__waiting == 0 and Throttle.__get_wait(ticket, now) == 0:
+                Throttle.__acquire(ticket, now)
+            else:
+                if ticket.host not in self.__queues:
+                    self.__queues[ticket.host] = deque()
+                    self.__order.append(ticket.host)
+                self.__queues[ticket.host].append(ticket)
+                self.__waiting += 1
+                self.__cond.notify()
+                return
+        ticket.start()
+
+    def release(self, ticket: ThrottleTicket) -> None:
+        """Release the limits held by a finished (or cancelled) probe."""
+        if not ticket.acquired:
+            return
+        with self.__cond:
+            for limit in ticket.limits:
+                limit.release()
+            ticket.acquired = False
+            if self.__waiting:
+                self.__cond.notify()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of probes waiting for a limit."""
+        with self.__cond:
+            return {"throttled": self.__waiting}
+
+    def close(self) -> None:
+        """Stop the dispatcher, waiting probes are not started anymore."""
+        with self.__cond:
+            self.__stop = True
+            self.__cond.notify()
+        self.__thread.join()
+
+    # --------------------------------------------------------------------------
+    # Private Functions
+    # --------------------------------------------------------------------------
+    def __get_limits(self, target: DsTarget) -> List[Limit]:
+        """Get (and create on first use) the limits of the host and groups of a target."""
+        keys: List[Tuple[str, Dict[str, Any]]] = [
+            ("host:" + target.hostname, self.__hosts.get(target.hostname, self.__host))
+        ]
+        for key, settings in self.__groups.items():
+            if key in target.groups:
+                keys.append((f"group:{key}={target.groups[key]}", settings))
+        limits = []
+        for key, settings in keys:
+            if key not in self.__limits:
+                limited = settings["concurrency"] > 0 or settings["rate"] > 0
+                self.__limits[key] = Limit(settings) if limited else None
+            limit = self.__limits[key]
+            if limit is not None:
+                limits.append(limit)
+        return limits
+
+    def __run(self) -> None:
+        """Start waiting probes as soon as their limits allow it, until stopped."""
+        while True:
+            with self.__cond:
+                while True:
+                    if self.__stop:
+                        return
+                    ready, wake = self.__dispatch()
+                    if ready:
+                        break
+                    self.__cond.wait(wake)
+            for ticket in ready:
+                ticket.start()
+
+    def __dispatch(self) -> Tuple[List[ThrottleTicket], Optional[float]]:
+        """Admit the first waiting probe of every host in turns as long as limits allow it.
+
+        Returns the admitted probes and the seconds until the next one may be due
+        (None if only a release can admit another probe).
+        """
+        now = timeit.default_timer()
+        ready = []
+        wake: Optional[float] = None
+        progress = True
+        while progress and self.__order:
+            progress = False
+            # Hosts which got a turn queue up behind the ones which had to wait
+            skipped: Deque[str] = deque()
+            served: Deque[str] = deque()
+            for host in self.__order:
+                queue = self.__queues[host]
+                ticket = queue[0]
+                wait = Throttle.__get_wait(ticket, now)
+                if ticket.deadline <= now or wait == 0:
+                    if ticket.deadline > now:
+                        Throttle.__acquire(ticket, now)
+                    queue.popleft()
+                    self.__waiting -= 1
+                    ready.append(ticket)
+                    progress = True
+                    if queue:
+                        served.append(host)
+                    else:
+                        del self.__queues[host]
+                else:
+                    due = ticket.deadline - now
+                    if wait is not None:
+                        due = min(due, wait)
+                    wake = due if wake is None else min(wake, due)
+                    skipped.append(host)
+            self.__order = skipped + served
+        return ready, wake
+
+    @staticmethod
+    def __get_wait(ticket: ThrottleTicket, now: float) -> Optional[float]:
+        """Get the seconds until all limits of a probe allow it to start (None: on release)."""
+        longest = 0.0
+        for limit in ticket.limits:
+            wait = limit.wait(now)
+            if wait is None:
+                return None
+            longest = max(longest, wait)
+        return longest
+
+    @staticmethod
+    def __acquire(ticket: ThrottleTicket, now: float) -> None:
+        """Let a probe hold all of its limits."""
+        for limit in ticket.limits:
+            limit.acquire(now)
+        ticket.acquired = True
@@ -0,0 +1,308 @@
+"""Long-lived HTTP sessions with connection reuse tracking and phase timing."""
+
+from typing import Callable, Dict, Tuple, Optional, Any
+
+import socket
+import threading
+import timeit
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+try:
+    from urllib3.exceptions import NameResolutionError
+except ImportError:
+    # urllib3 < 2 reports resolution errors as connection errors
+    NameResolutionError = None  # type: ignore
+
+from .pool import get_probe_abort
+from .resolver import getaddrinfo
+
+# Per-thread state of the probe currently running in this thread.
+_LOCAL = threading.local()
+
+# Guards which probe may shut down a connection on abort
+_ABORT_LOCK = threading.Lock()
+
+
+class Phases:  # pylint: disable=too-few-public-methods
+    """Connection phase timings of a single probe.
+
+    Timings are summed up over all connections opened by the probe (e.g. on
+    redirects) and stay 0 if a kept-alive connection was reused.
+    """
+
+    def __init__(self) -> None:
+        self.dns = float(0)
+        self.connect = float(0)
+        self.tls = float(0)
+
+
+# -------------------------------------------------------------------------------------------------
+# Public Methods
+# -------------------------------------------------------------------------------------------------
+def reset_probe_state() -> None:
+    """Reset per-thread connection state before a probe starts."""
+    _LOCAL.reused = False
+    _LOCAL.phases = Phases()
+
+
+def get_connection_reused() -> bool:
+    """Return True if the last request in this thread used a kept-alive connection."""
+    return bool(getattr(_LOCAL, "reused", False))
+
+
+def get_phases() -> Phases:
+    """Return the connection phase timings of the probe running in this thread."""
+    phases = getattr(_LOCAL, "phases", None)
+    if phases is None:
+        phases = _LOCAL.phases = Phases()
+    return phases
+
+
+def create_session(size: int, block_cookies: bool = True) -> requests.Session:
+    """Create a session with a sized, instrumented connection pool.
+
+    Long-lived sessions must block cookies, as every probe must look like a fresh client.
+    """
+    session = requests.Session()
+    if block_cookies:
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    # A few host pools besides the origin itself are kept for redirects
+    adapter = ReuseAdapter(pool_connections=4, pool_maxsize=size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# -------------------------------------------------------------------------------------------------
+# Connections
+# -------------------------------------------------------------------------------------------------
+def _get_urllib3_str(obj: Any, base: type) -> str:
+    """Describe a connection or pool by its urllib3 class, as urllib3 itself does.
+
+    urllib3 puts this into its error messages, which end up in the err_msg label,
+    so they must not change by using our own subclasses.
+    """
+    if not any("__str__" in vars(cls) for cls in base.__mro__[:-1]):
+        # urllib3 < 2 connections are described by the default object repr
+        return f"<{base.__module__}.{base.__qualname__} object at {hex(id(obj))}>"
+    return f"{base.__name__}(host={obj.host!r}, port={obj.port!r})"
+
+
+def _abort_on(conn: Any) -> None:
+    """Shut down the socket of a connection once the probe running in this thread is aborted.
+
+    The socket is looked up on abort, as it only exists (or is wrapped by TLS) later.
+    Shutting it down wakes up a blocking read right away. The probe only owns the
+    connection until it is put back into the pool (see _release_abort).
+    """
+    abort = get_probe_abort()
+    if abort is None:
+        return
+
+    def shutdown() -> None:
+        with _ABORT_LOCK:
+            if getattr(conn, "redbox_abort", None) is not shutdown:
+                # Back in the pool, maybe used by another probe already
+                return
+            sock = getattr(conn, "sock", None)
+            if sock is not None:
+                # Bypass TLS, which must not be touched while another thread reads
+                socket.socket.shutdown(sock, socket.SHUT_RDWR)
+
+    with _ABORT_LOCK:
+        conn.redbox_abort = shutdown
+    abort.add_callback(shutdown)
+
+
+def _release_abort(conn: Any) -> None:
+    """Detach a connection put back into the pool from the probe which used it."""
+    if conn is None:
+        return
+    with _ABORT_LOCK:
+        shutdown = getattr(conn, "redbox_abort", None)
+        conn.redbox_abort = None
+    abort = get_probe_abort()
+    if shutdown is not None and abort is not None:
+        abort.remove_callback(shutdown)
+
+
+def _open_socket(conn: Any, new_conn: Callable[[], socket.socket]) -> socket.socket:
+    """Resolve and connect a socket, recording DNS and connect time separately.
+
+    The host is resolved here and every address is handed to urllib3 one after
+    the other, so that urllib3 only connects and still raises its own errors.
+    """
+    phases = get_phases()
+    host = conn._dns_host  # pylint: disable=protected-access
+    start = timeit.default_timer()
+    try:
+        infos = getaddrinfo(host, conn.port, allowed_gai_family())
+    except socket.gaierror as err:
+        phases.dns += timeit.default_timer() - start
+        if NameResolutionError is None:
+            raise NewConnectionError(conn, f"Failed to establish a new connection: {err}") from err
+        raise NameResolutionError(host, conn, err) from err
+    resolved = timeit.default_timer()
+    phases.dns += resolved - start
+    error: Exception = NewConnectionError(conn, f"No address found for {host}")
+    try:
+        for info in infos:
+            conn._dns_host = info[4][0]  # pylint: disable=protected-access
+            try:
+                return new_conn()
+            except (NewConnectionError, ConnectTimeoutError) as err:
+                error = err
+    finally:
+        conn._dns_host = host  # pylint: disable=protected-access
+        phases.connect += timeit.default_timer() - resolved
+    raise error
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """HTTP connection which records DNS and connect time."""
+
+    def __str__(self) -> str:
+        """Describe the connection as urllib3 does."""
+        return _get_urllib3_str(self, HTTPConnection)
+
+    def _new_conn(self) -> socket.socket:
+        return _open_socket(self, super()._new_conn)
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS connection which records DNS, connect and TLS handshake time."""
+
+    def __str__(self) -> str:
+        """Describe the connection as urllib3 does."""
+        return _get_urllib3_str(self, HTTPSConnection)
+
+    def _new_conn(self) -> socket.socket:
+        return _open_socket(self, super()._new_conn)  # pylint: disable=no-member
+
+    def connect(self) -> None:
+        """Connect and attribute everything besides DNS and connect to the handshake."""
+        phases = get_phases()
+        before = phases.dns + phases.connect
+        start = timeit.default_timer()
+        super().connect()  # pylint: disable=no-member
+        phases.tls += timeit.default_timer() - start - (phases.dns + phases.connect - before)
+
+
+# -------------------------------------------------------------------------------------------------
+# Connection pools
+# -------------------------------------------------------------------------------------------------
+class ReuseHTTPConnectionPool(HTTPConnectionPool):
+    """HTTP connection pool which records whether a connection was reused."""
+
+    ConnectionCls = TimedHTTPConnection
+
+    def __str__(self) -> str:
+        """Describe the pool as urllib3 does."""
+        return _get_urllib3_str(self, HTTPConnectionPool)
+
+    def _get_conn(self, timeout: Optional[float] = None) -> Any:
+        conn = super()._get_conn(timeout)
+        # Dropped connections have already been closed by urllib3 at this point,
+        # so a connection with an open socket is a kept-alive one.
+        _LOCAL.reused = getattr(conn, "sock", None) is not None
+        _abort_on(conn)
+        return conn
+
+    def _put_conn(self, conn: Any) -> None:
+        _release_abort(conn)
+        super()._put_conn(conn)
+
+
+class ReuseHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS connection pool which records whether a connection was reused."""
+
+    ConnectionCls = TimedHTTPSConnection
+
+    def __str__(self) -> str:
+        """Describe the pool as urllib3 does."""
+        return _get_urllib3_str(self, HTTPSConnectionPool)
+
+    def _get_conn(self, timeout: Optional[float] = None) -> Any:
+        conn = super()._get_conn(timeout)
+        _LOCAL.reused = getattr(conn, "sock", None) is not None
+        _abort_on(conn)
+        return conn
+
+    def _put_conn(self, conn: Any) -> None:
+        _release_abort(conn)
+        super()._put_conn(conn)
+
+
+class ReuseAdapter(HTTPAdapter):
+    """Transport adapter using the reuse tracking connection pools."""
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        """Initialize the pool manager with our own connection pool classes."""
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": ReuseHTTPConnectionPool,
+            "https": ReuseHTTPSConnectionPool,
+        }
+
+
+# -------------------------------------------------------------------------------------------------
+# Session pool
+# -------------------------------------------------------------------------------------------------
+class SessionPool:
+    """Long-lived requests sessions keyed by scheme, host and port.
+
+    Sessions which have been idle for longer than ``keep_alive`` seconds are
+    replaced by a new one, as their connections have most likely been dropped
+    by the server already. A ``keep_alive`` of 0 keeps sessions forever.
+    """
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.__size = int(settings["size"])
+        self.__keep_alive = float(settings["keep_alive"])
+        self.__lock = threading.Lock()
+        self.__sessions: Dict[Tuple[str, str, int], Tuple[requests.Session, float]] = {}
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def get(self, url: str) -> requests.Session:
+        """Get the session for the origin of an url."""
+        key = SessionPool.__get_key(url)
+        now = timeit.default_timer()
+        with self.__lock:
+            if key in self.__sessions:
+                session, last_used = self.__sessions[key]
+                if not self.__keep_alive or now - last_used <= self.__keep_alive:
+                    self.__sessions[key] = (session, now)
+                    return session
+                # Not closed explicitly, as a long running probe might still use it.
+                # Its connections are closed once the last reference is gone.
+            session = create_session(self.__size)
+            self.__sessions[key] = (session, now)
+            return session
+
+    def close(self) -> None:
+        """Close all sessions and their connections."""
+        with self.__lock:
+            for session, _ in self.__sessions.values():
+                session.close()
+            self.__sessions = {}
+
+    # --------------------------------------------------------------------------
+    # Private Functions
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def __get_key(url: str) -> Tuple[str, str, int]:
+        """Get scheme, host and port of an url."""
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        port = parts.port or (443 if scheme == "https" else 80)
+        return (scheme, (parts.hostname or "").lower(), port)
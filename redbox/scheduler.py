@@ -0,0 +1,147 @@
+"""Probe targets in the background on their own interval."""
+
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+import concurrent.futures
+import functools
+import heapq
+import logging
+import random
+import threading
+import timeit
+
+from .types import DsResponse
+from .types import DsTarget
+from .request import Request
+from .request import prefetch
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Background scheduler which decouples probing from /metrics scrapes.
+
+    Every target is probed on its own interval (or the scheduler default) and the
+    result is handed to a sink (e.g. SnapshotStore.update). Probes are submitted to the
+    request handler, which skips a target while its previous probe is still running. The first
+    probe of each target is randomly delayed by up to ``jitter * interval``
+    seconds, so that probes are spread over the interval instead of all firing
+    at once. Hostnames of all targets are resolved into the DNS cache (if
+    enabled) once per scheduler interval, ahead of the probes.
+
+    Targets can be replaced while running. Unchanged targets keep their due
+    times, new and changed ones are spread over their interval like on start.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        sink: Callable[[DsResponse], None],
+        targets: List[DsTarget],
+        settings: Dict[str, Any],
+    ) -> None:
+        self.__request = request
+        self.__sink = sink
+        self.__targets = targets
+        self.__interval = float(settings["interval"])
+        self.__jitter = float(settings["jitter"])
+        self.__lock = threading.Lock()
+        self.__pending: Optional[List[DsTarget]] = None
+        self.__stop = threading.Event()
+        self.__wakeup = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="scheduler", daemon=True)
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def start(self) -> None:
+        """Start the scheduler thread."""
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Stop the scheduler thread."""
+        self.__stop.set()
+        self.__wakeup.set()
+        self.__thread.join()
+
+    def set_targets(self, targets: List[DsTarget]) -> None:
+        """Replace the scheduled targets."""
+        with self.__lock:
+            self.__pending = targets
+        self.__wakeup.set()
+
+    # --------------------------------------------------------------------------
+    # Private Functions
+    # --------------------------------------------------------------------------
+    def __get_interval(self, target: DsTarget) -> float:
+        """Get probe interval of a target (never shorter than its min_interval)."""
+        if target.interval > 0:
+            return float(max(target.interval, target.min_interval))
+        return max(self.__interval, float(target.min_interval))
+
+    def __schedule(
+        self, queue: List[Tuple[float, int, DsTarget]], targets: List[DsTarget]
+    ) -> List[Tuple[float, int, DsTarget]]:
+        """Build the queue of targets, keeping the due times of unchanged targets."""
+        now = timeit.default_timer()
+        dues = {target.fingerprint: due for due, _, target in queue}
+        scheduled = []
+        for index, target in enumerate(targets):
+            due = dues.get(target.fingerprint)
+            if due is None:
+                due = now + random.uniform(0, self.__get_interval(target) * self.__jitter)
+            scheduled.append((due, index, target))
+        heapq.heapify(scheduled)
+        return scheduled
+
+    def __sleep(self, timeout: Optional[float]) -> None:
+        """Wait until timeout, stop or replaced targets."""
+        self.__wakeup.wait(timeout)
+        self.__wakeup.clear()
+
+    def __run(self) -> None:
+        """Dispatch due targets until stopped."""
+        queue = self.__schedule([], self.__targets)
+        hosts = {target.hostname for target in self.__targets}
+        next_prefetch = timeit.default_timer()
+
+        while not self.__stop.is_set():
+            with self.__lock:
+                targets, self.__pending = self.__pending, None
+            if targets is not None:
+                queue = self.__schedule(queue, targets)
+                hosts = {target.hostname for target in targets}
+                next_prefetch = timeit.default_timer()
+            if not queue:
+                self.__sleep(None)
+                continue
+            if timeit.default_timer() >= next_prefetch:
+                prefetch(hosts, self.__interval)
+                next_prefetch = timeit.default_timer() + self.__interval
+            due, index, target = queue[0]
+            wait = due - timeit.default_timer()
+            if wait > 0:
+                self.__sleep(min(wait, max(0, next_prefetch - timeit.default_timer())))
+                continue
+            heapq.heappop(queue)
+
+            deadline = timeit.default_timer() + target.timeout
+            future = self.__request.submit(target, deadline)
+            if future is not None:
+                future.add_done_callback(functools.partial(self.__store, target))
+
+            # Keep the original cadence, but run right away if we fell behind
+            interval = self.__get_interval(target)
+            due = max(due + interval, timeit.default_timer())
+            heapq.heappush(queue, (due, index, target))
+
+    def __store(self, target: DsTarget, future: "concurrent.futures.Future[DsResponse]") -> None:
+        """Store the response of a finished probe (once the pool set its queue time)."""
+        try:
+            response = future.result()
+        except concurrent.futures.CancelledError:
+            return
+        except Exception as error:  # pylint: disable=broad-except
+            logger.error("Scheduler error for %s: %s", target.name, error)
+            response = self.__request.build_failed_response(target, str(error))
+        self.__sink(response)
@@ -0,0 +1,132 @@
+"""Thread-safe stores for the latest response of each target."""
+
+from typing import Dict, List, Optional, Tuple
+
+import threading
+import timeit
+
+from .types import DsResponse
+from .types import DsTarget
+from .histogram import LatencyHistograms
+from .instrumentation import ExporterStats
+
+
+class SnapshotStore:
+    """Keeps the latest response per target and serves ordered snapshots.
+
+    Every stored response is also observed into the latency histograms and the
+    exporter statistics, if given.
+    """
+
+    def __init__(
+        self,
+        targets: List[DsTarget],
+        histograms: Optional[LatencyHistograms] = None,
+        stats: Optional[ExporterStats] = None,
+    ) -> None:
+        self.__histograms = histograms
+        self.__stats = stats
+        self.__lock = threading.Lock()
+        self.__targets = {target.name: target for target in targets}
+        self.__order = [target.name for target in targets]
+        self.__responses: Dict[str, DsResponse] = {}
+        self.__snapshot: Optional[List[DsResponse]] = None
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def update(self, response: DsResponse) -> None:
+        """Replace the stored response of a target."""
+        if self.__histograms is not None:
+            self.__histograms.observe(response)
+        if self.__stats is not None:
+            self.__stats.observe_probe(response)
+        with self.__lock:
+            # Late responses of targets removed meanwhile are dropped
+            if response.name in self.__targets:
+                self.__responses[response.name] = response
+                self.__snapshot = None
+
+    def set_targets(self, targets: List[DsTarget]) -> None:
+        """Replace the stored targets, keeping the responses of unchanged targets only."""
+        with self.__lock:
+            previous = self.__targets
+            self.__targets = {target.name: target for target in targets}
+            self.__order = [target.name for target in targets]
+            self.__responses = {
+                name: response
+                for name, response in self.__responses.items()
+                if name in self.__targets
+                and self.__targets[name].fingerprint == previous[name].fingerprint
+            }
+            self.__snapshot = None
+
+    def snapshot(self) -> List[DsResponse]:
+        """Return the latest responses in target order.
+
+        Targets which have not been probed yet are left out.
+        The ordered list is only rebuilt after an update happened.
+        """
+        with self.__lock:
+            if self.__snapshot is None:
+                self.__snapshot = [
+                    self.__responses[name] for name in self.__order if name in self.__responses
+                ]
+            return self.__snapshot
+
+
+class ResultCache:
+    """Keeps the latest response of targets with a min_interval to reuse it on scrape.
+
+    Within min_interval seconds after a probe, scrapes get the cached response
+    instead of probing the target again. Failed probes without a HTTP response
+    (e.g. timeouts) are not cached, so that they are retried on the next scrape.
+    Responses of removed and changed targets are evicted.
+    """
+
+    def __init__(self, targets: List[DsTarget]) -> None:
+        self.__lock = threading.Lock()
+        self.__targets: Dict[str, DsTarget] = {}
+        self.__responses: Dict[str, Tuple[float, DsResponse]] = {}
+        self.set_targets(targets)
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def get(self, targets: List[DsTarget]) -> Tuple[List[DsResponse], List[DsTarget]]:
+        """Split targets into the cached responses still valid and the targets to probe."""
+        if not self.__targets:
+            return ([], targets)
+        now = timeit.default_timer()
+        cached = []
+        due = []
+        with self.__lock:
+            for target in targets:
+                entry = self.__responses.get(target.name)
+                if entry is not None and now - entry[0] < target.min_interval:
+                    cached.append(entry[1])
+                else:
+                    due.append(target)
+        return (cached, due)
+
+    def update(self, responses: List[DsResponse]) -> None:
+        """Cache the responses of targets with a min_interval."""
+        if not self.__targets:
+            return
+        now = timeit.default_timer()
+        with self.__lock:
+            for response in responses:
+                if response.name in self.__targets and response.status_code != 0:
+                    self.__responses[response.name] = (now, response)
+
+    def set_targets(self, targets: List[DsTarget]) -> None:
+        """Replace the cached targets, evicting responses of removed and changed targets."""
+        with self.__lock:
+            previous = self.__targets
+            self.__targets = {target.name: target for target in targets if target.min_interval > 0}
+            self.__responses = {
+                name: entry
+                for name, entry in self.__responses.items()
+                if name in self.__targets
+                and self.__targets[name].fingerprint == previous[name].fingerprint
+            }
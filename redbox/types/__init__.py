@@ -1,4 +1,5 @@
 """Module Imports."""
 
+from .ds_extract import DsExtract
 from .ds_target import DsTarget
 from .ds_response import DsResponse
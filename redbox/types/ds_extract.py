@@ -0,0 +1,51 @@
+"""Datatype definition."""
+
+from typing import Dict, List, Optional, Pattern, Tuple
+
+import re
+
+# Patterns referring to their own groups cannot be joined into one alternation
+BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+
+# A bucket is an optional combined alternation plus its single patterns
+Bucket = Tuple[Optional[Pattern[bytes]], Tuple[Pattern[bytes], ...]]
+
+
+class DsExtract:
+    """Datastructure for compiled extract regexes.
+
+    Regexes are compiled once and indexed by their bucket: exact status code
+    (e.g. '505'), status family (e.g. '5xx') and wildcard ('*'). Buckets with
+    more than one regex also get a combined alternation, which rules out the
+    whole bucket with a single scan if none of its regexes match.
+    """
+
+    def __init__(self, extract: Dict[str, List[str]]) -> None:
+        self.__buckets: Dict[str, Bucket] = {
+            str(key): DsExtract.__compile(regexes) for key, regexes in extract.items()
+        }
+        self.__plans: Dict[int, Tuple[Bucket, ...]] = {}
+
+    def get(self, status_code: int) -> Tuple[Bucket, ...]:
+        """Get the buckets to evaluate for a status code in order of precedence."""
+        plan = self.__plans.get(status_code)
+        if plan is None:
+            code = str(status_code)
+            keys = (code, code[0] + "xx", "*")
+            plan = tuple(self.__buckets[key] for key in keys if key in self.__buckets)
+            self.__plans[status_code] = plan
+        return plan
+
+    @staticmethod
+    def __compile(regexes: List[str]) -> Bucket:
+        """Compile the regexes of a bucket."""
+        patterns = tuple(re.compile(regex.encode(), re.IGNORECASE) for regex in regexes)
+        combined = None
+        if len(regexes) > 1 and not any(BACKREFERENCE.search(regex) for regex in regexes):
+            try:
+                combined = re.compile(
+                    "|".join(f"(?:{regex})" for regex in regexes).encode(), re.IGNORECASE
+                )
+            except re.error:
+                combined = None
+        return (combined, patterns)
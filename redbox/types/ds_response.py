@@ -1,9 +1,35 @@
 """Datatype definition."""
 
-from typing import Dict, List, Any
-
-
-class DsResponse:
+from typing import Dict, List, Tuple, Any
+
+import time
+
+# Fields of a packed response (headers are left out to keep it compact)
+PACKED_FIELDS = (
+    "name",
+    "groups",
+    "url",
+    "size",
+    "time_dns",
+    "time_connect",
+    "time_tls",
+    "time_ttfb",
+    "time_download",
+    "time_render",
+    "time_total",
+    "time_queue",
+    "joined",
+    "timestamp",
+    "connection_reused",
+    "status_code",
+    "status_family",
+    "success",
+    "err_msg",
+    "extract",
+)
+
+
+class DsResponse:  # pylint: disable=too-many-public-methods,too-many-instance-attributes
     """Datastructure for response."""
 
     @property
@@ -26,16 +52,26 @@ class DsResponse:
         """Response headers."""
         return self.__headers
 
-    @property
-    def body(self) -> bytes:
-        """Response body."""
-        return self.__body
-
     @property
     def size(self) -> int:
         """Response body size in bytes."""
         return self.__size
 
+    @property
+    def time_dns(self) -> float:
+        """Time taken to resolve the hostname (part of time_ttfb)."""
+        return self.__time_dns
+
+    @property
+    def time_connect(self) -> float:
+        """Time taken to establish the TCP connection (part of time_ttfb)."""
+        return self.__time_connect
+
+    @property
+    def time_tls(self) -> float:
+        """Time taken for the TLS handshake (part of time_ttfb)."""
+        return self.__time_tls
+
     @property
     def time_ttfb(self) -> float:
         """Time to first byte."""
@@ -56,6 +92,34 @@ class DsResponse:
         """Total time taken."""
         return self.__time_total
 
+    @property
+    def time_queue(self) -> float:
+        """Time the probe waited for a free slot or a host limit (not part of time_total)."""
+        return self.__time_queue
+
+    @time_queue.setter
+    def time_queue(self, value: float) -> None:
+        self.__time_queue = value
+
+    @property
+    def joined(self) -> bool:
+        """Returns True if this is the shared response of a probe another scrape started."""
+        return self.__joined
+
+    @joined.setter
+    def joined(self, value: bool) -> None:
+        self.__joined = value
+
+    @property
+    def timestamp(self) -> float:
+        """Unix time the response was created at (to tell the age of reused responses)."""
+        return self.__timestamp
+
+    @property
+    def connection_reused(self) -> bool:
+        """Returns True if a kept-alive connection was used for the request."""
+        return self.__connection_reused
+
     @property
     def status_code(self) -> int:
         """HTTP status code returned from server."""
@@ -89,17 +153,34 @@ class DsResponse:
         """Contains a list of regex extracted string from the body."""
         return self.__extract
 
+    def pack(self) -> Tuple[Any, ...]:
+        """Get a compact tuple of this response, e.g. to send it to another process."""
+        return tuple(getattr(self, field) for field in PACKED_FIELDS)
+
+    @staticmethod
+    def unpack(packed: Tuple[Any, ...]) -> "DsResponse":
+        """Create a response from a packed tuple."""
+        response = dict(zip(PACKED_FIELDS, packed))
+        response["headers"] = {}
+        return DsResponse(response)
+
     def __init__(self, response: Dict[str, Any]) -> None:
         self.__name = str(response["name"])
         self.__groups = dict(response["groups"])
         self.__url = str(response["url"])
         self.__headers = dict(response["headers"])
-        self.__body = bytes(response["body"])
         self.__size = int(response["size"])
+        self.__time_dns = float(response["time_dns"])
+        self.__time_connect = float(response["time_connect"])
+        self.__time_tls = float(response["time_tls"])
         self.__time_ttfb = float(response["time_ttfb"])
         self.__time_download = float(response["time_download"])
         self.__time_render = float(response["time_render"])
         self.__time_total = float(response["time_total"])
+        self.__time_queue = float(response.get("time_queue", 0))
+        self.__joined = bool(response.get("joined", False))
+        self.__timestamp = float(response.get("timestamp", time.time()))
+        self.__connection_reused = bool(response["connection_reused"])
         self.__status_code = int(response["status_code"])
         self.__status_family = str(response["status_family"])
         self.__success = bool(response["success"])
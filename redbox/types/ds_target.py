@@ -2,8 +2,13 @@
 
 from typing import Dict, List, Union, Any
 
+import json
+from urllib.parse import urlsplit
 
-class DsTarget:
+from .ds_extract import DsExtract
+
+
+class DsTarget:  # pylint: disable=too-many-instance-attributes
     """Datastructure for target."""
 
     @property
@@ -21,6 +26,11 @@ class DsTarget:
         """Url of the target."""
         return self.__url
 
+    @property
+    def hostname(self) -> str:
+        """Hostname of the url (empty if the url has none)."""
+        return self.__hostname
+
     @property
     def method(self) -> str:
         """Request method."""
@@ -41,6 +51,31 @@ class DsTarget:
         """Timeout to wait for the request to finish."""
         return self.__timeout
 
+    @property
+    def interval(self) -> Union[int, float]:
+        """Probe interval in scheduler mode (0 uses the scheduler default)."""
+        return self.__interval
+
+    @property
+    def min_interval(self) -> Union[int, float]:
+        """Reuse the latest response for this long instead of probing again (0 to always probe)."""
+        return self.__min_interval
+
+    @property
+    def reuse_connection(self) -> bool:
+        """Use a kept-alive connection from the pool (False measures a cold connection)."""
+        return self.__reuse_connection
+
+    @property
+    def max_body_bytes(self) -> int:
+        """Abort and fail the request if the body is larger (0 for no limit)."""
+        return self.__max_body_bytes
+
+    @property
+    def max_extract_bytes(self) -> int:
+        """Longest extract match, the body is searched in windows of twice this size (0: all)."""
+        return self.__max_extract_bytes
+
     @property
     def basic_auth(self) -> Dict[str, str]:
         """Basic auth data."""
@@ -61,15 +96,39 @@ class DsTarget:
         """Extract regexes."""
         return self.__extract
 
+    @property
+    def buckets(self) -> List[float]:
+        """Latency histogram buckets overriding the global ones (empty to use global)."""
+        return self.__buckets
+
+    @property
+    def fingerprint(self) -> str:
+        """Canonical form of the whole definition to detect changed targets on reload."""
+        return self.__fingerprint
+
+    @property
+    def extract_plan(self) -> DsExtract:
+        """Compiled extract regexes."""
+        return self.__extract_plan
+
     def __init__(self, target: Dict[str, Any]) -> None:
         self.__name = str(target["name"])
         self.__groups = dict(target["groups"])
         self.__url = str(target["url"])
+        self.__hostname = urlsplit(self.__url).hostname or ""
         self.__method = str(target["method"])
         self.__params = dict(target["params"])
         self.__headers = dict(target["headers"])
         self.__timeout = float(target["timeout"])
+        self.__interval = float(target["interval"])
+        self.__min_interval = float(target["min_interval"])
+        self.__reuse_connection = bool(target["reuse_connection"])
+        self.__max_body_bytes = int(target["max_body_bytes"])
+        self.__max_extract_bytes = int(target["max_extract_bytes"])
         self.__basic_auth = dict(target["basic_auth"])
         self.__digest_auth = dict(target["digest_auth"])
         self.__fail_if = dict(target["fail_if"])
         self.__extract = dict(target["extract"])
+        self.__extract_plan = DsExtract(self.__extract)
+        self.__buckets = [float(bucket) for bucket in target["buckets"]]
+        self.__fingerprint = json.dumps(target, sort_keys=True, default=str)
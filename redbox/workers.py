@@ -0,0 +1,380 @@
+"""Probe shards of the targets in worker processes."""
+
+from typing import Callable, Dict, List, Optional, Tuple, Union, Any
+
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import signal
+import threading
+import timeit
+import zlib
+
+from .config import DsConfig
+from .types import DsResponse
+from .types import DsTarget
+from .request import Request
+from .request import ProbePool
+from .engine import Engine
+from .scheduler import Scheduler
+from .log import setup_logging, stop_logging
+
+# Extra time to wait for worker results after the scrape timeout (inter-process latency)
+RESULT_GRACE = 1.0
+
+# Seconds to wait for a worker to exit on shutdown before it is terminated
+STOP_TIMEOUT = 5.0
+
+# Check this often whether the workers of a running round are still alive (seconds)
+SUPERVISE_INTERVAL = 0.5
+
+logger = logging.getLogger(__name__)
+
+# Workers (and their replacements) are forked by a single-threaded fork server, as
+# forking the exporter while its threads hold locks could deadlock them.
+_CONTEXT = multiprocessing.get_context("forkserver")
+
+# A worker process with its commands pipe, results pipe and the lock for sending commands
+Worker = Tuple[
+    Any,
+    multiprocessing.connection.Connection,
+    multiprocessing.connection.Connection,
+    threading.Lock,
+]
+
+
+# -------------------------------------------------------------------------------------------------
+# Public Methods
+# -------------------------------------------------------------------------------------------------
+def get_worker_index(name: str, count: int) -> int:
+    """Get the worker probing a target by a stable hash of its name.
+
+    This deliberately differs from the jump consistent hash assigning targets to
+    cluster replicas (see config._get_shard): a replica only holds targets with the
+    same jump hash, so splitting them by that hash again would put all of them on
+    the same worker whenever both counts are equal. The worker count only changes
+    on restart, so a plain modulo of an independent hash spreads them evenly.
+    """
+    return zlib.crc32(name.encode("utf-8")) % count
+
+
+# -------------------------------------------------------------------------------------------------
+# Worker process
+# -------------------------------------------------------------------------------------------------
+def _run_worker(
+    index: int,
+    count: int,
+    conf: DsConfig,
+    targets: List[DsTarget],
+    commands: multiprocessing.connection.Connection,
+    results: multiprocessing.connection.Connection,
+) -> None:
+    """Probe the shard of a worker on command or on schedule and send back packed results.
+
+    Every result is a tuple of worker index, round id (None for scheduled probes),
+    packed responses and the probe pool statistics of the worker. Workers see an
+    EOF on their commands pipe and exit once the parent is gone.
+    """
+    # Interrupts are handled by the parent, which stops its workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The thread draining the log queue of the parent does not exist in this process
+    setup_logging(conf.logging)
+    targets = [target for target in targets if get_worker_index(target.name, count) == index]
+    by_name = {target.name: target for target in targets}
+    engine = Engine(conf, targets)
+    request = engine.request
+
+    lock = threading.Lock()
+
+    def send(round_id: Optional[int], responses: List[DsResponse]) -> None:
+        packed = [response.pack() for response in responses]
+        try:
+            with lock:
+                results.send((index, round_id, packed, request.stats()))
+        except OSError:
+            # The parent is gone
+            pass
+
+    def probe(round_id: int, names: Optional[List[str]], timeout: float) -> None:
+        # Targets removed by a reload in the meantime are skipped
+        selected = targets if names is None else [by_name[n] for n in names if n in by_name]
+        send(round_id, request.request_many(selected, timeout))
+
+    scheduler = None
+    if conf.scheduler["enabled"]:
+        scheduler = Scheduler(
+            request, lambda response: send(None, [response]), targets, conf.scheduler
+        )
+        scheduler.start()
+
+    # Rounds run in their own threads, so that overlapping scrapes do not queue up
+    while True:
+        try:
+            command = commands.recv()
+        except (EOFError, OSError):
+            break
+        if command[0] == "stop":
+            break
+        if command[0] == "targets":
+            targets = command[1]
+            by_name = {target.name: target for target in targets}
+            engine.set_targets(targets)
+            if scheduler is not None:
+                scheduler.set_targets(targets)
+            continue
+        _, round_id, names, timeout = command
+        threading.Thread(target=probe, args=(round_id, names, timeout), daemon=True).start()
+
+    if scheduler is not None:
+        scheduler.stop()
+    engine.close()
+    stop_logging()
+
+
+# -------------------------------------------------------------------------------------------------
+# Parent process
+# -------------------------------------------------------------------------------------------------
+class RequestSharded(Request):
+    """Request handler which distributes targets over worker processes.
+
+    Targets are assigned to workers by a stable hash of their name. Every worker
+    builds its own probe engine, so probing, extraction and TLS of one shard never
+    contend for the GIL of another one. On request, each involved worker probes
+    its part of the targets and sends back packed responses. If the scheduler is
+    enabled, every worker schedules its own shard and streams each result to the
+    given sink as soon as it is available. Workers which died (e.g. killed for
+    running out of memory) are replaced with a new one for the same shard.
+    """
+
+    def __init__(
+        self,
+        conf: DsConfig,
+        processes: int,
+        sink: Optional[Callable[[DsResponse], None]] = None,
+    ) -> None:
+        # Probes run in the workers, the local pool is never used
+        super().__init__(ProbePool(1))
+        self.__conf = conf
+        self.__targets = conf.targets
+        self.__count = processes
+        self.__sink = sink
+        self.__shard_sizes = [0] * processes
+        for target in conf.targets:
+            self.__shard_sizes[get_worker_index(target.name, processes)] += 1
+
+        self.__lock = threading.Lock()
+        self.__round_ids = itertools.count()
+        self.__rounds: Dict[int, Tuple[threading.Event, List[DsResponse], List[int]]] = {}
+        self.__stats: Dict[int, Dict[str, int]] = {}
+
+        _CONTEXT.set_forkserver_preload(["redbox"])
+        # Every worker sends its results over its own pipe, as a worker killed while
+        # writing to a shared queue would keep its lock forever.
+        self.__workers: List[Worker] = []
+        self.__wakeup, self.__wakeup_send = _CONTEXT.Pipe(duplex=False)
+        self.__supervise_lock = threading.Lock()
+        self.__closed = False
+        for index in range(processes):
+            self.__workers.append(self.__start(index))
+
+        self.__reader = threading.Thread(target=self.__read, name="results", daemon=True)
+        self.__reader.start()
+
+    # --------------------------------------------------------------------------
+    # Public Functions
+    # --------------------------------------------------------------------------
+    def request(self, target: DsTarget, deadline: Optional[float] = None) -> DsResponse:
+        """Probe a single target in the worker owning it."""
+        return self.request_many([target], self.get_timeout(target, deadline))[0]
+
+    def request_many(self, targets: List[DsTarget], timeout: Union[int, float]) -> List[DsResponse]:
+        """Probe targets in their workers and merge the responses."""
+        start = timeit.default_timer()
+        shards: Dict[int, List[str]] = {}
+        for target in targets:
+            shards.setdefault(get_worker_index(target.name, self.__count), []).append(target.name)
+        if not shards:
+            return []
+
+        self.__supervise()
+        round_id = next(self.__round_ids)
+        event = threading.Event()
+        responses: List[DsResponse] = []
+        with self.__lock:
+            self.__rounds[round_id] = (event, responses, [len(shards)])
+        for index, names in shards.items():
+            # Whole shards are requested without sending all their names
+            selected = None if len(names) == self.__shard_sizes[index] else names
+            self.__send(index, ("probe", round_id, selected, timeout))
+
+        # Results of a worker which died meanwhile never arrive, so stop waiting for them
+        deadline = start + timeout + RESULT_GRACE
+        while not event.wait(min(SUPERVISE_INTERVAL, max(0, deadline - timeit.default_timer()))):
+            if timeit.default_timer() >= deadline or set(self.__supervise()) & set(shards):
+                break
+        with self.__lock:
+            del self.__rounds[round_id]
+            responses = list(responses)
+        if not event.is_set():
+            elapsed = timeit.default_timer() - start
+            logger.warning("Workers timed out after: %.6f sec", elapsed)
+            responses = self.fill_timed_out(targets, responses, elapsed)
+        return responses
+
+    def stats(self) -> Dict[str, int]:
+        """Return the probe pool statistics summed up over all workers."""
+        totals = {
+            "size": 0,
+            "inflight": 0,
+            "queued": 0,
+            "orphaned": 0,
+            "rejected": 0,
+            "cancelled": 0,
+            "aborted": 0,
+            "throttled": 0,
+            "joined": 0,
+        }
+        with self.__lock:
+            for stats in self.__stats.values():
+                for key in totals:
+                    totals[key] += stats[key]
+        return totals
+
+    def set_targets(self, targets: List[DsTarget]) -> None:
+        """Send every worker the targets of its shard."""
+        self.__targets = targets
+        self.__supervise()
+        shards: List[List[DsTarget]] = [[] for _ in range(self.__count)]
+        for target in targets:
+            shards[get_worker_index(target.name, self.__count)].append(target)
+        for index, shard in enumerate(shards):
+            self.__send(index, ("targets", shard))
+        self.__shard_sizes = [len(shard) for shard in shards]
+
+    def close(self) -> None:
+        """Stop all workers."""
+        with self.__supervise_lock:
+            self.__closed = True
+        for index in range(self.__count):
+            self.__send(index, ("stop",))
+        for process, conn, _, _ in self.__workers:
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self.__wakeup_send.send(None)
+        self.__reader.join()
+        self.__wakeup.close()
+        self.__wakeup_send.close()
+
+    # --------------------------------------------------------------------------
+    # Private Functions
+    # --------------------------------------------------------------------------
+    def __start(self, index: int) -> "Worker":
+        """Start a worker probing its shard of the current targets."""
+        child_commands, commands = _CONTEXT.Pipe(duplex=False)
+        results, child_results = _CONTEXT.Pipe(duplex=False)
+        process = _CONTEXT.Process(
+            target=_run_worker,
+            args=(
+                index,
+                self.__count,
+                self.__conf,
+                self.__targets,
+                child_commands,
+                child_results,
+            ),
+            name=f"worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        child_commands.close()
+        child_results.close()
+        return (process, commands, results, threading.Lock())
+
+    def __supervise(self) -> List[int]:
+        """Replace workers which died with new ones and return their indexes."""
+        restarted: List[int] = []
+        with self.__supervise_lock:
+            if self.__closed:
+                return restarted
+            for index, (process, conn, _, _) in enumerate(self.__workers):
+                if process.is_alive():
+                    continue
+                logger.error(
+                    "Worker %d (pid %s) died with exit code %s, restarting it",
+                    index,
+                    process.pid,
+                    process.exitcode,
+                )
+                conn.close()
+                process.join()
+                with self.__lock:
+                    self.__stats.pop(index, None)
+                self.__workers[index] = self.__start(index)
+                restarted.append(index)
+            if restarted:
+                # Let the reader wait for the results of the new workers
+                self.__wakeup_send.send(restarted)
+        return restarted
+
+    def __send(self, index: int, command: Tuple[Any, ...]) -> None:
+        """Send a command to a worker."""
+        _, conn, _, lock = self.__workers[index]
+        try:
+            with lock:
+                conn.send(command)
+        except (BrokenPipeError, OSError) as error:
+            logger.error("Worker %d not reachable: %s", index, error)
+
+    def __read(self) -> None:
+        """Dispatch worker results to their rounds or to the sink."""
+        pipes = self.__get_result_pipes({})
+        while True:
+            ready = multiprocessing.connection.wait([self.__wakeup] + list(pipes))
+            for conn in [pipe for pipe in pipes if pipe in ready]:
+                try:
+                    result = conn.recv()
+                except (EOFError, OSError):
+                    # The worker died, its replacement gets a new pipe
+                    del pipes[conn]
+                    conn.close()
+                    continue
+                self.__dispatch(result)
+            if self.__wakeup in ready:
+                if self.__wakeup.recv() is None:
+                    for conn in pipes:
+                        conn.close()
+                    return
+                pipes = self.__get_result_pipes(pipes)
+
+    def __get_result_pipes(self, pipes: Dict[Any, int]) -> Dict[Any, int]:
+        """Get the result pipes of the current workers and close the ones of replaced workers."""
+        with self.__supervise_lock:
+            current = {
+                results: index
+                for index, (_, _, results, _) in enumerate(self.__workers)
+                if not results.closed
+            }
+        for conn in pipes:
+            if conn not in current:
+                conn.close()
+        return current
+
+    def __dispatch(self, result: Tuple[int, Optional[int], List[Any], Dict[str, int]]) -> None:
+        """Hand a worker result to its round or to the sink."""
+        index, round_id, packed, stats = result
+        responses = [DsResponse.unpack(values) for values in packed]
+        with self.__lock:
+            self.__stats[index] = stats
+            pending = self.__rounds.get(round_id) if round_id is not None else None
+            if pending is not None:
+                event, collected, remaining = pending
+                collected.extend(responses)
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    event.set()
+        if round_id is None and self.__sink is not None:
+            for response in responses:
+                self.__sink(response)
@@ -29,6 +29,10 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require={
+        # Probe engine 'async'
+        'async': ['aiohttp'],
+    },
     description="Prometheus exporter that throws stuff to httpd endpoints and evaluates their response.",
     license="MIT",
     long_description=long_description,
@@ -0,0 +1,153 @@
+"""Shared fixtures: a local stand-in HTTP server, configuration loading and the exporter."""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import argparse
+import gzip
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+import pytest
+import yaml
+
+from redbox.config import DsConfig, get_config
+
+# The exporter as started by users
+BIN = os.path.join(os.path.dirname(__file__), os.pardir, "bin", "redbox")
+
+# Seconds to wait for a started exporter to accept connections
+STARTUP_TIMEOUT = 10
+
+BODY = b"<html><body><h1>redbox test</h1>" + b"x" * 4096 + b"</body></html>"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers by path, each path exercising another part of the HTTP client."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Serve a GET request (the path may be an absolute url when used as proxy)."""
+        path = urlsplit(self.path).path
+        if path.startswith("/status/"):
+            self.__send(int(path.rsplit("/", 1)[1]), BODY)
+        elif path == "/chunked":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(BODY), 1000):
+                chunk = BODY[start : start + 1000]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        elif path == "/gzip":
+            self.__send(200, gzip.compress(BODY), {"Content-Encoding": "gzip"})
+        elif path == "/deflate":
+            self.__send(200, zlib.compress(BODY), {"Content-Encoding": "deflate"})
+        elif path.startswith("/redirect/"):
+            hops = int(path.rsplit("/", 1)[1])
+            location = "/status/200" if hops <= 1 else f"/redirect/{hops - 1}"
+            self.__send(302, b"", {"Location": location})
+        elif path.startswith("/slow-redirect/"):
+            hops = int(path.rsplit("/", 1)[1])
+            location = "/status/200" if hops <= 1 else f"/slow-redirect/{hops - 1}"
+            time.sleep(0.4)
+            self.__send(302, b"", {"Location": location})
+        elif path == "/slow":
+            time.sleep(2)
+            self.__send(200, BODY)
+        elif path == "/drip":
+            # Headers right away, then the body over two seconds
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for _ in range(20):
+                self.wfile.write(b"1\r\nx\r\n")
+                self.wfile.flush()
+                time.sleep(0.1)
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.__send(404, b"not found")
+
+    def log_message(self, *args: Any) -> None:  # pylint: disable=arguments-differ
+        """Keep test output quiet."""
+
+    def __send(self, code: int, body: bytes, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="session")
+def server() -> Iterator[str]:
+    """Run the stand-in server and return its base url."""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def load_config(tmp_path: Any) -> Callable[[Dict[str, Any]], DsConfig]:
+    """Return a function which writes a configuration file and loads it."""
+
+    def load(conf: Dict[str, Any]) -> DsConfig:
+        path = tmp_path / "config.yml"
+        path.write_text(yaml.safe_dump(conf))
+        args = argparse.Namespace(
+            conf=str(path),
+            listen=None,
+            port=None,
+            shard_index=None,
+            shard_count=None,
+            log_level=None,
+        )
+        return get_config(args)
+
+    return load
+
+
+@pytest.fixture
+def run_exporter(tmp_path: Any) -> Iterator[Callable[[Dict[str, Any]], str]]:
+    """Return a function which starts the exporter with a configuration and returns its url."""
+    processes: List[subprocess.Popen] = []  # type: ignore[type-arg]
+
+    def run(conf: Dict[str, Any]) -> str:
+        path = tmp_path / "exporter.yml"
+        path.write_text(yaml.safe_dump(conf))
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        command = [sys.executable, BIN, "--conf", str(path), "--listen", "127.0.0.1"]
+        processes.append(subprocess.Popen(command + ["--port", str(port)]))
+        url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                with urlopen(url + "/", timeout=1):
+                    return url
+            except (URLError, OSError):
+                if time.monotonic() > deadline or processes[-1].poll() is not None:
+                    raise
+                time.sleep(0.1)
+
+    yield run
+    for process in processes:
+        process.terminate()
+        process.wait()
@@ -0,0 +1,41 @@
+"""Extraction of regexes over streamed bodies."""
+
+from typing import Dict, List
+
+import re
+
+import pytest
+
+from redbox.request.body import Extractor
+from redbox.types import DsExtract
+
+
+def _extract(extract: Dict[str, List[str]], body: bytes, chunk: int, max_length: int) -> List[str]:
+    """Stream a body into an extractor in chunks of the given size."""
+    extractor = Extractor(DsExtract(extract).get(200), max_length)
+    for start in range(0, len(body), chunk):
+        extractor.feed(body[start : start + chunk])
+    return extractor.finish()
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 64, 4096])
+@pytest.mark.parametrize("max_length", [0, 16, 100])
+def test_matches_like_findall(chunk: int, max_length: int) -> None:
+    """Every chunking finds the same matches as re.findall over the whole body."""
+    body = b"".join(b"<id>%d</id>%s" % (index, b"x" * (index % 13)) for index in range(300))
+    expected = [item.decode() for item in re.findall(rb"<id>(\d+)</id>", body)]
+    assert _extract({"*": [r"<id>(\d+)</id>"]}, body, chunk, max_length) == expected
+
+
+def test_match_after_max_length() -> None:
+    """Matches far beyond max_length bytes into the body are found."""
+    body = b"x" * 5_000_000 + b"<h1>found</h1>" + b"x" * 1000
+    assert _extract({"*": ["<h1>(.+?)</h1>"]}, body, 65536, 1024) == ["found"]
+
+
+def test_first_regex_wins() -> None:
+    """The first regex with any match wins, even if a later one matched earlier in the body."""
+    body = b"<b>early</b>" + b"x" * 10_000 + b"<h1>late</h1>"
+    extract = {"200": ["<h1>(.+?)</h1>"], "*": ["<b>(.+?)</b>"]}
+    assert _extract(extract, body, 100, 64) == ["late"]
+    assert _extract({"*": ["<i>(.+?)</i>", "<b>(.+?)</b>"]}, body, 100, 64) == ["early"]
@@ -0,0 +1,130 @@
+"""Compression of metrics responses."""
+
+from typing import Any, Callable, Dict, List, Optional
+
+import gzip
+from urllib.request import Request, urlopen
+
+import pytest
+
+from redbox.compression import Compressor, ResponseCache, zstandard
+
+SETTINGS = {"enabled": True, "gzip_level": 6, "zstd_level": 3}
+
+requires_zstd = pytest.mark.skipif(zstandard is None, reason="requires zstandard")
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        (None, None),
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("deflate, gzip;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("br, *;q=0.1", "gzip" if zstandard is None else "zstd"),
+    ],
+)
+def test_negotiate_gzip(accept_encoding: Optional[str], expected: Optional[str]) -> None:
+    """Gzip is used if accepted, nothing is compressed without Accept-Encoding."""
+    assert Compressor(SETTINGS).negotiate(accept_encoding) == expected
+
+
+@requires_zstd
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        ("gzip, zstd", "zstd"),
+        ("zstd;q=0.5, gzip", "gzip"),
+        ("zstd", "zstd"),
+    ],
+)
+def test_negotiate_zstd(accept_encoding: str, expected: str) -> None:
+    """Zstd is preferred over gzip at the same quality."""
+    assert Compressor(SETTINGS).negotiate(accept_encoding) == expected
+
+
+def test_negotiate_disabled() -> None:
+    """Disabled compression sends every response as is."""
+    assert Compressor(dict(SETTINGS, enabled=False)).negotiate("gzip") is None
+
+
+def test_gzip_is_reproducible() -> None:
+    """Gzip output only depends on the body, so it is the same for every scrape."""
+    compressor = Compressor(SETTINGS)
+    body = b"redbox_up 1\n" * 100
+    compressed = compressor.compress(body, "gzip")
+    assert gzip.decompress(compressed) == body
+    assert compressor.compress(body, "gzip") == compressed
+    assert compressor.compress(body, None) is body
+
+
+@requires_zstd
+def test_zstd_roundtrip() -> None:
+    """Zstd output decompresses to the body."""
+    body = b"redbox_up 1\n" * 100
+    compressed = Compressor(SETTINGS).compress(body, "zstd")
+    assert zstandard.ZstdDecompressor().decompress(compressed) == body
+
+
+def test_cached_response() -> None:
+    """A snapshot is rendered once per content type and compressed once per encoding."""
+    rendered: List[bytes] = []
+
+    def render() -> bytes:
+        rendered.append(b"redbox_up 1\n" * 100)
+        return rendered[-1]
+
+    cache = ResponseCache(Compressor(SETTINGS), 60)
+    snapshot: List[Any] = []
+    compressed = cache.get(snapshot, "text/plain", "gzip", render)
+    assert cache.get(snapshot, "text/plain", "gzip", render) is compressed
+    assert cache.get(snapshot, "text/plain", None, render) is rendered[0]
+    assert len(rendered) == 1
+    assert gzip.decompress(compressed) == rendered[0]
+
+    cache.get(snapshot, "application/openmetrics-text", None, render)
+    assert len(rendered) == 2
+    # A new snapshot is rendered again
+    cache.get([], "text/plain", "gzip", render)
+    assert len(rendered) == 3
+
+
+def test_cached_response_expires() -> None:
+    """Bodies of an unchanged snapshot are rendered again once max_age passed."""
+    rendered: List[bytes] = []
+
+    def render() -> bytes:
+        rendered.append(b"redbox_up 1\n")
+        return rendered[-1]
+
+    cache = ResponseCache(Compressor(SETTINGS), 0)
+    snapshot: List[Any] = []
+    for _ in range(2):
+        cache.get(snapshot, "text/plain", None, render)
+    assert len(rendered) == 2
+
+
+@pytest.mark.parametrize("scheduler", [False, True])
+def test_scrape_encoding(
+    server: str, run_exporter: Callable[[Dict[str, Any]], str], scheduler: bool
+) -> None:
+    """Scrapes get gzip if they accept it and the plain metrics without Accept-Encoding."""
+    url = run_exporter(
+        {
+            "scheduler": {"enabled": scheduler, "interval": 1},
+            "targets": [{"name": "ok", "url": server + "/status/200"}],
+        }
+    )
+    with urlopen(Request(url + "/metrics"), timeout=10) as response:
+        assert response.headers["Content-Encoding"] is None
+        assert b"redbox_" in response.read()
+
+    request = Request(url + "/metrics", headers={"Accept-Encoding": "gzip"})
+    with urlopen(request, timeout=10) as response:
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        body = response.read()
+        assert int(response.headers["Content-Length"]) == len(body)
+        assert b"redbox_" in gzip.decompress(body)
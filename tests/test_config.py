@@ -0,0 +1,61 @@
+"""Validation of the configuration."""
+
+from typing import Any, Callable, Dict
+
+import pytest
+
+from redbox.config import DsConfig
+
+TARGET = {"name": "target", "url": "http://127.0.0.1/"}
+
+
+@pytest.mark.parametrize("interval", [0, -1, -0.5])
+def test_scheduler_interval_must_be_positive(
+    load_config: Callable[[Dict[str, Any]], DsConfig], interval: float
+) -> None:
+    """A scheduler interval of 0 or less is rejected."""
+    with pytest.raises(OSError, match=r"conf\[scheduler\]\[interval\]"):
+        load_config({"scheduler": {"enabled": True, "interval": interval}, "targets": [TARGET]})
+
+
+@pytest.mark.parametrize("key", ["interval", "min_interval"])
+def test_target_interval_must_not_be_negative(
+    load_config: Callable[[Dict[str, Any]], DsConfig], key: str
+) -> None:
+    """A negative target interval is rejected, 0 uses the default."""
+    with pytest.raises(OSError, match=rf"conf\[targets\]\[0\]\[{key}\]"):
+        load_config({"targets": [dict(TARGET, **{key: -1})]})
+    conf = load_config({"targets": [dict(TARGET, **{key: 0})]})
+    assert conf.targets[0].name == "target"
+
+
+def test_target_file_interval_must_not_be_negative(
+    load_config: Callable[[Dict[str, Any]], DsConfig], tmp_path: Any
+) -> None:
+    """Targets of target files are checked the same way."""
+    (tmp_path / "targets.yml").write_text(
+        "- name: file\n  url: http://127.0.0.1/\n  interval: -5\n"
+    )
+    with pytest.raises(OSError, match=r"\[targets\]\[0\]\[interval\]"):
+        load_config({"target_files": ["targets.yml"]})
+
+
+@pytest.mark.parametrize(
+    "section,key",
+    [
+        ("dns_cache", "ttl"),
+        ("dns_cache", "negative_ttl"),
+        ("dns_cache", "prefetch_timeout"),
+        ("connection_pool", "keep_alive"),
+        ("exposition", "info_interval"),
+        ("reload", "watch_interval"),
+    ],
+)
+def test_durations_must_not_be_negative(
+    load_config: Callable[[Dict[str, Any]], DsConfig], section: str, key: str
+) -> None:
+    """Negative durations are rejected, 0 is allowed."""
+    with pytest.raises(OSError, match=rf"conf\[{section}\]\[{key}\] = '-1' must not be negative"):
+        load_config({section: {key: -1}, "targets": [TARGET]})
+    conf = load_config({section: {key: 0}, "targets": [TARGET]})
+    assert conf.targets[0].name == "target"
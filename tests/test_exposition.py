@@ -0,0 +1,149 @@
+"""Exposition formats and modes of the metrics."""
+
+from typing import Any, Callable, Dict, Set, Tuple
+
+import re
+from urllib.request import Request, urlopen
+
+import pytest
+
+from redbox.prometheus import CONTENT_TYPE_OPENMETRICS, InfoLimiter, get_prom_format
+from redbox.types import DsResponse
+
+ACCEPT_OPENMETRICS = "application/openmetrics-text;version=1.0.0,text/plain;version=0.0.4;q=0.5"
+
+
+@pytest.fixture(name="exporter")
+def fixture_exporter(server: str, run_exporter: Callable[[Dict[str, Any]], str]) -> str:
+    """Exporter probing one target of the stand-in server."""
+    return run_exporter({"targets": [{"name": "ok", "url": server + "/status/200"}]})
+
+
+def _scrape(url: str, accept: str) -> Tuple[str, str]:
+    """Scrape /metrics and return the content type and the body."""
+    with urlopen(Request(url + "/metrics", headers={"Accept": accept}), timeout=10) as response:
+        return response.headers["Content-Type"], response.read().decode("utf-8")
+
+
+def _get_types(body: str) -> Dict[str, str]:
+    """Get the type of every metric family."""
+    return dict(re.findall(r"^# TYPE (\S+) (\S+)$", body, re.MULTILINE))
+
+
+def _get_sample_names(body: str) -> Set[str]:
+    """Get the names of all samples."""
+    return set(re.findall(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)[{ ]", body, re.MULTILINE))
+
+
+def test_openmetrics_negotiated(exporter: str) -> None:
+    """Scrapers preferring OpenMetrics get it, terminated by # EOF."""
+    content_type, body = _scrape(exporter, ACCEPT_OPENMETRICS)
+    assert content_type == CONTENT_TYPE_OPENMETRICS
+    assert body.endswith("\n# EOF\n")
+    assert body.count("# EOF") == 1
+
+
+def test_text_by_default(exporter: str) -> None:
+    """Scrapers without OpenMetrics in their Accept header get the classic text format."""
+    for accept in ("text/plain;version=0.0.4", "*/*"):
+        content_type, body = _scrape(exporter, accept)
+        assert content_type.startswith("text/plain")
+        assert "# EOF" not in body
+
+
+def test_openmetrics_family_names(exporter: str) -> None:
+    """Counter and info families drop the _total and _info suffix of their samples."""
+    _, body = _scrape(exporter, ACCEPT_OPENMETRICS)
+    types = _get_types(body)
+    counters = [family for family, kind in types.items() if kind == "counter"]
+    infos = [family for family, kind in types.items() if kind == "info"]
+    samples = _get_sample_names(body)
+    assert counters and infos
+    for family in counters:
+        assert not family.endswith("_total")
+        assert family + "_total" in samples and family not in samples
+    for family in infos:
+        assert not family.endswith("_info")
+        assert family + "_info" in samples and family not in samples
+
+    # The classic format names families like their samples
+    _, classic = _scrape(exporter, "text/plain")
+    classic_types = _get_types(classic)
+    for family in counters:
+        assert classic_types[family + "_total"] == "counter"
+    for family in infos:
+        assert classic_types[family + "_info"] == "gauge"
+
+
+def _get_response(**values: Any) -> DsResponse:
+    """Get a response of target ok with the given fields changed."""
+    response = {
+        "name": "ok",
+        "groups": {"team": "a"},
+        "url": "http://ok.invalid/",
+        "headers": {},
+        "size": 100,
+        "time_dns": 0.001,
+        "time_connect": 0.002,
+        "time_tls": 0.0,
+        "time_ttfb": 0.01,
+        "time_download": 0.002,
+        "time_render": 0.0,
+        "time_total": 0.015,
+        "connection_reused": False,
+        "status_code": 200,
+        "status_family": "2xx",
+        "success": True,
+        "err_msg": "",
+        "extract": [],
+    }
+    response.update(values)
+    return DsResponse(response)
+
+
+def _get_series(metrics: str) -> Set[str]:
+    """Get the series (sample name and labels) without their values."""
+    return {line.rsplit(" ", 1)[0] for line in metrics.splitlines() if not line.startswith("#")}
+
+
+def test_low_cardinality_labels() -> None:
+    """Only identity labels and status_family are labels, values are samples."""
+    metrics = get_prom_format([_get_response(extract=["v1"])], InfoLimiter(60))
+    identity = 'name="ok",group_team="a",url="http://ok.invalid/"'
+    for line in metrics.splitlines():
+        if line.startswith("#"):
+            continue
+        if line.startswith("redbox_result_info"):
+            assert line == f'redbox_result_info{{{identity},err_msg="",extract="v1"}} 1'
+        else:
+            assert f'{{{identity},status_family="2xx"}} ' in line
+    assert f'redbox_status_code{{{identity},status_family="2xx"}} 200' in metrics
+
+
+def test_low_cardinality_series_are_stable() -> None:
+    """Changing times, sizes and errors keep the series, unlike in full mode."""
+    first = _get_response()
+    second = _get_response(size=200, time_total=1.5, success=False, err_msg="Timeout")
+    limiter = InfoLimiter(60)
+    low = [_get_series(get_prom_format([response], limiter)) for response in (first, second)]
+    assert low[0] == low[1]
+    full = [_get_series(get_prom_format([response])) for response in (first, second)]
+    assert not full[0] & full[1]
+    # Every probe creates a new series in each of these families in full mode
+    assert len({line.partition("{")[0] for line in full[0]}) == 14
+
+
+def test_info_limiter() -> None:
+    """Changed info labels are exposed once the previous ones were shown for the interval."""
+    first = _get_response(err_msg="a")
+    second = _get_response(err_msg="b")
+    limiter = InfoLimiter(60)
+    assert limiter.get(first) == ("a", [])
+    assert limiter.get(second) == ("a", [])
+    # Removed targets are forgotten, so they start over if added again
+    limiter.set_targets([])
+    assert limiter.get(second) == ("b", [])
+
+    unlimited = InfoLimiter(0)
+    assert unlimited.get(first) == ("a", [])
+    assert unlimited.get(second) == ("b", [])
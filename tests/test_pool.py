@@ -0,0 +1,145 @@
+"""Cancelling and aborting probes of the probe pool."""
+
+from typing import Any, Callable, Dict, Iterator
+
+import threading
+import time
+import timeit
+
+import pytest
+
+from redbox.config import DsConfig
+from redbox.request import ProbePool, RequestSimple, SessionPool
+from redbox.request.body import ABORTED
+from redbox.request.transport import create_session, get_connection_reused
+from redbox.types import DsResponse, DsTarget
+
+
+@pytest.fixture(name="conf")
+def fixture_conf(server: str, load_config: Callable[[Dict[str, Any]], DsConfig]) -> DsConfig:
+    """Targets which are still running when their scrape times out."""
+    return load_config(
+        {
+            "targets": [
+                {"name": "slow", "url": server + "/slow", "timeout": 10},
+                {"name": "drip", "url": server + "/drip", "timeout": 10},
+            ]
+        }
+    )
+
+
+@pytest.fixture(name="request_simple")
+def fixture_request_simple(conf: DsConfig) -> Iterator[RequestSimple]:
+    """Simple engine with pooled sessions."""
+    sessions = SessionPool(conf.connection_pool)
+    pool = ProbePool(4)
+    yield RequestSimple(pool, sessions)
+    pool.shutdown()
+    sessions.close()
+
+
+def _wait_idle(pool: ProbePool, timeout: float) -> bool:
+    """Wait until no probe of the pool is in flight anymore."""
+    end = timeit.default_timer() + timeout
+    while timeit.default_timer() < end:
+        if pool.stats()["inflight"] == 0:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.parametrize("name", ["slow", "drip"])
+def test_cancel_aborts_running_probe(
+    conf: DsConfig, request_simple: RequestSimple, name: str
+) -> None:
+    """A running probe stops right away once cancelled, waiting for headers or the body."""
+    target = next(target for target in conf.targets if target.name == name)
+    pool = request_simple.pool
+    future = pool.submit(target, request_simple.request, timeit.default_timer() + 10)
+    assert future is not None
+    time.sleep(0.3)
+    assert future.running()
+
+    start = timeit.default_timer()
+    pool.cancel([future])
+    response = future.result(timeout=1)
+    assert timeit.default_timer() - start < 1
+    assert not response.success
+    assert response.err_msg.startswith(ABORTED)
+    assert pool.stats()["aborted"] == 1
+    assert pool.stats()["cancelled"] == 0
+
+
+def test_scrape_timeout_aborts_running_probes(
+    conf: DsConfig, request_simple: RequestSimple
+) -> None:
+    """Probes still running when a scrape times out do not outlive it."""
+    responses = request_simple.request_many(conf.targets, 0.5)
+    assert [response.success for response in responses] == [False, False]
+    # Probes share the deadline of the scrape, so each is either aborted or timed out
+    assert _wait_idle(request_simple.pool, 1)
+    assert request_simple.pool.stats()["aborted"] <= 2
+
+
+def test_cancel_aborts_running_probes(conf: DsConfig, request_simple: RequestSimple) -> None:
+    """Cancelling running probes aborts them long before their own deadline."""
+    pool = request_simple.pool
+    deadline = timeit.default_timer() + 10
+    futures = [pool.submit(target, request_simple.request, deadline) for target in conf.targets]
+    assert all(future is not None for future in futures)
+    time.sleep(0.5)
+    pool.cancel([future for future in futures if future is not None])
+    assert _wait_idle(pool, 1)
+    assert pool.stats()["aborted"] == 2
+    for future in futures:
+        assert future is not None
+        assert future.result().err_msg.startswith(ABORTED)
+
+
+def test_finished_probe_is_not_aborted(conf: DsConfig, request_simple: RequestSimple) -> None:
+    """Aborting a finished probe has no effect."""
+    target = next(target for target in conf.targets if target.name == "drip")
+    pool = request_simple.pool
+    done = threading.Event()
+    future = pool.submit(target, request_simple.request, timeit.default_timer() + 10)
+    assert future is not None
+    future.add_done_callback(lambda _: done.set())
+    assert done.wait(5)
+    pool.cancel([future])
+    assert future.result().success
+    assert pool.stats()["aborted"] == 0
+
+
+def test_abort_spares_connection_put_back(
+    server: str, conf: DsConfig, request_simple: RequestSimple
+) -> None:
+    """Aborting a probe does not shut down a kept-alive connection it has put back."""
+    slow, drip = conf.targets
+    pool = request_simple.pool
+    session = create_session(1)
+    put_back = threading.Event()
+    resume = threading.Event()
+    reused = []
+
+    def first(target: DsTarget, _: float) -> DsResponse:
+        session.get(server + "/status/200", timeout=5)
+        put_back.set()
+        resume.wait(5)
+        return request_simple.build_failed_response(target, "")
+
+    def second(target: DsTarget, _: float) -> DsResponse:
+        response = session.get(server + "/slow", timeout=5)
+        reused.append(get_connection_reused())
+        return request_simple.build_failed_response(target, str(response.status_code))
+
+    deadline = timeit.default_timer() + 10
+    future = pool.submit(slow, first, deadline)
+    assert future is not None and put_back.wait(5)
+    other = pool.submit(drip, second, deadline)
+    assert other is not None
+    time.sleep(0.3)
+    pool.cancel([future])
+    resume.set()
+    assert other.result(timeout=5).err_msg == "200"
+    assert reused == [True]
+    session.close()
@@ -0,0 +1,41 @@
+"""Reloading the configuration at runtime."""
+
+from typing import Any, List
+
+import argparse
+import logging
+
+import pytest
+import yaml
+
+from redbox.config import get_config
+from redbox.reload import Reloader
+from redbox.types import DsTarget
+
+TARGETS = [{"name": f"target-{index}", "url": "http://127.0.0.1/"} for index in range(20)]
+
+
+def test_cluster_change_applies(tmp_path: Any, caplog: pytest.LogCaptureFixture) -> None:
+    """A changed shard applies with its targets instead of being left for a restart."""
+    path = tmp_path / "config.yml"
+    path.write_text(yaml.safe_dump({"cluster": {"shard_count": 1}, "targets": TARGETS}))
+    args = argparse.Namespace(
+        conf=str(path), listen=None, port=None, shard_index=None, shard_count=None, log_level=None
+    )
+    reloader = Reloader(args, get_config(args))
+    applied: List[List[DsTarget]] = []
+    reloader.add_consumer(applied.append)
+
+    path.write_text(
+        yaml.safe_dump({"cluster": {"shard_index": 1, "shard_count": 2}, "targets": TARGETS})
+    )
+    with caplog.at_level(logging.WARNING):
+        assert reloader.reload()
+
+    assert reloader.config.cluster["shard_index"] == 1
+    assert reloader.config.cluster["shard_count"] == 2
+    assert 0 < len(applied[-1]) < len(TARGETS)
+    assert [target.name for target in applied[-1]] == [
+        target.name for target in reloader.config.targets
+    ]
+    assert "restart" not in caplog.text
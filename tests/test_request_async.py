@@ -0,0 +1,139 @@
+"""Parity of the async engine's HTTP client with RequestSimple (requests module)."""
+
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import pytest
+
+from redbox.config import DsConfig
+from redbox.request import ProbePool, SessionPool
+from redbox.request import RequestAsync, RequestSimple
+from redbox.types import DsResponse
+
+# The async engine requires aiohttp (an optional dependency)
+pytest.importorskip("aiohttp")
+
+
+# Targets slower than their timeout
+SLOW = ("timeout", "slow-redirect")
+
+# Fields which must be the same for both engines (times and headers vary)
+FIELDS = ("name", "url", "size", "status_code", "status_family", "success", "err_msg", "extract")
+
+TARGETS: List[Dict[str, Any]] = [
+    {"name": "ok", "path": "/status/200"},
+    {"name": "not-found", "path": "/status/404"},
+    {"name": "error", "path": "/status/500", "fail_if": {"status_code_not_in": [200]}},
+    {"name": "chunked", "path": "/chunked"},
+    {"name": "gzip", "path": "/gzip"},
+    {"name": "deflate", "path": "/deflate"},
+    {"name": "redirect", "path": "/redirect/3"},
+    {"name": "extract", "path": "/chunked", "extract": {"*": ["<h1>(.+)</h1>"]}},
+    {"name": "extract-gzip", "path": "/gzip", "extract": {"2xx": ["<h1>(.+)</h1>"]}},
+    {"name": "extract-none", "path": "/status/200", "extract": {"5xx": ["<h1>(.+)</h1>"]}},
+]
+
+
+@pytest.fixture(name="conf")
+def fixture_conf(server: str, load_config: Callable[[Dict[str, Any]], DsConfig]) -> DsConfig:
+    """Configuration with a target for every case of the stand-in server."""
+    targets = []
+    for target in TARGETS:
+        target = dict(target)
+        target["url"] = server + target.pop("path")
+        targets.append(target)
+    targets.append({"name": "timeout", "url": server + "/slow", "timeout": 0.5})
+    targets.append({"name": "slow-redirect", "url": server + "/slow-redirect/3", "timeout": 1})
+    return load_config({"targets": targets})
+
+
+@pytest.fixture(name="engines")
+def fixture_engines(conf: DsConfig) -> Iterator[Tuple[RequestSimple, RequestAsync]]:
+    """Both engines, each with its own probe pool."""
+    sessions = SessionPool(conf.connection_pool)
+    simple = RequestSimple(ProbePool(8), sessions)
+    pool = ProbePool(8)
+    engine = RequestAsync(pool, 8, RequestSimple(pool, sessions))
+    yield simple, engine
+    engine.close()
+    sessions.close()
+
+
+def _by_name(responses: List[DsResponse]) -> Dict[str, DsResponse]:
+    return {response.name: response for response in responses}
+
+
+def test_responses_match(conf: DsConfig, engines: Tuple[RequestSimple, RequestAsync]) -> None:
+    """Both engines report the same outcome for every target."""
+    simple, engine = engines
+    targets = [target for target in conf.targets if target.name not in SLOW]
+    expected = _by_name(simple.request_many(targets, 5))
+    actual = _by_name(engine.request_many(targets, 5))
+    assert set(actual) == set(expected)
+    for name, response in expected.items():
+        for field in FIELDS:
+            assert getattr(actual[name], field) == getattr(response, field), (name, field)
+
+
+def test_responses_are_evaluated(
+    conf: DsConfig, engines: Tuple[RequestSimple, RequestAsync]
+) -> None:
+    """The compared responses are the expected ones, not just equally wrong."""
+    _, engine = engines
+    targets = [target for target in conf.targets if target.name not in SLOW]
+    responses = _by_name(engine.request_many(targets, 5))
+    assert responses["ok"].status_code == 200
+    assert responses["not-found"].status_code == 404
+    assert not responses["error"].success
+    assert responses["redirect"].status_code == 200
+    assert responses["chunked"].size == responses["ok"].size
+    assert responses["gzip"].size == responses["ok"].size
+    assert responses["deflate"].size == responses["ok"].size
+    assert responses["extract"].extract == ["redbox test"]
+    assert responses["extract-gzip"].extract == ["redbox test"]
+    assert responses["extract-none"].extract == []
+
+
+def test_timeout(conf: DsConfig, engines: Tuple[RequestSimple, RequestAsync]) -> None:
+    """Both engines fail a target slower than its timeout the same way.
+
+    Only the error message differs, as it comes from the HTTP client.
+    """
+    simple, engine = engines
+    targets = [target for target in conf.targets if target.name == "timeout"]
+    expected = simple.request_many(targets, 5)[0]
+    actual = engine.request_many(targets, 5)[0]
+    assert not actual.success
+    assert actual.status_code == 0
+    assert actual.err_msg
+    for field in FIELDS:
+        if field != "err_msg":
+            assert getattr(actual, field) == getattr(expected, field), field
+
+
+def test_timeout_covers_redirects(
+    conf: DsConfig, engines: Tuple[RequestSimple, RequestAsync]
+) -> None:
+    """The timeout of a target applies to all of its redirects together, not to each one."""
+    _, engine = engines
+    targets = [target for target in conf.targets if target.name == "slow-redirect"]
+    response = engine.request_many(targets, 5)[0]
+    assert not response.success
+    assert response.err_msg == "Timeout: No response after 1.000s"
+
+
+def test_proxy_from_environment(
+    server: str,
+    load_config: Callable[[Dict[str, Any]], DsConfig],
+    engines: Tuple[RequestSimple, RequestAsync],
+    monkeypatch: Any,
+) -> None:
+    """Both engines send requests through the proxy set in the environment."""
+    monkeypatch.setenv("HTTP_PROXY", server)
+    monkeypatch.delenv("NO_PROXY", raising=False)
+    monkeypatch.delenv("no_proxy", raising=False)
+    conf = load_config(
+        {"targets": [{"name": "proxied", "url": "http://redbox.invalid/status/200"}]}
+    )
+    for engine in engines:
+        response = engine.request_many(conf.targets, 5)[0]
+        assert response.status_code == 200, response.err_msg
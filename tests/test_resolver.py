@@ -0,0 +1,59 @@
+"""DNS cache prefetching and eviction."""
+
+from typing import Any, Callable, Dict, Iterator
+
+import threading
+
+import pytest
+
+from redbox.config import DsConfig
+from redbox.request import DnsCache
+
+
+@pytest.fixture(name="conf")
+def fixture_conf(server: str, load_config: Callable[[Dict[str, Any]], DsConfig]) -> DsConfig:
+    """Targets on two hostnames."""
+    port = server.rsplit(":", 1)[1]
+    targets = [
+        {"name": "ipv4", "url": f"http://127.0.0.1:{port}/status/200"},
+        {"name": "localhost", "url": f"http://localhost:{port}/status/200"},
+    ]
+    return load_config({"dns_cache": {"enabled": True}, "targets": targets})
+
+
+@pytest.fixture(name="cache")
+def fixture_cache(conf: DsConfig) -> Iterator[DnsCache]:
+    """DNS cache with the settings of the configuration."""
+    cache = DnsCache(conf.dns_cache)
+    yield cache
+    cache.close()
+
+
+def _count_dns_threads() -> int:
+    """Count the threads resolving for prefetches."""
+    return sum(1 for thread in threading.enumerate() if thread.name.startswith("dns"))
+
+
+def test_prefetch_reuses_threads(conf: DsConfig) -> None:
+    """Prefetches resolve in the threads of the cache instead of starting new ones."""
+    # Expired at once, so that every prefetch resolves all hosts again
+    cache = DnsCache(dict(conf.dns_cache, ttl=0))
+    hosts = [target.hostname for target in conf.targets]
+    before = _count_dns_threads()
+    try:
+        for _ in range(5):
+            cache.prefetch(hosts)
+        assert 0 < _count_dns_threads() - before <= len(hosts)
+        assert cache.stats()["misses"] == 5 * len(hosts)
+    finally:
+        cache.close()
+
+
+def test_removed_targets_are_evicted(conf: DsConfig, cache: DnsCache) -> None:
+    """Setting the targets drops the hosts no target resolves anymore."""
+    cache.prefetch([target.hostname for target in conf.targets])
+    assert cache.stats()["size"] == 2
+    cache.set_targets(conf.targets[:1])
+    assert cache.stats()["size"] == 1
+    assert cache.get(conf.targets[0].hostname, 80) is not None
+    assert cache.get(conf.targets[1].hostname, 80) is None
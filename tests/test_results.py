@@ -0,0 +1,88 @@
+"""Reuse of probe results of targets with a min_interval."""
+
+from typing import Any, Callable, Dict, Iterator, List
+
+import re
+import time
+
+import pytest
+
+from redbox.config import DsConfig
+from redbox.prometheus import get_prom_format
+from redbox.request import ProbePool, RequestSimple
+from redbox.store import ResultCache
+from redbox.types import DsResponse
+
+
+@pytest.fixture(name="conf")
+def fixture_conf(server: str, load_config: Callable[[Dict[str, Any]], DsConfig]) -> DsConfig:
+    """A reused target, one probed on every scrape and one without a HTTP response."""
+    return load_config(
+        {
+            "targets": [
+                {"name": "reused", "url": server + "/status/200", "min_interval": 60},
+                {"name": "always", "url": server + "/status/200"},
+                {"name": "refused", "url": "http://127.0.0.1:1/", "min_interval": 60},
+            ]
+        }
+    )
+
+
+@pytest.fixture(name="request_simple")
+def fixture_request_simple() -> Iterator[RequestSimple]:
+    """Simple engine probing the stand-in server."""
+    pool = ProbePool(4)
+    yield RequestSimple(pool)
+    pool.shutdown()
+
+
+def _scrape(conf: DsConfig, results: ResultCache, request: RequestSimple) -> Dict[str, DsResponse]:
+    """Probe the targets which are due like a scrape does and return all responses by name."""
+    cached, due = results.get(conf.targets)
+    responses = request.request_many(due, 5)
+    results.update(responses)
+    return {response.name: response for response in responses + cached}
+
+
+def _get_ages(responses: List[DsResponse]) -> Dict[str, float]:
+    """Get the rendered redbox_result_age_seconds by target name."""
+    metrics = get_prom_format(responses)
+    return {
+        match.group(1): float(match.group(2))
+        for match in re.finditer(
+            r'^redbox_result_age_seconds\{name="([^"]+)",.*\} (\S+)$', metrics, re.MULTILINE
+        )
+    }
+
+
+def test_reused_within_min_interval(conf: DsConfig, request_simple: RequestSimple) -> None:
+    """Scrapes within min_interval get the cached response instead of probing again."""
+    results = ResultCache(conf.targets)
+    first = _scrape(conf, results, request_simple)
+    assert first["reused"].status_code == 200
+    assert first["always"].status_code == 200
+
+    second = _scrape(conf, results, request_simple)
+    assert second["reused"] is first["reused"]
+    assert second["always"] is not first["always"]
+
+
+def test_failed_without_response_not_cached(conf: DsConfig, request_simple: RequestSimple) -> None:
+    """Probes without a HTTP response (status code 0) are retried on the next scrape."""
+    results = ResultCache(conf.targets)
+    first = _scrape(conf, results, request_simple)
+    assert first["refused"].status_code == 0
+
+    cached, due = results.get(conf.targets)
+    assert [response.name for response in cached] == ["reused"]
+    assert sorted(target.name for target in due) == ["always", "refused"]
+
+
+def test_result_age(conf: DsConfig, request_simple: RequestSimple) -> None:
+    """The age of reused results grows, results of fresh probes are about zero seconds old."""
+    results = ResultCache(conf.targets)
+    _scrape(conf, results, request_simple)
+    time.sleep(0.2)
+    ages = _get_ages(list(_scrape(conf, results, request_simple).values()))
+    assert ages["reused"] >= 0.2
+    assert ages["always"] < 0.2
@@ -0,0 +1,97 @@
+"""Rate limits, fairness and shutdown of the probe throttle."""
+
+from typing import Any, Callable, Dict, Iterator, List
+
+import queue
+import threading
+import timeit
+
+import pytest
+
+from redbox.config import DsConfig
+from redbox.request import Throttle
+from redbox.request.throttle import ThrottleTicket, TokenBucket
+
+# Seconds to wait for the dispatcher to start a probe
+START_TIMEOUT = 5
+
+
+@pytest.fixture(name="conf")
+def fixture_conf(load_config: Callable[[Dict[str, Any]], DsConfig]) -> DsConfig:
+    """Four targets on host a and two on host b, one probe of the group at a time."""
+    targets = [
+        {"name": f"{host}{index}", "url": f"http://{host}.invalid/", "groups": {"team": "x"}}
+        for host, count in (("a", 4), ("b", 2))
+        for index in range(1, count + 1)
+    ]
+    return load_config({"limits": {"groups": {"team": {"concurrency": 1}}}, "targets": targets})
+
+
+@pytest.fixture(name="throttle")
+def fixture_throttle(conf: DsConfig) -> Iterator[Throttle]:
+    """Throttle with the limits of the configuration."""
+    throttle = Throttle(conf.limits)
+    yield throttle
+    throttle.close()
+
+
+def _count_dispatchers() -> int:
+    """Count the running dispatcher threads."""
+    return sum(1 for thread in threading.enumerate() if thread.name == "throttle")
+
+
+def test_token_bucket_rate() -> None:
+    """A burst is available at once, then tokens come at the configured rate."""
+    bucket = TokenBucket(2.0, 3)
+    now = timeit.default_timer()
+    for _ in range(3):
+        assert bucket.wait(now) == 0
+        bucket.take(now)
+    assert bucket.wait(now) == pytest.approx(0.5)
+    assert bucket.wait(now + 0.25) == pytest.approx(0.25)
+    assert bucket.wait(now + 0.5) == 0
+    bucket.take(now + 0.5)
+    assert bucket.wait(now + 0.5) == pytest.approx(0.5)
+    # Idle time refills up to the burst only
+    for _ in range(3):
+        assert bucket.wait(now + 60) == 0
+        bucket.take(now + 60)
+    assert bucket.wait(now + 60) == pytest.approx(0.5)
+
+
+def test_hosts_are_served_round_robin(conf: DsConfig, throttle: Throttle) -> None:
+    """Waiting probes start one per host and turn, not in order of submission."""
+    started: "queue.Queue[ThrottleTicket]" = queue.Queue()
+
+    def start(ticket: ThrottleTicket) -> None:
+        started.put(ticket)
+
+    deadline = timeit.default_timer() + 60
+    for target in conf.targets:
+        throttle.submit(target, deadline, start)
+    order: List[str] = []
+    for _ in conf.targets:
+        ticket = started.get(timeout=START_TIMEOUT)
+        order.append(ticket.host)
+        assert started.empty()
+        throttle.release(ticket)
+    assert order == ["a.invalid", "a.invalid", "b.invalid", "a.invalid", "b.invalid", "a.invalid"]
+    assert throttle.stats() == {"throttled": 0}
+
+
+def test_close_stops_dispatcher(conf: DsConfig) -> None:
+    """Closing stops the dispatcher thread, waiting probes are not started anymore."""
+    before = _count_dispatchers()
+    throttle = Throttle(conf.limits)
+    assert _count_dispatchers() == before + 1
+    started: List[ThrottleTicket] = []
+    deadline = timeit.default_timer() + 60
+    for target in conf.targets[:2]:
+        throttle.submit(target, deadline, started.append)
+    assert len(started) == 1
+    assert throttle.stats() == {"throttled": 1}
+
+    throttle.close()
+    assert _count_dispatchers() == before
+    throttle.release(started[0])
+    assert len(started) == 1
@@ -0,0 +1,86 @@
+"""Supervision of worker processes."""
+
+from typing import Any, Callable, Dict, Iterator
+
+import multiprocessing
+import os
+import signal
+import threading
+import timeit
+
+import pytest
+
+from redbox.config import DsConfig
+from redbox.workers import RequestSharded
+
+
+@pytest.fixture(name="conf")
+def fixture_conf(server: str, load_config: Callable[[Dict[str, Any]], DsConfig]) -> DsConfig:
+    """Targets spread over two workers."""
+    targets = [{"name": f"target-{index}", "url": server + "/status/200"} for index in range(8)]
+    return load_config({"workers": {"processes": 2}, "targets": targets})
+
+
+@pytest.fixture(name="sharded")
+def fixture_sharded(conf: DsConfig) -> Iterator[RequestSharded]:
+    """Request handler probing in two worker processes."""
+    request = RequestSharded(conf, 2)
+    yield request
+    request.close()
+
+
+def _get_worker(index: int) -> Any:
+    """Get the worker process of a shard."""
+    return next(p for p in multiprocessing.active_children() if p.name == f"worker-{index}")
+
+
+def test_dead_worker_is_restarted(conf: DsConfig, sharded: RequestSharded) -> None:
+    """The scrape after a worker died probes its shard in a new worker right away."""
+    assert all(response.success for response in sharded.request_many(conf.targets, 5))
+
+    killed = _get_worker(0)
+    os.kill(killed.pid, signal.SIGKILL)
+    killed.join(5)
+
+    start = timeit.default_timer()
+    responses = sharded.request_many(conf.targets, 5)
+    assert timeit.default_timer() - start < 5
+    assert len(responses) == len(conf.targets)
+    assert all(response.success for response in responses)
+    assert _get_worker(0).pid != killed.pid
+
+
+def test_worker_dying_during_scrape(conf: DsConfig, sharded: RequestSharded) -> None:
+    """A scrape waiting for a worker which dies does not wait for the scrape timeout."""
+    sharded.request_many(conf.targets, 5)
+    # The stopped worker cannot answer before it is killed
+    worker = _get_worker(1)
+    os.kill(worker.pid, signal.SIGSTOP)
+    timer = threading.Timer(0.5, os.kill, (worker.pid, signal.SIGKILL))
+    timer.start()
+
+    start = timeit.default_timer()
+    responses = sharded.request_many(conf.targets, 10)
+    timer.join()
+    assert timeit.default_timer() - start < 5
+    assert len(responses) == len(conf.targets)
+    assert all(response.success for response in sharded.request_many(conf.targets, 5))
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="requires /proc")
+def test_restarted_worker_not_forked_from_parent(conf: DsConfig, sharded: RequestSharded) -> None:
+    """Replacements are forked by the fork server, not by the threaded parent mid-scrape."""
+    killed = _get_worker(0)
+    os.kill(killed.pid, signal.SIGKILL)
+    killed.join(5)
+    # Keep the parent busy with threads of its own while the worker is replaced
+    busy = threading.Thread(target=sharded.request_many, args=(conf.targets, 5))
+    busy.start()
+    assert all(response.success for response in sharded.request_many(conf.targets, 5))
+    busy.join()
+
+    worker = _get_worker(0)
+    assert worker.pid != killed.pid
+    with open(f"/proc/{worker.pid}/status", encoding="utf-8") as status:
+        ppid = next(int(line.split()[1]) for line in status if line.startswith("PPid:"))
+    assert ppid != os.getpid()